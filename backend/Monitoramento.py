@@ -1,24 +1,35 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
 import dash
-from dash import dcc, html, Input, Output, dash_table
+from dash import dcc, html, Input, Output, State, ClientsideFunction, ctx, dash_table
+from dash.exceptions import PreventUpdate
 import plotly.express as px
 import plotly.graph_objects as go
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
-import time
-import os
-from pathlib import Path
+from flask import Response, jsonify, request, stream_with_context
+
+from agregados import agregados_da_consulta
+from dados import COLUNAS_TABELA, cache, carregar_dados
+from exportacao import FORMATOS_EXPORTACAO, cabecalhos_exportacao, gerar_exportacao, interpretar_exportacao
+from formatos import colunas_json, registros_json
+from metricas import MIME_PROMETHEUS, medir_callback, medir_stream, registro
 
 print("="*70)
 print("INICIANDO DASHBOARD")
 print("="*70)
 
 # Configuracoes
-PLANILHA_ID = "1BKB3rsrZFcHxRt0LkTABtSBlqv7VWU6TwmkbwX95TLI"
-NOME_ABA = "Base Principal"
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-CACHE_DURATION = 60
-COLUNAS_TABELA = ["trip_number", "Status_da_Viagem", "ETA Planejado", "Ultima localização", "Previsão de chegada", "Ocorrencia"]
+# Por padrão exporta pelo próprio servidor do Dash; aponte para a API se preferir
+URL_EXPORTACAO = os.environ.get("DASHBOARD_EXPORT_URL", "/api/export")
+# Opções mostradas nos dropdowns de LT e destino a cada tecla
+LIMITE_OPCOES = 50
+# Até este número de linhas o snapshot vai inteiro para o navegador e
+# filtro, gráfico e tabela rodam em callbacks clientside (assets/filtros_cliente.js)
+LIMITE_CLIENTE = int(os.environ.get("DASHBOARD_LIMITE_CLIENTE", "10000"))
+# Resultados memorizados por versão do snapshot (posições filtradas e figuras)
+MAX_MEMO = 256
 CORES_STATUS = {
     "Parado": "#dc3545",
     "Em trânsito": "#28a745",
@@ -27,34 +38,10 @@ CORES_STATUS = {
     "Cancelado": "#ffc107"
 }
 
-dados_cache = {"df": None, "timestamp": None}
-
-def carregar_dados():
-    global dados_cache
-    
-    if dados_cache["df"] is not None and dados_cache["timestamp"] is not None:
-        tempo_decorrido = time.time() - dados_cache["timestamp"]
-        if tempo_decorrido < CACHE_DURATION:
-            return dados_cache["df"]
-    
-    # Busca account.json na raiz do projeto (um nível acima)
-    account_path = Path(__file__).parent.parent / "account.json"
-    creds = Credentials.from_service_account_file(str(account_path), scopes=SCOPES)
-    gc = gspread.authorize(creds)
-    sheet = gc.open_by_key(PLANILHA_ID).worksheet(NOME_ABA)
-    
-    all_values = sheet.get_all_values()
-    df = pd.DataFrame(all_values[1:], columns=all_values[0]).dropna(how='all')
-    
-    if "Data" in df.columns:
-        df["Data"] = pd.to_datetime(df["Data"], format='%d/%m/%Y', errors="coerce")
-    
-    dados_cache["df"] = df
-    dados_cache["timestamp"] = time.time()
-    
-    return df
-
-carregar_dados()
+# Com snapshot em disco a partida é imediata; a fonte é consultada em background
+if not cache.restaurar_do_disco():
+    carregar_dados()
+cache.iniciar_atualizacao_periodica()
 print("="*70 + "\n")
 
 app = dash.Dash(__name__)
@@ -95,6 +82,17 @@ h3::after{content:'';position:absolute;bottom:-5px;left:5px;width:60px;height:3p
 ::-webkit-scrollbar-thumb:hover{background:linear-gradient(135deg,#FF8C42,#FFB085)}
 </style></head><body>{%app_entry%}{%config%}{%scripts%}{%renderer%}</body></html>'''
 
+# Tabela do servidor e tabela clientside com a mesma aparência
+ESTILO_TABELA = dict(
+    style_table={"borderRadius": "6px", "height": "600px", "overflowY": "auto"},
+    style_cell={"padding": "12px", "textAlign": "left", "fontFamily": "'Segoe UI', Tahoma, Geneva, Verdana, sans-serif", "fontSize": "13px", "whiteSpace": "normal", "height": "auto"},
+    style_header={"fontWeight": "700", "backgroundColor": "#FF6B35", "color": "white", "borderBottom": "2px solid #FF8C42", "fontSize": "14px", "padding": "15px", "textAlign": "center"},
+    style_data_conditional=[
+        {"if": {"row_index": "odd"}, "backgroundColor": "#FFF5F0"},
+        {"if": {"row_index": "even"}, "backgroundColor": "white"}
+    ]
+)
+
 app.layout = html.Div([
     html.Div([
         html.Div([
@@ -104,16 +102,21 @@ app.layout = html.Div([
     ], className="title-container"),
     
     dcc.Interval(id="interval", interval=60000, n_intervals=0),
+    dcc.Store(id="versao-dados"),
+    # Modo clientside: linhas do snapshot; modo servidor: filtros repassados aos callbacks do servidor
+    dcc.Store(id="dados-cliente"),
+    dcc.Store(id="filtros-servidor"),
+    dcc.Store(id="url-exportacao", data=URL_EXPORTACAO),
     
     html.Div([
         html.Div([
             html.Label("ID (LT)"),
-            dcc.Dropdown(id="filtro-id", multi=True, placeholder="Selecione os LTs...", options=[])
+            dcc.Dropdown(id="filtro-id", multi=True, placeholder="Digite para buscar LTs...", options=[])
         ], className="filter-item"),
         
         html.Div([
             html.Label("Destino"),
-            dcc.Dropdown(id="filtro-destino", multi=True, placeholder="Selecione destinos...", options=[])
+            dcc.Dropdown(id="filtro-destino", multi=True, placeholder="Digite para buscar destinos...", options=[])
         ], className="filter-item"),
         
         html.Div([
@@ -145,47 +148,88 @@ app.layout = html.Div([
     ], className="filters-container"),
     
     html.Div([
-        html.Div([dcc.Graph(id="grafico")], className="graph-card")
+        html.Div([
+            dcc.Graph(id="grafico"),
+            dcc.Graph(id="grafico-cliente", style={"display": "none"})
+        ], className="graph-card")
     ], className="graphs-container"),
     
     html.Div([
         html.Div([
             html.H3("Dados Detalhados", style={'display': 'inline-block', 'marginBottom': '0'}),
-            html.Button("📥 Exportar CSV", id="btn-exportar", style={
+            html.A("📥 Exportar CSV", id="btn-exportar", href=URL_EXPORTACAO, download="dados_viagens.csv", style={
                 'float': 'right', 'background': 'linear-gradient(135deg, #28a745, #20c997)', 'color': 'white',
                 'border': 'none', 'padding': '12px 24px', 'borderRadius': '8px', 'cursor': 'pointer',
                 'fontWeight': '600', 'fontSize': '0.95rem', 'boxShadow': '0 4px 12px rgba(40, 167, 69, 0.3)',
-                'transition': 'all 0.3s ease'
-            }),
-            dcc.Download(id="download-csv")
+                'transition': 'all 0.3s ease', 'textDecoration': 'none', 'display': 'inline-block'
+            })
         ], style={'marginBottom': '20px', 'overflow': 'hidden'}),
         
-        dash_table.DataTable(
-            id="tabela", page_size=25, sort_action="native",
-            style_table={"borderRadius": "6px", "height": "600px", "overflowY": "auto"},
-            style_cell={"padding": "12px", "textAlign": "left", "fontFamily": "'Segoe UI', Tahoma, Geneva, Verdana, sans-serif", "fontSize": "13px", "whiteSpace": "normal", "height": "auto"},
-            style_header={"fontWeight": "700", "backgroundColor": "#FF6B35", "color": "white", "borderBottom": "2px solid #FF8C42", "fontSize": "14px", "padding": "15px", "textAlign": "center"},
-            style_data_conditional=[
-                {"if": {"row_index": "odd"}, "backgroundColor": "#FFF5F0"},
-                {"if": {"row_index": "even"}, "backgroundColor": "white"}
-            ]
-        )
+        html.Div([
+            dash_table.DataTable(
+                id="tabela", page_size=25, page_current=0, page_count=1,
+                page_action="custom", sort_action="custom", sort_mode="single", sort_by=[],
+                **ESTILO_TABELA
+            )
+        ], id="area-tabela"),
+        
+        # Modo clientside: paginação nativa e ordenação no navegador, sem ida ao servidor
+        html.Div([
+            dash_table.DataTable(
+                id="tabela-cliente", page_size=25, page_action="native", sort_action="custom", sort_mode="single",
+                sort_by=[],
+                **ESTILO_TABELA
+            )
+        ], id="area-tabela-cliente", style={"display": "none"})
     ], className="table-container")
 ], style={"maxWidth": "1400px", "margin": "0 auto"})
 
 @app.callback(
-    Output("filtro-id", "options"),
-    Output("filtro-destino", "options"),
+    Output("versao-dados", "data"),
+    Input("interval", "n_intervals"),
+    State("versao-dados", "data")
+)
+@medir_callback("verificar_versao")
+def verificar_versao(_, versao_atual):
+    """A cada intervalo só compara a versão do snapshot; os demais callbacks rodam apenas se ela mudou"""
+    versao = cache.snapshot().id
+    if versao == versao_atual:
+        raise PreventUpdate
+    return versao
+
+@app.callback(
     Output("filtro-status", "options"),
-    Input("interval", "n_intervals")
+    Input("versao-dados", "data")
 )
+@medir_callback("atualizar_filtros")
 def atualizar_filtros(_):
-    df = carregar_dados()
-    
-    def get_options(col):
-        return [{"label": str(v), "value": v} for v in sorted(df[col].unique())] if col in df.columns else []
-    
-    return get_options("trip_number"), get_options("destination_station_code"), get_options("Status_da_Viagem")
+    """Poucos status: a lista inteira sai direto do índice"""
+    return [{"label": v, "value": v} for v in cache.snapshot().indice.valores("Status_da_Viagem")]
+
+def opcoes_busca(coluna, termo, selecionados):
+    """Selecionados + os melhores resultados da busca (evita mandar milhares de LTs ao navegador)"""
+    valores = list(selecionados or [])
+    encontrados = cache.snapshot().busca.buscar(termo or "", [coluna], LIMITE_OPCOES)
+    valores += [r["valor"] for r in encontrados if r["valor"] not in valores]
+    return [{"label": v, "value": v} for v in valores]
+
+@app.callback(
+    Output("filtro-id", "options"),
+    Input("filtro-id", "search_value"),
+    State("filtro-id", "value")
+)
+@medir_callback("buscar_ids")
+def buscar_ids(termo, selecionados):
+    return opcoes_busca("trip_number", termo, selecionados)
+
+@app.callback(
+    Output("filtro-destino", "options"),
+    Input("filtro-destino", "search_value"),
+    State("filtro-destino", "value")
+)
+@medir_callback("buscar_destinos")
+def buscar_destinos(termo, selecionados):
+    return opcoes_busca("destination_station_code", termo, selecionados)
 
 @app.callback(
     Output("filtro-id", "value"),
@@ -199,56 +243,252 @@ def atualizar_filtros(_):
 def limpar_filtros(n_clicks):
     return None, None, None, None, None
 
+def filtrar_posicoes(indice, ids, destinos, status, data_inicial, data_final):
+    """Posições do snapshot que atendem aos filtros da tela"""
+    return indice.filtrar(
+        {"trip_number": ids or [], "destination_station_code": destinos or [], "Status_da_Viagem": status or []},
+        inicio=data_inicial,
+        fim=data_final,
+    )
+
+# ==================== MEMORIZAÇÃO ====================
+
+class MemoVersao:
+    """
+    LRU de resultados por (versão do snapshot, chave). Só a versão atual
+    do cache é guardada: quando ela muda, as entradas antigas são descartadas.
+    """
+
+    def __init__(self, versao_atual, max_itens: int = MAX_MEMO):
+        self.versao_atual = versao_atual
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._versao = None
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, versao, chave, calcular):
+        with self._lock:
+            if versao == self._versao and chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.falhas += 1
+
+        valor = calcular()
+        # Quem ainda calcula sobre uma versão substituída não apaga as entradas da nova
+        if versao != self.versao_atual():
+            return valor
+        with self._lock:
+            if versao != self._versao:
+                self._itens.clear()
+                self._versao = versao
+            self._itens[chave] = valor
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+        return valor
+
+    def status(self) -> dict:
+        return {"itens": len(self._itens), "acertos": self.acertos, "falhas": self.falhas}
+
+
+memo = MemoVersao(lambda: cache.atual().id if cache.atual() else None)
+registro.medidor("dashboard_memo_callbacks", "Memorização dos callbacks do Dash",
+                 lambda: {(k,): v for k, v in memo.status().items()}, ["campo"])
+
+
+def chave_filtros(ids=None, destinos=None, status=None, data_inicial=None, data_final=None) -> tuple:
+    """Mesmos filtros em outra ordem geram a mesma chave"""
+    return (
+        tuple(sorted(ids or [])),
+        tuple(sorted(destinos or [])),
+        tuple(sorted(status or [])),
+        (data_inicial or "")[:10] or None,
+        (data_final or "")[:10] or None,
+    )
+
+
+def posicoes_filtradas(snap, chave):
+    return memo.obter(snap.id, ("posicoes", chave), lambda: filtrar_posicoes(snap.indice, *chave))
+
+
+def figura_filtrada(snap, chave):
+    return memo.obter(snap.id, ("figura", chave), lambda: montar_figura(snap, chave))
+
+
+def modo_cliente(snap) -> bool:
+    return len(snap.df) <= LIMITE_CLIENTE
+
+
+def montar_figura(snap, chave):
+    indice = snap.indice
+    if "Data" not in indice.df.columns:
+        return go.Figure().add_annotation(text="Coluna Data nao encontrada")
+    
+    ids, destinos, status, data_inicial, data_final = chave
+    agregados = agregados_da_consulta(snap.agregados, indice, ids)
+    _, contagem = agregados.consultar(list(destinos) or None, list(status) or None, data_inicial, data_final)
+    return criar_grafico(contagem)
+
+
+def preconstruir_figuras(novo):
+    """A visão inicial e a de cada status já ficam prontas a cada versão"""
+    # Versão já substituída por outra mais nova: não vale a pena montar
+    if novo is None or novo is not cache.atual() or modo_cliente(novo):
+        return
+    figura_filtrada(novo, chave_filtros())
+    for status in novo.indice.valores("Status_da_Viagem"):
+        figura_filtrada(novo, chave_filtros(status=[status]))
+
+
+class PreconstrucaoFiguras:
+    """
+    Ouvinte do cache que monta as figuras em thread própria: a troca de
+    snapshot, os demais ouvintes e a próxima atualização não esperam o
+    Plotly. Se outra versão chegar antes, só a mais nova é montada.
+    """
+
+    def __init__(self):
+        self.__name__ = "preconstruir_figuras"
+        self._fila = threading.Condition()
+        self._pendente = None
+        self._montando = False
+        self._thread = None
+
+    def __call__(self, novo, anterior):
+        if novo is None:
+            return
+        with self._fila:
+            self._pendente = novo
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._trabalhar, name="figuras", daemon=True)
+                self._thread.start()
+            self._fila.notify()
+
+    def aguardar(self, timeout=None) -> bool:
+        """Espera a fila esvaziar (scripts e benchmarks); retorna False se o prazo venceu"""
+        with self._fila:
+            return self._fila.wait_for(lambda: self._pendente is None and not self._montando, timeout)
+
+    def _trabalhar(self):
+        while True:
+            with self._fila:
+                self._fila.wait_for(lambda: self._pendente is not None)
+                novo, self._pendente = self._pendente, None
+                self._montando = True
+            try:
+                preconstruir_figuras(novo)
+            except Exception as e:
+                print(f"⚠️ Figuras não pré-montadas: {e}")
+            finally:
+                with self._fila:
+                    self._montando = False
+                    self._fila.notify_all()
+
+
+preconstrucao = PreconstrucaoFiguras()
+
+# ==================== CALLBACKS ====================
+
 @app.callback(
-    Output("grafico", "figure"),
-    Output("tabela", "columns"),
-    Output("tabela", "data"),
+    Output("dados-cliente", "data"),
+    Output("tabela-cliente", "columns"),
+    Input("versao-dados", "data")
+)
+@medir_callback("carregar_dados_cliente")
+def carregar_dados_cliente(_):
+    """Snapshot pequeno vai inteiro para o navegador (uma vez por versão)"""
+    snap = cache.snapshot()
+    if not modo_cliente(snap):
+        return None, []
+    
+    df = snap.df
+    colunas = [c for c in COLUNAS_TABELA if c in df.columns] or list(df.columns)
+    extras = [c for c in ("Data", "destination_station_code", "Status_da_Viagem") if c in df.columns and c not in colunas]
+    # A ordenação no navegador usa o posto de cada linha, não o texto ('dd/mm/aaaa' não ordena)
+    dados = memo.obter(snap.id, ("dados_cliente",), lambda: {
+        "colunas": colunas,
+        "linhas": colunas_json(df[colunas + extras]),
+        "postos": {c: snap.indice.posto(c).tolist() for c in colunas},
+        "cores": CORES_STATUS,
+    })
+    return dados, [{"name": c, "id": c} for c in colunas]
+
+# Filtro, gráfico e tabela no navegador quando há dados-cliente; senão repassa os filtros ao servidor
+app.clientside_callback(
+    ClientsideFunction(namespace="monitoramento", function_name="filtrar"),
+    Output("filtros-servidor", "data"),
+    Output("grafico-cliente", "figure"),
+    Output("tabela-cliente", "data"),
+    Output("grafico", "style"),
+    Output("grafico-cliente", "style"),
+    Output("area-tabela", "style"),
+    Output("area-tabela-cliente", "style"),
     Input("filtro-id", "value"),
     Input("filtro-destino", "value"),
     Input("filtro-status", "value"),
     Input("filtro-data-inicial", "date"),
     Input("filtro-data-final", "date"),
-    Input("interval", "n_intervals")
+    Input("dados-cliente", "data"),
+    Input("tabela-cliente", "sort_by")
+)
+
+@app.callback(
+    Output("grafico", "figure"),
+    Output("tabela", "columns"),
+    Input("filtros-servidor", "data"),
+    Input("versao-dados", "data")
 )
-def atualizar_dashboard(ids, destinos, status, data_inicial, data_final, _):
-    df = carregar_dados().copy()
+@medir_callback("atualizar_dashboard")
+def atualizar_dashboard(filtros, _):
+    snap = cache.snapshot()
+    if modo_cliente(snap):
+        raise PreventUpdate
     
-    if ids and "trip_number" in df.columns:
-        df = df[df["trip_number"].isin(ids)]
-    if destinos and "destination_station_code" in df.columns:
-        df = df[df["destination_station_code"].isin(destinos)]
-    if status and "Status_da_Viagem" in df.columns:
-        df = df[df["Status_da_Viagem"].isin(status)]
+    fig = figura_filtrada(snap, chave_filtros(*(filtros or [])))
+    colunas_existentes = [c for c in COLUNAS_TABELA if c in snap.df.columns] or list(snap.df.columns)
+    columns = [{"name": c, "id": c} for c in colunas_existentes]
     
-    if "Data" in df.columns:
-        df["Data"] = pd.to_datetime(df["Data"], format='%d/%m/%Y', errors="coerce")
-        if data_inicial:
-            df = df[df["Data"] >= pd.to_datetime(data_inicial)]
-        if data_final:
-            df = df[df["Data"] <= pd.to_datetime(data_final)]
+    return fig, columns
+
+@app.callback(
+    Output("tabela", "data"),
+    Output("tabela", "page_count"),
+    Output("tabela", "page_current"),
+    Input("filtros-servidor", "data"),
+    Input("versao-dados", "data"),
+    Input("tabela", "page_current"),
+    Input("tabela", "page_size"),
+    Input("tabela", "sort_by")
+)
+@medir_callback("atualizar_tabela")
+def atualizar_tabela(filtros, _, pagina, tamanho, sort_by):
+    """Paginação e ordenação no servidor: só a página visível é enviada"""
+    snap = cache.snapshot()
+    if modo_cliente(snap):
+        raise PreventUpdate
+    indice = snap.indice
+    posicoes = posicoes_filtradas(snap, chave_filtros(*(filtros or [])))
     
-    fig = criar_grafico(df)
+    # Filtro alterado: volta para a primeira página
+    if ctx.triggered_id not in ("tabela", "versao-dados"):
+        pagina = 0
+    pagina = pagina or 0
+    total_paginas = max(1, -(-len(posicoes) // tamanho))
+    pagina = min(pagina, total_paginas - 1)
     
-    colunas_existentes = [c for c in COLUNAS_TABELA if c in df.columns]
-    df_tabela = df[colunas_existentes] if colunas_existentes else df
-    columns = [{"name": c, "id": c} for c in df_tabela.columns]
+    ordenacao = [(s["column_id"], s["direction"] == "desc") for s in (sort_by or []) if s["column_id"] in indice.df.columns]
+    colunas_existentes = [c for c in COLUNAS_TABELA if c in indice.df.columns] or None
+    pagina_posicoes = indice.pagina(posicoes, ordenacao, pagina * tamanho, tamanho)
     
-    return fig, columns, df_tabela.to_dict("records")
+    return registros_json(indice.selecionar(pagina_posicoes, colunas_existentes)), total_paginas, pagina
 
-def criar_grafico(df):
-    if "Data" not in df.columns:
-        return go.Figure().add_annotation(text="Coluna Data nao encontrada")
-    
-    df_grafico = df.copy()
-    df_grafico["Data"] = pd.to_datetime(df_grafico["Data"], format='%d/%m/%Y', errors="coerce")
-    df_grafico = df_grafico.dropna(subset=["Data"])
-    
-    if df_grafico.empty or "Status_da_Viagem" not in df_grafico.columns:
+def criar_grafico(contagem):
+    """Gráfico de barras a partir da timeline [Data, Status, Quantidade]"""
+    if contagem.empty:
         return go.Figure().add_annotation(text="Sem dados")
     
-    contagem = df_grafico.groupby([df_grafico["Data"].dt.date, "Status_da_Viagem"]).size().reset_index()
-    contagem.columns = ["Data", "Status", "Quantidade"]
-    
     fig = px.bar(contagem, x="Data", y="Quantidade", color="Status", title="Viagens por Data e Status",
                  color_discrete_map=CORES_STATUS, barmode="group", text="Quantidade")
     fig.update_traces(textposition='outside', textfont_size=16)
@@ -261,40 +501,50 @@ def criar_grafico(df):
     )
     return fig
 
-@app.callback(
-    Output("download-csv", "data"),
-    Input("btn-exportar", "n_clicks"),
+# Só monta o link, no navegador; o arquivo é gerado em streaming pelo endpoint de exportação
+app.clientside_callback(
+    ClientsideFunction(namespace="monitoramento", function_name="linkExportacao"),
+    Output("btn-exportar", "href"),
     Input("filtro-id", "value"),
     Input("filtro-destino", "value"),
     Input("filtro-status", "value"),
     Input("filtro-data-inicial", "date"),
     Input("filtro-data-final", "date"),
-    prevent_initial_call=True
+    State("url-exportacao", "data")
 )
-def exportar_csv(n_clicks, ids, destinos, status, data_inicial, data_final):
-    if not n_clicks:
-        return None
-    
-    df = carregar_dados().copy()
-    
-    if ids and "trip_number" in df.columns:
-        df = df[df["trip_number"].isin(ids)]
-    if destinos and "destination_station_code" in df.columns:
-        df = df[df["destination_station_code"].isin(destinos)]
-    if status and "Status_da_Viagem" in df.columns:
-        df = df[df["Status_da_Viagem"].isin(status)]
-    
-    if "Data" in df.columns:
-        df["Data"] = pd.to_datetime(df["Data"], format='%d/%m/%Y', errors="coerce")
-        if data_inicial:
-            df = df[df["Data"] >= pd.to_datetime(data_inicial)]
-        if data_final:
-            df = df[df["Data"] <= pd.to_datetime(data_final)]
-    
-    colunas_existentes = [c for c in COLUNAS_TABELA if c in df.columns]
-    df_export = df[colunas_existentes] if colunas_existentes else df
+
+@app.server.route("/api/export")
+def exportar_streaming():
+    """/api/export da API no servidor do Dash: mesmos parâmetros (interpretar_exportacao), erros e cabeçalhos"""
+    inicio = time.perf_counter()
+    snap = cache.snapshot()
+    indice = snap.indice
+    try:
+        pedido = interpretar_exportacao(request.args, list(indice.df.columns))
+    except ValueError as e:
+        return jsonify(detail=str(e)), 400
     
-    return dcc.send_data_frame(df_export.to_csv, "dados_viagens.csv", index=False, encoding='utf-8-sig')
+    filtros = pedido["filtros"]
+    posicoes = posicoes_filtradas(snap, chave_filtros(
+        filtros["trip_number"], filtros["destination_station_code"], filtros["Status_da_Viagem"],
+        request.args.get("start_date"), request.args.get("end_date"),
+    ))
+    formato = pedido["formato"]
+    return Response(
+        stream_with_context(medir_stream(gerar_exportacao(formato, indice, posicoes, pedido["colunas"]),
+                                         "/api/export", inicio)),
+        mimetype=FORMATOS_EXPORTACAO[formato][0],
+        headers=cabecalhos_exportacao(formato, len(posicoes))
+    )
+
+@app.server.route("/metrics")
+def metricas():
+    """Métricas do processo do Dash (callbacks, etapas, cache) no formato do Prometheus"""
+    return Response(registro.expor(), content_type=MIME_PROMETHEUS)
+
+# Figuras das próximas versões e da atual prontas antes do primeiro acesso, em background
+cache.adicionar_ouvinte(preconstrucao)
+preconstrucao(cache.atual(), None)
 
 if __name__ == "__main__":
     print("\n" + "="*70)
@@ -0,0 +1,123 @@
+"""
+Agregados materializados - Dashboard de Monitoramento de Viagens
+Contagens por (dia, status, destino) montadas uma vez por snapshot e
+atualizadas com o delta da sincronização incremental
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from metricas import etapa
+from sincronizacao import Delta
+
+CHAVES = ["Data", "Status_da_Viagem", "destination_station_code"]
+BUCKETS = {"day": None, "week": "W-SUN", "month": "M"}
+
+# ==================== CONTAGEM ====================
+
+def _chaves_texto(df: pd.DataFrame) -> pd.DataFrame:
+    """Chaves como texto ('' para ausente), para somar deltas sem problemas de NaN no índice"""
+    chaves = pd.DataFrame(index=df.index)
+    if "Data" in df.columns:
+        chaves["Data"] = df["Data"].dt.strftime('%Y-%m-%d').fillna("")
+    else:
+        chaves["Data"] = ""
+    for col in CHAVES[1:]:
+        chaves[col] = df[col].astype(object).fillna("").astype(str) if col in df.columns else ""
+    return chaves
+
+
+def contar(df: pd.DataFrame) -> pd.Series:
+    """Quantidade de linhas por (Data, Status_da_Viagem, destination_station_code)"""
+    if df.empty:
+        return pd.Series(dtype="int64", index=pd.MultiIndex.from_arrays([[], [], []], names=CHAVES))
+    return _chaves_texto(df).groupby(CHAVES, sort=False).size().astype("int64")
+
+# ==================== AGREGADOS ====================
+
+class Agregados:
+    """Contagens imutáveis de um snapshot; `aplicar()` devolve uma nova instância"""
+
+    def __init__(self, contagens: pd.Series, tem_status: bool = True):
+        self.contagens = contagens
+        self.tem_status = tem_status
+        tabela = contagens.rename("Quantidade").reset_index()
+        tabela["dia"] = pd.to_datetime(tabela["Data"], format='%Y-%m-%d', errors="coerce")
+        self.tabela = tabela
+
+    @classmethod
+    @etapa("agregacao")
+    def de_linhas(cls, df: pd.DataFrame) -> "Agregados":
+        tem_status = "Status_da_Viagem" in df.columns and "Data" in df.columns
+        return cls(contar(df), tem_status)
+
+    @etapa("agregacao_delta")
+    def aplicar(self, delta: Delta) -> "Agregados":
+        """Soma as linhas novas e subtrai as antigas; só as chaves afetadas são tocadas"""
+        mais = [contar(d) for d in (delta.adicionados, delta.atualizados) if not d.empty]
+        menos = [contar(d) for d in (delta.anteriores, delta.removidos) if not d.empty]
+
+        contagens = self.contagens
+        for serie in mais:
+            contagens = contagens.add(serie, fill_value=0)
+        for serie in menos:
+            contagens = contagens.sub(serie, fill_value=0)
+        contagens = contagens[contagens != 0].astype("int64")
+        return Agregados(contagens, self.tem_status)
+
+    # -------- consultas --------
+
+    @etapa("agrupamento")
+    def consultar(self, destinos: Optional[List[str]] = None, status: Optional[List[str]] = None,
+                  inicio=None, fim=None, bucket: str = "day") -> Tuple[Dict[str, int], pd.DataFrame]:
+        """
+        Retorna (contagem por status, timeline [Data, Status, Quantidade]).
+        Sem filtro de data, a contagem por status inclui linhas sem Data,
+        como o value_counts sobre o snapshot inteiro.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"Bucket inválido: {bucket} (use {', '.join(BUCKETS)})")
+
+        vazio = pd.DataFrame(columns=["Data", "Status", "Quantidade"])
+        if not self.tem_status:
+            return {}, vazio
+
+        tabela = self.tabela
+        if destinos:
+            tabela = tabela[tabela["destination_station_code"].isin(destinos)]
+        if status:
+            tabela = tabela[tabela["Status_da_Viagem"].isin(status)]
+        if inicio is not None:
+            tabela = tabela[tabela["dia"] >= pd.Timestamp(inicio)]
+        if fim is not None:
+            tabela = tabela[tabela["dia"] <= pd.Timestamp(fim)]
+
+        por_status = tabela.groupby("Status_da_Viagem")["Quantidade"].sum()
+        por_status = por_status[por_status > 0].sort_values(ascending=False, kind="stable")
+        status_counts = {str(k): int(v) for k, v in por_status.items()}
+
+        com_data = tabela.dropna(subset=["dia"])
+        if com_data.empty:
+            return status_counts, vazio
+
+        frequencia = BUCKETS[bucket]
+        if frequencia is None:
+            periodo = com_data["Data"]
+        else:
+            periodo = com_data["dia"].dt.to_period(frequencia).dt.start_time.dt.strftime('%Y-%m-%d')
+
+        timeline = com_data.groupby([periodo, com_data["Status_da_Viagem"]])["Quantidade"].sum().reset_index()
+        timeline.columns = ["Data", "Status", "Quantidade"]
+        timeline = timeline[timeline["Quantidade"] > 0].reset_index(drop=True)
+        return status_counts, timeline
+
+
+def agregados_da_consulta(agregados: Agregados, indice, viagens: Optional[Sequence[str]] = None) -> Agregados:
+    """
+    Os agregados não guardam o LT: com filtro de ID, agrega só as linhas
+    selecionadas no índice; sem ele, usa os agregados do snapshot
+    """
+    if not viagens:
+        return agregados
+    posicoes = indice.filtrar({"trip_number": list(viagens)})
+    return Agregados.de_linhas(indice.selecionar(posicoes))
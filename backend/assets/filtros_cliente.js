@@ -0,0 +1,128 @@
+/*
+ * Filtros clientside do Dashboard de Monitoramento
+ * Com o snapshot pequeno (dados-cliente preenchido), filtro, gráfico e tabela
+ * rodam no navegador; com o snapshot grande, os filtros seguem para o servidor.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    monitoramento: {
+        filtrar: function (ids, destinos, status, dataInicial, dataFinal, dados, ordenacao) {
+            const nada = window.dash_clientside.no_update;
+            const oculto = {display: "none"};
+            const visivel = {};
+
+            if (!dados) {
+                const filtros = [ids || [], destinos || [], status || [], dataInicial || null, dataFinal || null];
+                return [filtros, nada, nada, visivel, oculto, visivel, oculto];
+            }
+
+            const linhas = dados.linhas;
+            const total = (linhas[dados.colunas[0]] || []).length;
+            const inicio = dataInicial ? dataInicial.slice(0, 10) : null;
+            const fim = dataFinal ? dataFinal.slice(0, 10) : null;
+            const conjunto = (valores) => (valores && valores.length ? new Set(valores.map(String)) : null);
+            const filtros = [
+                [linhas.trip_number, conjunto(ids)],
+                [linhas.destination_station_code, conjunto(destinos)],
+                [linhas.Status_da_Viagem, conjunto(status)],
+            ].filter(([coluna, aceitos]) => coluna && aceitos);
+            const datas = linhas.Data;
+
+            const posicoes = [];
+            for (let i = 0; i < total; i++) {
+                if (!filtros.every(([coluna, aceitos]) => aceitos.has(String(coluna[i])))) continue;
+                if (datas && (inicio || fim)) {
+                    const data = datas[i];
+                    if (data === null || (inicio && data < inicio) || (fim && data > fim)) continue;
+                }
+                posicoes.push(i);
+            }
+
+            const tabela = ordenar(posicoes, dados.postos, ordenacao).map((i) => {
+                const linha = {};
+                dados.colunas.forEach((c) => { linha[c] = linhas[c][i]; });
+                return linha;
+            });
+
+            return [nada, criarGrafico(posicoes, linhas, dados.cores), tabela, oculto, visivel, oculto, visivel];
+        },
+
+        linkExportacao: function (ids, destinos, status, dataInicial, dataFinal, base) {
+            const params = new URLSearchParams();
+            const incluir = (nome, valor) => { if (valor) params.append(nome, valor); };
+            incluir("trip_numbers", (ids || []).join(","));
+            incluir("destinations", (destinos || []).join(","));
+            incluir("status", (status || []).join(","));
+            incluir("start_date", (dataInicial || "").slice(0, 10));
+            incluir("end_date", (dataFinal || "").slice(0, 10));
+            const query = params.toString();
+            return query ? `${base}?${query}` : base;
+        },
+    },
+});
+
+// Mesma regra de IndiceFiltros.ordenar: pelo posto da coluna, ausentes (-1) no fim, empates na ordem da planilha
+function ordenar(posicoes, postos, ordenacao) {
+    const criterio = (ordenacao || [])[0];
+    const coluna = criterio && postos ? postos[criterio.column_id] : null;
+    if (!coluna) {
+        return posicoes;
+    }
+    const sinal = criterio.direction === "desc" ? -1 : 1;
+    const chave = (i) => (coluna[i] < 0 ? Infinity : sinal * coluna[i]);
+    return posicoes.slice().sort((a, b) => (chave(a) - chave(b)) || (a - b));
+}
+
+// Mesmo gráfico de criar_grafico (Monitoramento.py): barras agrupadas por Data e Status
+function criarGrafico(posicoes, linhas, cores) {
+    const datas = linhas.Data;
+    const status = linhas.Status_da_Viagem;
+    if (!datas || !status) {
+        return semDados("Coluna Data nao encontrada");
+    }
+
+    const contagem = new Map();
+    posicoes.forEach((i) => {
+        if (datas[i] === null || status[i] === null) return;
+        const chave = `${datas[i]}\u0000${status[i]}`;
+        contagem.set(chave, (contagem.get(chave) || 0) + 1);
+    });
+    if (!contagem.size) {
+        return semDados("Sem dados");
+    }
+
+    // Ordem do groupby do servidor: Data, depois Status
+    const chaves = Array.from(contagem.keys()).sort();
+    const eixo = Array.from(new Set(chaves.map((c) => c.split("\u0000")[0])));
+    const series = new Map();
+    let maximo = 0;
+    chaves.forEach((chave) => {
+        const [data, nome] = chave.split("\u0000");
+        const quantidade = contagem.get(chave);
+        maximo = Math.max(maximo, quantidade);
+        if (!series.has(nome)) series.set(nome, {x: [], y: []});
+        series.get(nome).x.push(data);
+        series.get(nome).y.push(quantidade);
+    });
+
+    const traces = Array.from(series.entries()).map(([nome, serie]) => ({
+        type: "bar", name: nome, x: serie.x, y: serie.y, text: serie.y,
+        textposition: "outside", textfont: {size: 16}, legendgroup: nome,
+        marker: cores[nome] ? {color: cores[nome]} : {},
+        hovertemplate: `Status=${nome}<br>Data=%{x}<br>Quantidade=%{y}<extra></extra>`,
+    }));
+
+    return {
+        data: traces,
+        layout: {
+            title: {text: "Viagens por Data e Status"}, barmode: "group",
+            plot_bgcolor: "white", paper_bgcolor: "white", height: 450,
+            legend: {title: {text: "Status da Viagem"}},
+            xaxis: {title: {text: "Data"}, type: "category", tickformat: "%d/%m", categoryorder: "array", categoryarray: eixo},
+            yaxis: {title: {text: "Quantidade de Viagens"}, showticklabels: false, range: [0, maximo * 1.15]},
+        },
+    };
+}
+
+function semDados(texto) {
+    return {data: [], layout: {annotations: [{text: texto}]}};
+}
@@ -0,0 +1,110 @@
+"""
+Atrasos - Dashboard de Monitoramento de Viagens
+Viagens ativas ordenadas pelo atraso (previsão - ETA planejado) e
+percentis por destino, calculados uma vez por snapshot
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from fontes import COLUNA_ATRASO
+from metricas import etapa
+
+# Viagens nesses status não contam como ativas
+STATUS_ENCERRADOS = {"Finalizado", "Cancelado"}
+PERCENTIS = (50, 90, 95)
+COLUNA_DESTINO = "destination_station_code"
+COLUNA_VIAGEM = "trip_number"
+
+
+class IndiceAtrasos:
+    """
+    Posições das viagens ativas com atraso conhecido, da mais atrasada
+    para a menos atrasada. Top-N e limiar são fatias desse vetor.
+    """
+
+    @etapa("indice_atrasos")
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.posicoes = np.empty(0, dtype=np.intp)
+        self.atrasos = np.empty(0, dtype=np.float32)
+        self.percentis: List[dict] = []
+        if COLUNA_ATRASO not in df.columns:
+            return
+
+        atraso = df[COLUNA_ATRASO].to_numpy(dtype=np.float32, na_value=np.nan)
+        ativas = ~np.isnan(atraso)
+        if "Status_da_Viagem" in df.columns:
+            ativas &= ~df["Status_da_Viagem"].isin(STATUS_ENCERRADOS).to_numpy()
+
+        candidatas = np.flatnonzero(ativas)
+        # Decrescente e estável: empates mantêm a ordem da planilha
+        ordem = np.argsort(-atraso[candidatas], kind="stable")
+        self.posicoes = candidatas[ordem]
+        self.atrasos = atraso[self.posicoes]
+        self.percentis = self._calcular_percentis()
+
+    def __len__(self):
+        return len(self.posicoes)
+
+    def acima_de(self, limiar: float = 0.0, destinos: Sequence[str] = ()) -> np.ndarray:
+        """Posições com atraso > limiar (minutos), da mais atrasada para a menos"""
+        # atrasos está em ordem decrescente: busca binária no vetor negado
+        fim = np.searchsorted(-self.atrasos, -limiar, side="left")
+        posicoes = self.posicoes[:fim]
+        if destinos and COLUNA_DESTINO in self.df.columns:
+            posicoes = posicoes[self.df[COLUNA_DESTINO].take(posicoes).isin(destinos).to_numpy()]
+        return posicoes
+
+    def por_destino(self, limiar: float = 0.0, destinos: Sequence[str] = (), limite: int = 10) -> List[dict]:
+        """Viagens atrasadas agrupadas por destino, dos destinos com mais atrasos para os com menos"""
+        posicoes = self.acima_de(limiar, destinos)
+        if not len(posicoes) or COLUNA_DESTINO not in self.df.columns:
+            return []
+
+        # Planilha sem LT: os grupos saem só com os atrasos
+        viagens = (self.df[COLUNA_VIAGEM].take(posicoes).astype(str).to_numpy()
+                   if COLUNA_VIAGEM in self.df.columns else np.full(len(posicoes), None, dtype=object))
+        linhas = pd.DataFrame({
+            "destino": self.df[COLUNA_DESTINO].take(posicoes).astype(str).to_numpy(),
+            COLUNA_VIAGEM: viagens,
+            "atraso": self.df[COLUNA_ATRASO].take(posicoes).to_numpy(),
+        })
+        grupos = []
+        # As linhas já vêm ordenadas por atraso: head() de cada grupo é o top do destino
+        for destino, grupo in linhas.groupby("destino", sort=False):
+            grupos.append({
+                "destino": destino,
+                "atrasadas": len(grupo),
+                "atraso_maximo": float(grupo["atraso"].iloc[0]),
+                "atraso_medio": round(float(grupo["atraso"].mean()), 1),
+                "viagens": [
+                    {COLUNA_VIAGEM: t, COLUNA_ATRASO: float(a)}
+                    for t, a in zip(grupo[COLUNA_VIAGEM].head(limite), grupo["atraso"].head(limite))
+                ],
+            })
+        grupos.sort(key=lambda g: (-g["atrasadas"], -g["atraso_maximo"]))
+        return grupos
+
+    def _calcular_percentis(self) -> List[dict]:
+        """Percentis do atraso das viagens ativas, por destino"""
+        if not len(self.posicoes) or COLUNA_DESTINO not in self.df.columns:
+            return []
+        atrasos = pd.Series(self.atrasos.astype(np.float64),
+                            index=self.df[COLUNA_DESTINO].take(self.posicoes).astype(str).to_numpy())
+        grupos = atrasos.groupby(level=0, sort=True)
+        quantis = grupos.quantile([p / 100 for p in PERCENTIS]).unstack()
+        resumo = pd.DataFrame({
+            "viagens": grupos.size(),
+            "atrasadas": (atrasos > 0).groupby(level=0, sort=True).sum(),
+            "atraso_maximo": grupos.max(),
+        })
+        resultado: List[Dict] = []
+        for destino, linha in resumo.iterrows():
+            item = {"destino": destino, "viagens": int(linha["viagens"]), "atrasadas": int(linha["atrasadas"])}
+            for p in PERCENTIS:
+                item[f"p{p}"] = round(float(quantis.loc[destino, p / 100]), 1)
+            item["atraso_maximo"] = float(linha["atraso_maximo"])
+            resultado.append(item)
+        return resultado
@@ -0,0 +1,87 @@
+"""
+Microbenchmarks por etapa - leitura, sincronização, índice, filtro,
+agregação, serialização e exportação sobre dados sintéticos
+Uso: python benchmarks/bench_etapas.py [--registros 10000 100000] [--saida etapas.json]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agregados import Agregados  # noqa: E402
+from atrasos import IndiceAtrasos  # noqa: E402
+from exportacao import gerar_csv  # noqa: E402
+from fontes import converter_tipos, dataframe_de_valores  # noqa: E402
+from formatos import FORMATOS, serializar  # noqa: E402
+from indices import IndiceFiltros, compactar, interpretar_ordenacao  # noqa: E402
+from resultados import cronometrar, salvar  # noqa: E402
+from sincronizacao import Sincronizador  # noqa: E402
+from sintetico import alterar, gerar_valores  # noqa: E402
+
+
+def etapas(registros: int):
+    """Gera (nome, função) de cada etapa, na ordem do pipeline"""
+    valores = gerar_valores(registros)
+    bruto = dataframe_de_valores(valores)
+    df = compactar(converter_tipos(bruto))
+    indice = IndiceFiltros(df)
+    agregados = Agregados.de_linhas(df)
+
+    destinos = indice.valores("destination_station_code")[:3]
+    viagens = indice.valores("trip_number")[:50]
+    posicoes = indice.filtrar({"Status_da_Viagem": ["Parado", "Em trânsito"]})
+    ordenacao = interpretar_ordenacao("-Data,trip_number", list(df.columns))
+    pagina = indice.selecionar(indice.pagina(posicoes, ordenacao, 0, 1000))
+    todos = np.arange(len(df))
+
+    sync = Sincronizador()
+    base, _ = sync.aplicar(bruto)
+    sync.definir_base(compactar(base))
+    alterado = alterar(bruto)
+
+    def sincronizar():
+        # Sempre a partir da mesma base: aplica a alteração e desfaz
+        sync.aplicar(alterado)
+        sync.aplicar(bruto)
+
+    yield "leitura.dataframe_de_valores", lambda: dataframe_de_valores(valores)
+    yield "leitura.converter_tipos", lambda: converter_tipos(bruto)
+    yield "leitura.compactar", lambda: compactar(converter_tipos(bruto))
+    yield "sincronizacao.1pct_alterado_ida_e_volta", sincronizar
+    yield "indice.montar", lambda: IndiceFiltros(df)
+    yield "filtro.status", lambda: indice.filtrar({"Status_da_Viagem": ["Parado"]})
+    yield "filtro.destinos_e_datas", lambda: indice.filtrar(
+        {"destination_station_code": destinos}, inicio="2024-02-01", fim="2024-04-30")
+    yield "filtro.50_viagens", lambda: indice.filtrar({"trip_number": viagens})
+    yield "filtro.pagina_ordenada_1000", lambda: indice.pagina(posicoes, ordenacao, 0, 1000)
+    yield "atrasos.montar", lambda: IndiceAtrasos(df)
+    yield "agregacao.montar", lambda: Agregados.de_linhas(df)
+    yield "agregacao.consultar_dia", lambda: agregados.consultar()
+    yield "agregacao.consultar_semana_destinos", lambda: agregados.consultar(destinos, bucket="week")
+    for formato in FORMATOS:
+        yield f"serializacao.{formato}_pagina_1000", lambda f=formato: serializar(pagina, f)
+        yield f"serializacao.{formato}_tudo", lambda f=formato: serializar(df, f)
+    yield "exportacao.csv_tudo", lambda: b"".join(gerar_csv(indice, todos))
+
+
+def executar(tamanhos, repeticoes: int) -> dict:
+    casos = []
+    for registros in tamanhos:
+        print(f"\n📊 {registros} registros (melhor de {repeticoes})")
+        for nome, funcao in etapas(registros):
+            tempos = cronometrar(funcao, repeticoes)
+            casos.append({"nome": f"{nome}@{registros}", "registros": registros, **tempos})
+            print(f"{nome:<45} {tempos['min_ms']:>10.2f} ms  (mediana {tempos['mediana_ms']:.2f})")
+    return {"benchmark": "etapas", "repeticoes": repeticoes, "casos": casos}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks por etapa")
+    parser.add_argument("--registros", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", help="Arquivo JSON com os resultados")
+    args = parser.parse_args()
+    salvar(executar(args.registros, args.repeticoes), args.saida)
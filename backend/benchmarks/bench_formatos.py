@@ -0,0 +1,46 @@
+"""
+Benchmark de serialização - tempo e bytes por formato de resposta
+Uso: python benchmarks/bench_formatos.py [registros]
+"""
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fontes import converter_tipos  # noqa: E402
+from formatos import FORMATOS, serializar  # noqa: E402
+from indices import compactar  # noqa: E402
+from sintetico import gerar_bruto  # noqa: E402
+
+
+def gerar(registros: int, seed: int = 0) -> pd.DataFrame:
+    return compactar(converter_tipos(gerar_bruto(registros, seed)))
+
+
+def medir(df: pd.DataFrame, repeticoes: int = 5):
+    # Referência: caminho antigo (lista de dicts + json da biblioteca padrão)
+    import json
+
+    def antigo():
+        registros = df.assign(Data=df["Data"].dt.strftime('%Y-%m-%d')).to_dict(orient="records")
+        return json.dumps(registros, ensure_ascii=False).encode("utf-8")
+
+    casos = {"to_dict+json (antigo)": antigo}
+    casos.update({nome: (lambda n=nome: serializar(df, n)) for nome in FORMATOS})
+
+    for nome, funcao in casos.items():
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            corpo = funcao()
+            tempos.append(time.perf_counter() - inicio)
+        print(f"{nome:<22} {min(tempos) * 1000:>9.1f} ms  {len(corpo) / 1024:>10.1f} KiB")
+
+
+if __name__ == "__main__":
+    registros = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"📊 Serialização de {registros} registros (melhor de 5)")
+    medir(gerar(registros))
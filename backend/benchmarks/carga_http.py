@@ -0,0 +1,207 @@
+"""
+Teste de carga HTTP - sobe o main.py com uma base sintética em arquivo
+(sem Google Sheets) e dispara clientes concorrentes contra os endpoints
+Uso: python benchmarks/carga_http.py [--registros 100000] [--clientes 16] [--duracao 20] [--saida carga.json]
+     python benchmarks/carga_http.py --url http://localhost:8000   (servidor já rodando)
+"""
+import argparse
+import http.client
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from resultados import percentil, salvar
+from sintetico import DIAS, gerar_bruto, salvar as salvar_base
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# (nome, peso, caminho); {data} vira uma data aleatória, para misturar acertos e falhas do cache
+CENARIOS = [
+    ("raiz", 1, "/"),
+    ("dados_pagina", 4, "/api/data?limit=100&sort=-Data&end_date={data}"),
+    ("dados_filtro_colunar", 2, "/api/data?status=Parado&limit=500&format=columnar&start_date={data}"),
+    ("stats", 3, "/api/stats?end_date={data}"),
+    ("stats_semana", 1, "/api/stats?bucket=week&destinations=ST000,ST001"),
+    ("filters", 1, "/api/filters?fields=status"),
+    ("search", 2, "/api/search?q=LT00&fields=trip_number"),
+    ("atrasos", 1, "/api/late-trips?limit=50&min_delay=60"),
+    ("export_csv", 1, "/api/export?status=Cancelado&start_date={data}"),
+]
+
+# ==================== SERVIDOR ====================
+
+def iniciar_servidor(registros: int, porta: int, pasta: Path) -> subprocess.Popen:
+    base = pasta / "base.parquet"
+    salvar_base(gerar_bruto(registros), base)
+    env = {
+        **os.environ,
+        "DASHBOARD_FONTE": str(base),
+        "DASHBOARD_SNAPSHOT": str(pasta / "snapshot.feather"),
+        "DASHBOARD_HISTORICO": str(pasta / "historico.sqlite"),
+        "DASHBOARD_CACHE": "local",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(porta), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL,
+    )
+
+
+def aguardar(url: str, prazo: float = 120):
+    """Espera o servidor responder e a primeira carga terminar"""
+    partes = urlsplit(url)
+    limite = time.time() + prazo
+    while time.time() < limite:
+        try:
+            conexao = http.client.HTTPConnection(partes.hostname, partes.port, timeout=prazo)
+            conexao.request("GET", "/api/data?limit=1")
+            if conexao.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Servidor não respondeu em {prazo}s")
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        for linha in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if linha.startswith("VmRSS:"):
+                return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class MonitorMemoria(threading.Thread):
+    """Amostra o RSS do servidor e guarda o pico"""
+
+    def __init__(self, pid: int, intervalo: float = 0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico: Optional[float] = None
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            rss = _rss_mb(self.pid)
+            if rss is not None:
+                self.pico = max(self.pico or 0.0, rss)
+
+    def parar(self) -> Optional[float]:
+        self._parar.set()
+        self.join()
+        return round(self.pico, 1) if self.pico is not None else None
+
+# ==================== CLIENTES ====================
+
+def cliente(url: str, ate: float, semente: int, saida: List[Tuple[str, float, int, int]]):
+    partes = urlsplit(url)
+    rng = random.Random(semente)
+    nomes = [c[0] for c in CENARIOS]
+    pesos = [c[1] for c in CENARIOS]
+    caminhos = {c[0]: c[2] for c in CENARIOS}
+    conexao = http.client.HTTPConnection(partes.hostname, partes.port, timeout=60)
+
+    while time.time() < ate:
+        nome = rng.choices(nomes, pesos)[0]
+        dia = rng.randrange(DIAS)
+        caminho = caminhos[nome].format(data=time.strftime("%Y-%m-%d", time.gmtime(1704067200 + dia * 86400)))
+        inicio = time.perf_counter()
+        try:
+            conexao.request("GET", caminho)
+            resposta = conexao.getresponse()
+            tamanho = len(resposta.read())
+            status = resposta.status
+        except (OSError, http.client.HTTPException):
+            conexao.close()
+            conexao = http.client.HTTPConnection(partes.hostname, partes.port, timeout=60)
+            tamanho, status = 0, 0
+        saida.append((nome, (time.perf_counter() - inicio) * 1000, status, tamanho))
+    conexao.close()
+
+
+def resumir(nome: str, amostras: List[Tuple[str, float, int, int]], duracao: float) -> Dict:
+    latencias = [a[1] for a in amostras]
+    ok = [a for a in amostras if a[2] == 200]
+    return {
+        "nome": nome,
+        "requisicoes": len(amostras),
+        "erros": len(amostras) - len(ok),
+        "req_por_segundo": round(len(amostras) / duracao, 1),
+        "p50_ms": round(percentil(latencias, 50) or 0, 2),
+        "p90_ms": round(percentil(latencias, 90) or 0, 2),
+        "p99_ms": round(percentil(latencias, 99) or 0, 2),
+        "bytes_medios": round(sum(a[3] for a in ok) / len(ok)) if ok else 0,
+    }
+
+
+def executar(url: str, clientes: int, duracao: float, pid: Optional[int]) -> dict:
+    amostras: List[Tuple[str, float, int, int]] = []
+    monitor = MonitorMemoria(pid) if pid else None
+    if monitor:
+        monitor.start()
+
+    ate = time.time() + duracao
+    threads = [threading.Thread(target=cliente, args=(url, ate, i, amostras)) for i in range(clientes)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    decorrido = time.perf_counter() - inicio
+
+    casos = [resumir("total", amostras, decorrido)]
+    for nome, _, _ in CENARIOS:
+        casos.append(resumir(nome, [a for a in amostras if a[0] == nome], decorrido))
+    if monitor:
+        casos.append({"nome": "servidor", "pico_rss_mb": monitor.parar()})
+
+    print(f"{'cenário':<22} {'req':>7} {'erros':>6} {'req/s':>8} {'p50':>9} {'p99':>9}")
+    for caso in casos:
+        if "requisicoes" in caso:
+            print(f"{caso['nome']:<22} {caso['requisicoes']:>7} {caso['erros']:>6} {caso['req_por_segundo']:>8.1f} "
+                  f"{caso['p50_ms']:>7.1f}ms {caso['p99_ms']:>7.1f}ms")
+        else:
+            print(f"💾 Pico de memória do servidor: {caso['pico_rss_mb']} MB")
+    return {"benchmark": "carga_http", "clientes": clientes, "duracao_s": duracao, "casos": casos}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga HTTP da API")
+    parser.add_argument("--registros", type=int, default=100_000)
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--duracao", type=float, default=20)
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--url", help="Usa um servidor já rodando em vez de subir um")
+    parser.add_argument("--saida", help="Arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    if args.url:
+        aguardar(args.url)
+        resultado = executar(args.url, args.clientes, args.duracao, None)
+    else:
+        with tempfile.TemporaryDirectory() as pasta:
+            url = f"http://127.0.0.1:{args.porta}"
+            print(f"🚀 Subindo API com {args.registros} registros sintéticos em {url}")
+            servidor = iniciar_servidor(args.registros, args.porta, Path(pasta))
+            try:
+                aguardar(url)
+                resultado = executar(url, args.clientes, args.duracao, servidor.pid)
+            finally:
+                servidor.terminate()
+                servidor.wait(timeout=10)
+        resultado["registros"] = args.registros
+    salvar(resultado, args.saida)
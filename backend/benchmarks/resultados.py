@@ -0,0 +1,101 @@
+"""
+Resultados de benchmark - medição, gravação em JSON e comparação entre versões
+Uso: python benchmarks/resultados.py antes.json depois.json
+"""
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# Métricas em que maior é melhor; nas demais (tempos, bytes, memória) menor é melhor
+MAIOR_MELHOR = {"req_por_segundo"}
+
+# ==================== MEDIÇÃO ====================
+
+def cronometrar(funcao: Callable[[], object], repeticoes: int = 5, aquecimento: int = 1) -> Dict[str, float]:
+    """Tempos em ms: melhor, mediana e pior de `repeticoes` execuções"""
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "min_ms": round(min(tempos), 3),
+        "mediana_ms": round(statistics.median(tempos), 3),
+        "max_ms": round(max(tempos), 3),
+    }
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[posicao]
+
+# ==================== GRAVAÇÃO ====================
+
+def _versao_git() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def ambiente() -> dict:
+    import pandas as pd
+    return {
+        "commit": _versao_git(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def salvar(resultado: dict, caminho: Optional[str]):
+    """Grava em JSON (ou só imprime quando não há caminho)"""
+    texto = json.dumps({"ambiente": ambiente(), **resultado}, ensure_ascii=False, indent=2)
+    if caminho:
+        Path(caminho).write_text(texto, encoding="utf-8")
+        print(f"💾 Resultado salvo em {caminho}")
+    else:
+        print(texto)
+
+# ==================== COMPARAÇÃO ====================
+
+def _metricas(resultado: dict) -> Dict[str, float]:
+    """Achata {"casos": [{"nome": ..., métricas...}]} em {"nome.métrica": valor}"""
+    metricas = {}
+    for caso in resultado.get("casos", []):
+        for chave, valor in caso.items():
+            if chave != "nome" and isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                metricas[f"{caso['nome']}.{chave}"] = valor
+    return metricas
+
+
+def comparar(antes: dict, depois: dict, limiar: float = 5.0):
+    """Variação percentual por métrica; ✅ melhora e ❌ piora acima do limiar"""
+    a, d = _metricas(antes), _metricas(depois)
+    print(f"{'métrica':<55} {'antes':>12} {'depois':>12} {'variação':>10}")
+    for chave in sorted(a.keys() & d.keys()):
+        if not a[chave]:
+            continue
+        variacao = (d[chave] - a[chave]) / a[chave] * 100
+        melhor = variacao > 0 if chave.rsplit(".", 1)[1] in MAIOR_MELHOR else variacao < 0
+        marca = "  " if abs(variacao) < limiar else ("✅" if melhor else "❌")
+        print(f"{chave:<55} {a[chave]:>12.3f} {d[chave]:>12.3f} {variacao:>+9.1f}% {marca}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    comparar(*(json.loads(Path(p).read_text(encoding="utf-8")) for p in sys.argv[1:]))
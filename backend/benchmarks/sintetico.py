@@ -0,0 +1,89 @@
+"""
+Gerador de dados sintéticos - "Base Principal" com as mesmas colunas e
+formatos de texto da planilha, para benchmarks offline
+Uso: python benchmarks/sintetico.py [registros] [saida.csv|.parquet|.feather]
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+COLUNAS = ["trip_number", "Data", "Status_da_Viagem", "destination_station_code",
+           "ETA Planejado", "Ultima localização", "Previsão de chegada", "Ocorrencia"]
+
+# Distribuições próximas às da operação: maioria em trânsito, poucos cancelados
+STATUS = {"Em trânsito": 0.50, "Finalizado": 0.30, "Parado": 0.15, "Cancelado": 0.05}
+OCORRENCIAS = {"": 0.80, "Atraso": 0.10, "Trânsito lento": 0.05, "Avaria": 0.03, "Sem sinal": 0.02}
+DESTINOS = 80
+LOCALIZACOES = 300
+DIAS = 180
+
+
+def _zipf(rng: np.random.Generator, n: int, tamanho: int, s: float = 1.1) -> np.ndarray:
+    """Índices 0..n-1 com poucos valores muito frequentes (destinos, cidades)"""
+    pesos = 1.0 / np.arange(1, n + 1) ** s
+    return rng.choice(n, size=tamanho, p=pesos / pesos.sum())
+
+
+def gerar_bruto(registros: int, seed: int = 0) -> pd.DataFrame:
+    """DataFrame só com texto, como o get_all_values() da planilha"""
+    rng = np.random.default_rng(seed)
+    dias = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, DIAS, registros), unit="D")
+    horas = pd.to_timedelta(rng.integers(6 * 60, 22 * 60, registros), unit="min")
+    eta = dias + horas
+    # Previsão atual: a maioria perto do planejado, uma cauda de atrasos longos
+    atraso = pd.to_timedelta(np.round(rng.gamma(1.5, 40, registros) - 30), unit="min")
+    previsao = eta + atraso
+
+    # Uma viagem (LT) aparece em média duas vezes
+    trip = rng.integers(0, max(registros // 2, 1), registros)
+
+    status = rng.choice(list(STATUS), registros, p=list(STATUS.values()))
+    ocorrencia = rng.choice(list(OCORRENCIAS), registros, p=list(OCORRENCIAS.values()))
+
+    df = pd.DataFrame({
+        "trip_number": np.char.add("LT", np.char.zfill(trip.astype(str), 7)),
+        "Data": dias.strftime("%d/%m/%Y"),
+        "Status_da_Viagem": status,
+        "destination_station_code": np.char.add("ST", np.char.zfill(_zipf(rng, DESTINOS, registros).astype(str), 3)),
+        "ETA Planejado": eta.strftime("%d/%m/%Y %H:%M"),
+        "Ultima localização": np.char.add("Cidade ", _zipf(rng, LOCALIZACOES, registros).astype(str)),
+        "Previsão de chegada": previsao.strftime("%d/%m/%Y %H:%M"),
+        "Ocorrencia": ocorrencia,
+    }, columns=COLUNAS)
+    return df.astype(object)
+
+
+def gerar_valores(registros: int, seed: int = 0) -> list:
+    """Matriz [cabeçalho, linhas...] no formato retornado pela API do Sheets"""
+    df = gerar_bruto(registros, seed)
+    return [list(df.columns)] + df.to_numpy().tolist()
+
+
+def alterar(bruto: pd.DataFrame, fracao: float = 0.01, seed: int = 1) -> pd.DataFrame:
+    """Cópia com uma fração das linhas mudando de status, como entre duas atualizações"""
+    rng = np.random.default_rng(seed)
+    alterado = bruto.copy()
+    linhas = rng.choice(len(bruto), size=max(int(len(bruto) * fracao), 1), replace=False)
+    alterado.loc[linhas, "Status_da_Viagem"] = rng.choice(list(STATUS), len(linhas))
+    return alterado
+
+
+def salvar(bruto: pd.DataFrame, caminho: Path):
+    sufixo = caminho.suffix.lower()
+    if sufixo == ".csv":
+        bruto.to_csv(caminho, index=False)
+    elif sufixo == ".parquet":
+        bruto.to_parquet(caminho, index=False)
+    elif sufixo in (".feather", ".arrow"):
+        bruto.reset_index(drop=True).to_feather(caminho)
+    else:
+        raise ValueError(f"Formato não suportado: {sufixo}")
+
+
+if __name__ == "__main__":
+    registros = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    saida = Path(sys.argv[2]) if len(sys.argv) > 2 else Path(f"base_sintetica_{registros}.csv")
+    salvar(gerar_bruto(registros), saida)
+    print(f"✅ {registros} registros gravados em {saida}")
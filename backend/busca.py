@@ -0,0 +1,163 @@
+"""
+Busca - Dashboard de Monitoramento de Viagens
+Índice de prefixos e trigramas sobre os valores distintos de cada coluna
+pesquisável, montado uma vez por snapshot, para autocompletar os filtros
+sem enviar listas inteiras ao navegador
+"""
+import unicodedata
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from metricas import etapa
+
+COLUNAS_BUSCA = ["trip_number", "destination_station_code", "Ultima localização", "Ocorrencia"]
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 100
+TAMANHO_NGRAMA = 3
+
+# Ordem dos resultados: igual > começa com > começa uma palavra > contém
+EXATO, PREFIXO, PALAVRA, CONTEM = range(4)
+
+# ==================== NORMALIZAÇÃO ====================
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples ('São Paulo' -> 'sao paulo')"""
+    decomposto = unicodedata.normalize("NFKD", str(texto))
+    return " ".join("".join(c for c in decomposto if not unicodedata.combining(c)).casefold().split())
+
+
+def ngramas(texto: str, n: int = TAMANHO_NGRAMA) -> set:
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+# ==================== ÍNDICE POR COLUNA ====================
+
+class _IndiceColuna:
+    """Valores distintos de uma coluna, ordenados pela forma normalizada"""
+
+    def __init__(self, valores: np.ndarray, contagens: np.ndarray):
+        normalizados = [normalizar(v) for v in valores]
+        # Valores com a mesma forma normalizada ('São'/'Sao') desempatam pelo original
+        ordem = sorted(range(len(valores)), key=lambda i: (normalizados[i], str(valores[i])))
+        self.valores = valores[ordem] if len(ordem) else valores
+        self.normalizados = [normalizados[i] for i in ordem]
+        self.contagens = contagens[ordem] if len(ordem) else contagens
+        self.posicao = {v: i for i, v in enumerate(self.valores)}
+        # Posto de cada id por (tamanho, ordem alfabética): desempate de _melhores
+        comprimentos = np.fromiter((len(t) for t in self.normalizados), dtype=np.int64, count=len(ordem))
+        self.posto = np.empty(len(ordem), dtype=np.int64)
+        self.posto[np.argsort(comprimentos, kind="stable")] = np.arange(len(ordem))
+
+        listas: Dict[str, list] = {}
+        for i, texto in enumerate(self.normalizados):
+            for ngrama in ngramas(texto):
+                listas.setdefault(ngrama, []).append(i)
+        self.ngramas = {g: np.array(ids, dtype=np.int32) for g, ids in listas.items()}
+
+    def com_contagens(self, valores: np.ndarray, contagens: np.ndarray) -> "_IndiceColuna":
+        """Mesmos valores, contagens novas: reaproveita a estrutura"""
+        copia = object.__new__(_IndiceColuna)
+        copia.__dict__.update(self.__dict__)
+        copia.contagens = np.zeros(len(self.valores), dtype=contagens.dtype)
+        copia.contagens[[self.posicao[v] for v in valores]] = contagens
+        return copia
+
+    def _prefixo(self, termo: str) -> tuple:
+        """(valores iguais ao termo, valores que começam com ele), como intervalos"""
+        inicio = bisect_left(self.normalizados, termo)
+        iguais = bisect_right(self.normalizados, termo, inicio)
+        fim = bisect_left(self.normalizados, termo + "\uffff", iguais)
+        return range(inicio, iguais), range(iguais, fim)
+
+    def _contem(self, termo: str) -> np.ndarray:
+        listas = [self.ngramas.get(g) for g in ngramas(termo)]
+        if any(lista is None for lista in listas):
+            return np.empty(0, dtype=np.int32)
+        listas.sort(key=len)
+        candidatos = listas[0]
+        for lista in listas[1:]:
+            candidatos = np.intersect1d(candidatos, lista, assume_unique=True)
+            if not len(candidatos):
+                break
+        # Trigramas em comum não garantem a substring inteira
+        return np.array([i for i in candidatos if termo in self.normalizados[i]], dtype=np.int32)
+
+    def _melhores(self, ids: np.ndarray, limite: int) -> np.ndarray:
+        """Os `limite` mais frequentes (empate: mais curto, depois alfabético)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        contagens = self.contagens[ids]
+        if len(ids) > limite:
+            # Todos os empatados com o limite-ésimo entram na ordenação: o corte não depende da partição
+            limiar = np.partition(contagens, len(ids) - limite)[len(ids) - limite]
+            manter = contagens >= limiar
+            ids, contagens = ids[manter], contagens[manter]
+        return ids[np.lexsort((self.posto[ids], -contagens))[:limite]]
+
+    def buscar(self, termo: str, limite: int) -> List[tuple]:
+        """[(nível, id)] ordenados, no máximo `limite`"""
+        if not termo:
+            return [(CONTEM, i) for i in self._melhores(np.arange(len(self.valores)), limite)]
+
+        iguais, prefixo = self._prefixo(termo)
+        niveis = [(EXATO, np.arange(iguais.start, iguais.stop)), (PREFIXO, np.arange(prefixo.start, prefixo.stop))]
+        if len(termo) >= TAMANHO_NGRAMA:
+            contem = self._contem(termo)
+            contem = contem[(contem < iguais.start) | (contem >= prefixo.stop)]
+            palavra = np.array([f" {termo}" in f" {self.normalizados[i]}" for i in contem], dtype=bool)
+            niveis += [(PALAVRA, contem[palavra]), (CONTEM, contem[~palavra])]
+
+        resultado = []
+        for nivel, ids in niveis:
+            if len(resultado) >= limite:
+                break
+            resultado += [(nivel, i) for i in self._melhores(ids, limite - len(resultado))]
+        return resultado
+
+# ==================== ÍNDICE DO SNAPSHOT ====================
+
+class IndiceBusca:
+    """
+    Um índice por coluna pesquisável. Com o índice da versão anterior,
+    colunas cujo conjunto de valores não mudou só têm as contagens trocadas.
+    """
+
+    @etapa("indice_busca")
+    def __init__(self, df: pd.DataFrame, anterior: Optional["IndiceBusca"] = None):
+        self.colunas: Dict[str, _IndiceColuna] = {}
+        for col in COLUNAS_BUSCA:
+            if col not in df.columns:
+                continue
+            contagens = df[col].value_counts(sort=False, dropna=True)
+            contagens = contagens[contagens > 0]
+            valores = contagens.index.astype(str).to_numpy(dtype=object)
+            mascara = valores != ""
+            valores, numeros = valores[mascara], contagens.to_numpy()[mascara]
+
+            antigo = anterior.colunas.get(col) if anterior is not None else None
+            if antigo is not None and len(antigo.valores) == len(valores) and all(v in antigo.posicao for v in valores):
+                self.colunas[col] = antigo.com_contagens(valores, numeros)
+            else:
+                self.colunas[col] = _IndiceColuna(valores, numeros)
+
+    def buscar(self, termo: str, colunas: Optional[Sequence[str]] = None, limite: int = LIMITE_PADRAO) -> List[dict]:
+        """
+        Até `limite` valores que casam com `termo`, dos mais relevantes aos menos.
+        Sem termo, retorna os mais frequentes.
+        """
+        termo = normalizar(termo or "")
+        limite = max(1, min(limite, LIMITE_MAXIMO))
+        candidatos = []
+        for col in (colunas or COLUNAS_BUSCA):
+            indice = self.colunas.get(col)
+            if indice is None:
+                continue
+            for nivel, i in indice.buscar(termo, limite):
+                candidatos.append((nivel, -int(indice.contagens[i]), len(indice.normalizados[i]), col, i))
+
+        candidatos.sort(key=lambda c: c[:3])
+        return [
+            {"campo": col, "valor": str(self.colunas[col].valores[i]), "contagem": -negativo}
+            for _, negativo, _, col, i in candidatos[:limite]
+        ]
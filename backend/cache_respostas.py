@@ -0,0 +1,149 @@
+"""
+Cache de respostas - Dashboard de Monitoramento de Viagens
+LRU de respostas serializadas por (versão do snapshot, endpoint, filtros
+normalizados) e validação condicional com ETag / Last-Modified
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+MAX_ITENS = 256
+MAX_BYTES = 64 * 1024 * 1024  # 64 MB
+
+# ==================== NORMALIZAÇÃO ====================
+
+# Parâmetros cuja ordem dos valores não muda o resultado
+PARAMETROS_CONJUNTO = {"trip_numbers", "destinations", "status"}
+
+
+def normalizar_parametros(params: Dict[str, Optional[str]]) -> Tuple[Tuple[str, str], ...]:
+    """Mesmos filtros em outra ordem (ou com espaços) geram a mesma chave"""
+    itens = []
+    for nome, valor in params.items():
+        if valor is None or valor == "":
+            continue
+        valor = str(valor)
+        if nome in PARAMETROS_CONJUNTO:
+            valor = ",".join(sorted({x.strip() for x in valor.split(",") if x.strip()}))
+            if not valor:
+                continue
+        itens.append((nome, valor))
+    return tuple(sorted(itens))
+
+# ==================== LRU ====================
+
+class RespostaCacheada:
+    __slots__ = ("corpo", "media_type", "headers")
+
+    def __init__(self, corpo: bytes, media_type: Optional[str], headers: Dict[str, str]):
+        self.corpo = corpo
+        self.media_type = media_type
+        self.headers = headers
+
+
+class CacheRespostas:
+    """LRU limitado por quantidade de itens e por bytes"""
+
+    def __init__(self, max_itens: int = MAX_ITENS, max_bytes: int = MAX_BYTES):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self._itens: "OrderedDict[tuple, RespostaCacheada]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave: tuple) -> Optional[RespostaCacheada]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item
+
+    def guardar(self, chave: tuple, item: RespostaCacheada):
+        if len(item.corpo) > self.max_bytes:
+            return
+        with self._lock:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None:
+                self._bytes -= len(antigo.corpo)
+            self._itens[chave] = item
+            self._bytes += len(item.corpo)
+            while len(self._itens) > self.max_itens or self._bytes > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self._bytes -= len(removido.corpo)
+
+    def descartar_versoes_antigas(self, versao_atual: str):
+        """Respostas de snapshots anteriores nunca mais serão servidas"""
+        with self._lock:
+            for chave in [c for c in self._itens if c[0] != versao_atual]:
+                self._bytes -= len(self._itens.pop(chave).corpo)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"itens": len(self._itens), "bytes": self._bytes, "acertos": self.acertos, "falhas": self.falhas}
+
+# ==================== VALIDAÇÃO CONDICIONAL ====================
+
+def gerar_etag(versao: str, endpoint: str, chave: tuple) -> str:
+    resumo = hashlib.blake2b(repr((endpoint, chave)).encode(), digest_size=8).hexdigest()
+    return f'"{versao}-{resumo}"'
+
+
+def nao_modificado(request: Request, etag: str, modificado_em: float) -> bool:
+    """If-None-Match tem prioridade sobre If-Modified-Since (RFC 9110)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+        return "*" in etags or etag in etags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(modificado_em) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def responder_com_cache(request: Request, respostas: CacheRespostas, versao: str, modificado_em: float,
+                              endpoint: str, params: Dict[str, Optional[str]],
+                              gerar: Callable[[], Awaitable[Response]]) -> Response:
+    """
+    Responde 304 se o cliente já tem a versão, serve do LRU se a mesma
+    consulta já foi serializada nesta versão, ou gera e guarda a resposta.
+    Só a geração é aguardada; 304 e HIT respondem direto no event loop.
+    """
+    chave = normalizar_parametros(params)
+    etag = gerar_etag(versao, endpoint, chave)
+    validadores = {
+        "ETag": etag,
+        "Last-Modified": formatdate(modificado_em, usegmt=True),
+        # Navegadores sempre revalidam, recebendo 304 enquanto a versão não mudar
+        "Cache-Control": "no-cache",
+    }
+
+    if nao_modificado(request, etag, modificado_em):
+        return Response(status_code=304, headers=validadores)
+
+    item = respostas.obter((versao, endpoint, chave))
+    if item is None:
+        resposta = await gerar()
+        if resposta.status_code != 200:
+            return resposta
+        headers = {k: v for k, v in resposta.headers.items() if k.lower() not in ("content-length", "content-type")}
+        item = RespostaCacheada(resposta.body, resposta.media_type, headers)
+        respostas.guardar((versao, endpoint, chave), item)
+        cache_status = "MISS"
+    else:
+        cache_status = "HIT"
+
+    return Response(content=item.corpo, media_type=item.media_type,
+                    headers={**item.headers, **validadores, "X-Cache": cache_status})
@@ -0,0 +1,191 @@
+"""
+Snapshot compartilhado - Dashboard de Monitoramento de Viagens
+Um único processo busca a planilha e publica cada versão como arquivo
+Arrow IPC; workers da API e o Dash mapeiam o arquivo em memória e
+recarregam quando o ponteiro de versão muda
+
+Uso:
+    python compartilhado.py                              (publicador)
+    set DASHBOARD_CACHE=leitor && python main.py         (leitores)
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from sincronizacao import Delta
+
+# ==================== CONFIGURAÇÕES ====================
+
+DIRETORIO_COMPARTILHADO = Path(os.environ.get(
+    "DASHBOARD_COMPARTILHADO", Path(__file__).parent.parent / "cache" / "compartilhado"
+))
+PONTEIRO = "atual.json"
+# Versões antigas mantidas para leitores que ainda não trocaram de arquivo
+MANTER_VERSOES = 3
+# Intervalo de verificação do ponteiro nos leitores
+INTERVALO_LEITURA = 2  # segundos
+
+PARTES_DELTA = ("adicionados", "atualizados", "anteriores", "removidos")
+
+# ==================== ESCRITA ====================
+
+def _escrever_arrow(df: pd.DataFrame, caminho: Path):
+    """Arrow IPC sem compressão, para poder ser mapeado sem cópia"""
+    tabela = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+    tmp = caminho.with_suffix(".tmp")
+    with pa.OSFile(str(tmp), "wb") as arquivo:
+        with pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    os.replace(tmp, caminho)
+
+
+def _escrever_delta(delta: Delta, caminho: Path) -> bool:
+    """As quatro partes do delta num só arquivo, com a coluna `_parte`"""
+    partes = [getattr(delta, nome).assign(_parte=nome) for nome in PARTES_DELTA
+              if not getattr(delta, nome).empty]
+    if not partes:
+        return False
+    # Categorias diferentes entre as partes: grava como texto
+    partes = [p.astype({c: object for c in p.columns if isinstance(p[c].dtype, pd.CategoricalDtype)})
+              for p in partes]
+    _escrever_arrow(pd.concat(partes, ignore_index=True), caminho)
+    return True
+
+
+def _substituir(tmp: Path, destino: Path, tentativas: int = 5):
+    """os.replace com novas tentativas: no Windows falha se um leitor estiver com o arquivo aberto"""
+    for tentativa in range(tentativas):
+        try:
+            os.replace(tmp, destino)
+            return
+        except PermissionError:
+            if tentativa == tentativas - 1:
+                raise
+            time.sleep(0.05)
+
+
+class PublicadorSnapshot:
+    """
+    Ouvinte do CacheDados que publica cada nova versão.
+
+    O arquivo da versão é escrito antes; o ponteiro `atual.json` só é
+    trocado depois, com rename atômico. Um leitor nunca vê versão parcial.
+    """
+
+    def __init__(self, diretorio: Path = DIRETORIO_COMPARTILHADO, manter: int = MANTER_VERSOES):
+        self.diretorio = Path(diretorio)
+        self.manter = manter
+        self.__name__ = "publicar_snapshot"
+
+    def __call__(self, novo, anterior):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        arquivo = f"snapshot-{novo.id}.arrow"
+        _escrever_arrow(novo.df, self.diretorio / arquivo)
+
+        # Delta só serve para quem estava exatamente na versão anterior
+        arquivo_delta = None
+        if anterior is not None and not novo.delta.completo:
+            arquivo_delta = f"delta-{novo.id}.arrow"
+            if not _escrever_delta(novo.delta, self.diretorio / arquivo_delta):
+                arquivo_delta = None
+
+        ponteiro = {
+            "id": novo.id,
+            "versao": novo.versao,
+            "modificado_em": novo.modificado_em,
+            "publicado_em": time.time(),
+            "registros": len(novo.df),
+            "arquivo": arquivo,
+            "anterior": anterior.id if anterior is not None else None,
+            "delta": arquivo_delta,
+        }
+        tmp = self.diretorio / (PONTEIRO + ".tmp")
+        tmp.write_text(json.dumps(ponteiro), encoding="utf-8")
+        _substituir(tmp, self.diretorio / PONTEIRO)
+        print(f"📤 Snapshot {novo.id} publicado ({len(novo.df)} registros)")
+        self._limpar({arquivo, arquivo_delta})
+
+    def _limpar(self, atuais: set):
+        arquivos = sorted(
+            (p for p in self.diretorio.glob("*.arrow") if p.name not in atuais),
+            key=lambda p: p.stat().st_mtime, reverse=True,
+        )
+        for antigo in arquivos[self.manter * 2:]:
+            try:
+                antigo.unlink()
+            except OSError:
+                # Ainda mapeado por algum leitor (Windows): fica para a próxima
+                pass
+
+# ==================== LEITURA ====================
+
+def ler_ponteiro(diretorio: Path = DIRETORIO_COMPARTILHADO) -> Optional[dict]:
+    """Conteúdo de `atual.json`, ou None se nada foi publicado ainda"""
+    try:
+        return json.loads((Path(diretorio) / PONTEIRO).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _tipo_pandas(tipo: pa.DataType):
+    """Texto vira ArrowDtype, que usa os buffers do arquivo, em vez de um str do Python por linha"""
+    if pa.types.is_string(tipo) or pa.types.is_large_string(tipo):
+        return pd.ArrowDtype(tipo)
+    return None
+
+
+def _mapear(caminho: Path) -> pd.DataFrame:
+    """
+    Lê o arquivo por memory map. Os buffers lidos apontam para o mapa, que
+    fica aberto enquanto o DataFrame existir (mesmo depois do arquivo ser
+    removido pelo publicador). Colunas de texto e numéricas sem ausentes
+    usam essas páginas, compartilhadas entre os processos pelo cache do
+    sistema; o que cada processo copia são os códigos e os valores
+    distintos das categorias e as datas com ausentes.
+    """
+    tabela = pa.ipc.open_file(pa.memory_map(str(caminho), "r")).read_all()
+    return tabela.to_pandas(split_blocks=True, types_mapper=_tipo_pandas)
+
+
+def mapear_snapshot(ponteiro: dict, diretorio: Path = DIRETORIO_COMPARTILHADO) -> pd.DataFrame:
+    return _mapear(Path(diretorio) / ponteiro["arquivo"])
+
+
+def ler_delta(ponteiro: dict, diretorio: Path = DIRETORIO_COMPARTILHADO) -> Delta:
+    """Delta publicado junto com a versão"""
+    if not ponteiro.get("delta"):
+        return Delta()
+    df = _mapear(Path(diretorio) / ponteiro["delta"])
+    partes = {nome: grupo.drop(columns="_parte").reset_index(drop=True)
+              for nome, grupo in df.groupby("_parte", sort=False)}
+    return Delta(**{nome: partes.get(nome) for nome in PARTES_DELTA})
+
+# ==================== PUBLICADOR ====================
+
+if __name__ == "__main__":
+    os.environ.setdefault("DASHBOARD_CACHE", "publicador")
+    from dados import MODO_CACHE, cache, carregar_dados
+
+    if MODO_CACHE != "publicador":
+        print(f"❌ DASHBOARD_CACHE={MODO_CACHE}: o publicador precisa do modo 'publicador'")
+        exit(1)
+
+    print("\n" + "="*70)
+    print("📤 PUBLICADOR DE SNAPSHOT")
+    print("="*70)
+    print(f"📂 Diretório: {DIRETORIO_COMPARTILHADO}")
+    print("="*70 + "\n")
+
+    if not cache.restaurar_do_disco():
+        carregar_dados()
+    cache.iniciar_atualizacao_periodica()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        cache.parar()
@@ -0,0 +1,432 @@
+"""
+Camada de dados compartilhada - Dashboard de Monitoramento de Viagens
+Snapshot da planilha com atualização em segundo plano (stale-while-revalidate)
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from agregados import Agregados
+from atrasos import IndiceAtrasos
+from busca import IndiceBusca
+from compartilhado import (DIRETORIO_COMPARTILHADO, INTERVALO_LEITURA, PublicadorSnapshot,
+                           ler_delta, ler_ponteiro, mapear_snapshot)
+from fontes import COLUNAS_TABELA, FonteDados, FonteMultipla, converter_tipos, fonte_configurada
+from historico import HISTORICO_ATIVO, historico
+from indices import IndiceFiltros, compactar
+from metricas import BUSCAS, CACHE_SNAPSHOT, etapa, registro
+from sincronizacao import Delta, Sincronizador
+
+# ==================== CONFIGURAÇÕES ====================
+
+CACHE_DURATION = 60  # segundos
+# Reaproveita as linhas que não mudaram entre uma busca e outra
+SYNC_INCREMENTAL = True
+# Último snapshot bom, em Feather (Arrow IPC), para partida a frio rápida
+SNAPSHOT_PATH = Path(os.environ.get("DASHBOARD_SNAPSHOT", Path(__file__).parent.parent / "cache" / "snapshot.feather"))
+# local: cada processo busca na fonte | publicador: busca e publica em DIRETORIO_COMPARTILHADO
+# leitor: não acessa a fonte, só mapeia o snapshot publicado (vários workers / Dash)
+MODO_CACHE = os.environ.get("DASHBOARD_CACHE", "local")
+
+# ==================== PERSISTÊNCIA ====================
+
+# Versão, versão da fonte e colunas brutas vão no schema do Feather; as impressões, numa coluna
+CHAVE_METADADOS = b"dashboard"
+COLUNA_IMPRESSAO = "__impressao"
+
+def salvar_snapshot(df: pd.DataFrame, caminho: Path = SNAPSHOT_PATH, metadados: Optional[dict] = None,
+                    impressoes_linhas: Optional[np.ndarray] = None):
+    """
+    Grava o snapshot em disco de forma atômica (arquivo temporário + rename).
+    `metadados` vão no schema e `impressoes_linhas` numa coluna extra, para que
+    a sincronização continue incremental depois de reiniciar.
+    """
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    tmp = caminho.with_suffix(".tmp")
+    df = df.reset_index(drop=True)
+    if impressoes_linhas is not None:
+        df = df.assign(**{COLUNA_IMPRESSAO: impressoes_linhas})
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    if metadados:
+        tabela = tabela.replace_schema_metadata({**tabela.schema.metadata, CHAVE_METADADOS: orjson.dumps(metadados)})
+    feather.write_feather(tabela, tmp)
+    os.replace(tmp, caminho)
+
+
+def ler_snapshot(caminho: Path = SNAPSHOT_PATH) -> Optional[Tuple[pd.DataFrame, dict, Optional[np.ndarray]]]:
+    """(DataFrame, metadados, impressões) do snapshot salvo; None se não existir ou estiver corrompido"""
+    if not caminho.exists():
+        return None
+    try:
+        tabela = feather.read_table(caminho)
+        df = tabela.to_pandas()
+    except Exception as e:
+        print(f"⚠️ Snapshot em disco ignorado: {e}")
+        return None
+    bruto = (tabela.schema.metadata or {}).get(CHAVE_METADADOS)
+    metadados = orjson.loads(bruto) if bruto else {}
+    impressoes_linhas = None
+    if COLUNA_IMPRESSAO in df.columns:
+        impressoes_linhas = df.pop(COLUNA_IMPRESSAO).to_numpy(dtype=np.uint64)
+    return df, metadados, impressoes_linhas
+
+# ==================== SNAPSHOT ====================
+
+class Snapshot:
+    """Versão imutável dos dados carregados"""
+
+    __slots__ = ("df", "timestamp", "versao", "delta", "indice", "agregados", "modificado_em", "busca", "atrasos")
+
+    def __init__(self, df: pd.DataFrame, timestamp: float, versao: int, delta: Optional[Delta] = None,
+                 indice: Optional[IndiceFiltros] = None, agregados: Optional[Agregados] = None,
+                 modificado_em: Optional[float] = None, busca: Optional[IndiceBusca] = None,
+                 atrasos: Optional[IndiceAtrasos] = None):
+        self.df = df
+        # timestamp: última busca na fonte; modificado_em: última vez que os dados mudaram
+        self.timestamp = timestamp
+        self.modificado_em = modificado_em if modificado_em is not None else timestamp
+        self.versao = versao
+        # Diferença em relação à versão anterior
+        self.delta = delta if delta is not None else Delta(completo=True)
+        # Montado aqui, fora do caminho das requisições
+        self.indice = indice if indice is not None else IndiceFiltros(df)
+        self.agregados = agregados if agregados is not None else Agregados.de_linhas(df)
+        self.busca = busca if busca is not None else IndiceBusca(df)
+        self.atrasos = atrasos if atrasos is not None else IndiceAtrasos(df)
+
+    @property
+    def idade(self) -> float:
+        return time.time() - self.timestamp
+
+    @property
+    def id(self) -> str:
+        """Identificador da versão, único também entre reinícios do processo"""
+        return f"{int(self.modificado_em)}-{self.versao}"
+
+
+class CacheDados:
+    """
+    Cache do snapshot com atualização em segundo plano.
+
+    - Enquanto existe um snapshot, ele é sempre servido, mesmo vencido;
+      o vencimento apenas dispara uma atualização em background.
+    - Só uma busca roda por vez (single-flight), não importa quantas
+      requisições encontrem o cache vencido.
+    - O novo snapshot substitui o anterior numa única atribuição.
+    """
+
+    def __init__(self, fonte: FonteDados, duracao: int = CACHE_DURATION,
+                 persistencia: Optional[Path] = SNAPSHOT_PATH, incremental: bool = SYNC_INCREMENTAL):
+        self.fonte = fonte
+        self.duracao = duracao
+        self.persistencia = persistencia
+        self.incremental = incremental
+        self._sync = Sincronizador()
+        self._versao_fonte: Optional[str] = None
+        self._snapshot: Optional[Snapshot] = None
+        self._cond = threading.Condition()
+        self._atualizando = False
+        self._ultima_tentativa: Optional[float] = None
+        self._ultimo_erro: Optional[Exception] = None
+        self._parar = threading.Event()
+        self._thread_periodica: Optional[threading.Thread] = None
+        self._ouvintes: List[Callable[[Snapshot, Optional[Snapshot]], None]] = []
+
+    def definir_fonte(self, fonte: FonteDados):
+        """Troca a fonte; o snapshot atual continua servido até a próxima busca"""
+        self.fonte = fonte
+        self._sync.reiniciar()
+        self._versao_fonte = None
+
+    def adicionar_ouvinte(self, ouvinte: Callable[["Snapshot", Optional["Snapshot"]], None]):
+        """`ouvinte(novo, anterior)` é chamado na thread de atualização a cada nova versão"""
+        self._ouvintes.append(ouvinte)
+
+    def _notificar(self, novo: Snapshot, anterior: Optional[Snapshot]):
+        for ouvinte in self._ouvintes:
+            try:
+                ouvinte(novo, anterior)
+            except Exception as e:
+                print(f"⚠️ Ouvinte {getattr(ouvinte, '__name__', ouvinte)} falhou: {e}")
+
+    # -------- leitura --------
+
+    def atual(self) -> Optional[Snapshot]:
+        """Snapshot atual sem disparar carga nem atualização"""
+        return self._snapshot
+
+    def snapshot(self) -> Snapshot:
+        """Retorna o snapshot atual, carregando de forma síncrona só na primeira vez"""
+        snap = self._snapshot
+        if snap is None:
+            CACHE_SNAPSHOT.inc(resultado="miss")
+            return self._carga_inicial()
+
+        if snap.idade >= self.duracao:
+            CACHE_SNAPSHOT.inc(resultado="stale")
+            self.atualizar_em_segundo_plano()
+        else:
+            CACHE_SNAPSHOT.inc(resultado="hit")
+        return snap
+
+    def obter(self) -> pd.DataFrame:
+        return self.snapshot().df
+
+    # -------- atualização --------
+
+    def _iniciar_busca(self) -> bool:
+        """Marca uma busca em andamento; retorna False se já existe uma"""
+        with self._cond:
+            if self._atualizando:
+                return False
+            self._atualizando = True
+            return True
+
+    def _executar_busca(self):
+        self._ultima_tentativa = time.time()
+        try:
+            anterior = self._snapshot
+            with etapa("fonte"):
+                bruto, versao_fonte = self.fonte.buscar(self._versao_fonte if anterior else None)
+
+            if bruto is None:
+                delta = Delta()
+            elif self.incremental:
+                df, delta = self._sync.aplicar(bruto)
+            else:
+                df, delta = converter_tipos(bruto), Delta(completo=True)
+
+            if anterior is not None and delta.vazio:
+                # Nada mudou: mantém a versão e só renova o horário
+                self._snapshot = Snapshot(anterior.df, time.time(), anterior.versao, delta,
+                                          anterior.indice, anterior.agregados, anterior.modificado_em,
+                                          anterior.busca, anterior.atrasos)
+                BUSCAS.inc(resultado="sem_alteracao")
+            else:
+                df = compactar(df)
+                if self.incremental:
+                    self._sync.definir_base(df)
+                versao = anterior.versao + 1 if anterior else 1
+                # Com delta, os agregados são atualizados em vez de recalculados
+                agregados = anterior.agregados.aplicar(delta) if anterior and not delta.completo else None
+                # A busca só remonta as colunas que ganharam ou perderam valores
+                busca = IndiceBusca(df, anterior.busca) if anterior else None
+                self._snapshot = Snapshot(df, time.time(), versao, delta, agregados=agregados, busca=busca)
+                if self.persistencia is not None:
+                    self._persistir(self._snapshot, versao_fonte)
+                if not delta.completo:
+                    print(f"🔁 Sincronização incremental: {delta}")
+                BUSCAS.inc(resultado="nova_versao")
+                self._notificar(self._snapshot, anterior)
+
+            self._versao_fonte = versao_fonte
+            self._ultimo_erro = None
+        except Exception as e:
+            self._ultimo_erro = e
+            BUSCAS.inc(resultado="erro")
+            print(f"❌ Erro: {e}")
+        finally:
+            with self._cond:
+                self._atualizando = False
+                self._cond.notify_all()
+
+    def _persistir(self, snap: Snapshot, versao_fonte: Optional[str]):
+        metadados = {"versao": snap.versao, "modificado_em": snap.modificado_em, "versao_fonte": versao_fonte}
+        estado = self._sync.estado() if self.incremental else None
+        impressoes_linhas = None
+        if estado is not None and len(estado[0]) == len(snap.df):
+            impressoes_linhas, metadados["colunas"] = estado
+        try:
+            with etapa("persistencia"):
+                salvar_snapshot(snap.df, self.persistencia, metadados, impressoes_linhas)
+        except Exception as e:
+            print(f"⚠️ Não foi possível salvar o snapshot: {e}")
+
+    def restaurar_do_disco(self) -> bool:
+        """
+        Carrega o último snapshot salvo, se houver, e agenda uma atualização.
+        Permite servir dados logo após reiniciar, sem esperar a fonte. Versão,
+        versão da fonte e impressões salvas fazem a fonte inalterada não gerar
+        versão nova (ETags, cache de respostas e clientes SSE seguem válidos).
+        """
+        if self._snapshot is not None or self.persistencia is None:
+            return self._snapshot is not None
+
+        lido = ler_snapshot(self.persistencia)
+        if lido is None:
+            return False
+        df, metadados, impressoes_linhas = lido
+        # Snapshot salvo por versão anterior pode ter os horários ainda como texto
+        df = compactar(converter_tipos(df))
+
+        self._versao_fonte = metadados.get("versao_fonte")
+        if self.incremental and impressoes_linhas is not None and metadados.get("colunas"):
+            self._sync.restaurar(df, impressoes_linhas, metadados["colunas"])
+        # Usa o horário do arquivo: o snapshot restaurado já nasce com sua idade real
+        self._snapshot = Snapshot(df, self.persistencia.stat().st_mtime, metadados.get("versao", 1),
+                                  modificado_em=metadados.get("modificado_em"))
+        print(f"💾 {len(df)} registros restaurados do disco")
+        self._notificar(self._snapshot, None)
+        self.atualizar_em_segundo_plano()
+        return True
+
+    def _carga_inicial(self) -> Snapshot:
+        """Sem snapshot: a primeira requisição busca e as demais aguardam a mesma busca"""
+        while self._snapshot is None:
+            if self._iniciar_busca():
+                self._executar_busca()
+                if self._snapshot is None:
+                    raise self._ultimo_erro
+            else:
+                with self._cond:
+                    while self._atualizando:
+                        self._cond.wait()
+                if self._snapshot is None and self._ultimo_erro:
+                    raise self._ultimo_erro
+        return self._snapshot
+
+    def atualizar_em_segundo_plano(self) -> bool:
+        """Dispara uma busca em background; ignora se já houver uma em andamento"""
+        if not self._iniciar_busca():
+            return False
+        threading.Thread(target=self._executar_busca, name="atualizador-dados", daemon=True).start()
+        return True
+
+    def iniciar_atualizacao_periodica(self):
+        """Atualiza o snapshot a cada `duracao` segundos, fora do caminho das requisições"""
+        if self._thread_periodica is not None:
+            return
+
+        def _loop():
+            while not self._parar.wait(self.duracao):
+                self.atualizar_em_segundo_plano()
+
+        self._parar.clear()
+        self._thread_periodica = threading.Thread(target=_loop, name="atualizacao-periodica", daemon=True)
+        self._thread_periodica.start()
+
+    def parar(self):
+        self._parar.set()
+        self._thread_periodica = None
+
+    # -------- observabilidade --------
+
+    def status(self) -> dict:
+        snap = self._snapshot
+        return {
+            "versao": snap.versao if snap else None,
+            "versao_id": snap.id if snap else None,
+            "modificado_em": snap.modificado_em if snap else None,
+            "registros": len(snap.df) if snap else 0,
+            "atualizado_em": snap.timestamp if snap else None,
+            "idade_segundos": round(snap.idade, 1) if snap else None,
+            "vencido": snap.idade >= self.duracao if snap else True,
+            "modo": MODO_CACHE,
+            "fonte": self.fonte.nome if self.fonte else None,
+            "fontes": self.fonte.estado() if isinstance(self.fonte, FonteMultipla) else None,
+            "incremental": self.incremental,
+            "ultimo_delta": repr(snap.delta) if snap else None,
+            "atualizando": self._atualizando,
+            "ultima_tentativa": self._ultima_tentativa,
+            "ultimo_erro": str(self._ultimo_erro) if self._ultimo_erro else None,
+        }
+
+
+class CacheCompartilhado(CacheDados):
+    """
+    Cache de leitura do snapshot publicado por outro processo.
+
+    "Buscar" aqui é só conferir o ponteiro de versão; quando ele muda, o
+    novo arquivo é mapeado em memória. O delta publicado mantém os
+    agregados incrementais e os patches SSE também nos leitores.
+
+    Só os buffers do arquivo são compartilhados: índices de filtro e de
+    busca, agregados e categorias são montados em cada leitor.
+    """
+
+    def __init__(self, diretorio: Path = DIRETORIO_COMPARTILHADO, intervalo: int = INTERVALO_LEITURA):
+        super().__init__(None, duracao=intervalo, persistencia=None, incremental=False)
+        self.diretorio = diretorio
+
+    def definir_fonte(self, fonte: FonteDados):
+        raise RuntimeError("Cache em modo leitor: a fonte é definida no processo publicador")
+
+    def _executar_busca(self):
+        self._ultima_tentativa = time.time()
+        try:
+            anterior = self._snapshot
+            ponteiro = ler_ponteiro(self.diretorio)
+            if ponteiro is None:
+                raise FileNotFoundError(
+                    f"Nenhum snapshot publicado em {self.diretorio} (execute python compartilhado.py)"
+                )
+
+            if anterior is not None and ponteiro["id"] == anterior.id:
+                self._snapshot = Snapshot(anterior.df, time.time(), anterior.versao, Delta(),
+                                          anterior.indice, anterior.agregados, anterior.modificado_em,
+                                          anterior.busca, anterior.atrasos)
+                BUSCAS.inc(resultado="sem_alteracao")
+            else:
+                with etapa("mapeamento"):
+                    df = compactar(mapear_snapshot(ponteiro, self.diretorio))
+                # Delta só vale se este leitor estava exatamente na versão anterior
+                seguido = anterior is not None and ponteiro.get("anterior") == anterior.id
+                delta = ler_delta(ponteiro, self.diretorio) if seguido and ponteiro.get("delta") else None
+                agregados = anterior.agregados.aplicar(delta) if delta is not None else None
+                busca = IndiceBusca(df, anterior.busca) if anterior else None
+                self._snapshot = Snapshot(df, time.time(), ponteiro["versao"], delta, agregados=agregados,
+                                          modificado_em=ponteiro["modificado_em"], busca=busca)
+                print(f"📥 Snapshot {ponteiro['id']} mapeado ({len(df)} registros)")
+                BUSCAS.inc(resultado="nova_versao")
+                self._notificar(self._snapshot, anterior)
+
+            self._ultimo_erro = None
+        except Exception as e:
+            self._ultimo_erro = e
+            BUSCAS.inc(resultado="erro")
+            print(f"❌ Erro: {e}")
+        finally:
+            with self._cond:
+                self._atualizando = False
+                self._cond.notify_all()
+
+    def status(self) -> dict:
+        return {**super().status(), "fonte": f"compartilhado:{self.diretorio}"}
+
+
+if MODO_CACHE == "leitor":
+    cache = CacheCompartilhado()
+else:
+    fonte = fonte_configurada()
+    # Com várias fontes, o ciclo acompanha a de menor TTL; as demais só são buscadas quando vencem
+    duracao = max(1, min(CACHE_DURATION, fonte.ttl_minimo)) if isinstance(fonte, FonteMultipla) else CACHE_DURATION
+    cache = CacheDados(fonte, duracao=duracao)
+    if MODO_CACHE == "publicador":
+        cache.adicionar_ouvinte(PublicadorSnapshot())
+    # Leitores só consultam: quem busca na fonte é quem grava o histórico
+    if HISTORICO_ATIVO:
+        cache.adicionar_ouvinte(historico.registrar)
+
+
+def carregar_dados() -> pd.DataFrame:
+    """Carrega dados da fonte configurada com cache"""
+    return cache.obter()
+
+# ==================== MÉTRICAS ====================
+
+def _do_snapshot(ler: Callable[[Snapshot], float]) -> Callable[[], Optional[float]]:
+    return lambda: ler(cache.atual()) if cache.atual() is not None else None
+
+
+registro.medidor("dashboard_snapshot_idade_segundos", "Idade do snapshot servido", _do_snapshot(lambda s: s.idade))
+registro.medidor("dashboard_snapshot_registros", "Linhas do snapshot servido", _do_snapshot(lambda s: len(s.df)))
+registro.medidor("dashboard_snapshot_versao", "Versão do snapshot servido", _do_snapshot(lambda s: s.versao))
+registro.medidor("dashboard_atualizando", "1 enquanto há busca em andamento", lambda: int(cache._atualizando))
@@ -0,0 +1,118 @@
+"""
+Eventos em tempo real - Dashboard de Monitoramento de Viagens
+Server-Sent Events com o patch de cada novo snapshot: viagens alteradas
+e buckets de agregados que mudaram
+"""
+import asyncio
+import threading
+from typing import AsyncIterator, List, Optional
+
+import orjson
+import pandas as pd
+
+from agregados import CHAVES, contar
+from formatos import colunas_json
+
+HEARTBEAT = 15  # segundos
+TAMANHO_FILA = 32
+
+# ==================== PATCH ====================
+
+def montar_patch(snap, anterior) -> Optional[bytes]:
+    """
+    Evento SSE serializado uma única vez por snapshot.
+
+    `trip_numbers` lista as viagens afetadas e `viagens` traz todas as linhas
+    atuais delas: o cliente remove as linhas desses LTs e insere as novas
+    (LTs removidos simplesmente não aparecem em `viagens`). `buckets` traz a
+    contagem atual de cada (Data, Status, destino) que mudou, 0 se sumiu, e a
+    da versão anterior em `Quantidade_anterior`, para o cliente somar a diferença.
+    Sem delta por linha (reconstrução completa), envia `reload`.
+    """
+    if anterior is None or snap.id == anterior.id:
+        return None
+
+    delta = snap.delta
+    if delta.completo or "trip_number" not in snap.df.columns:
+        return formatar_evento("reload", {"versao": snap.id, "anterior": anterior.id}, snap.id)
+
+    partes = [d for d in (delta.adicionados, delta.atualizados, delta.anteriores, delta.removidos) if not d.empty]
+    afetados = sorted({str(t) for d in partes for t in d["trip_number"].astype(object)})
+    viagens = snap.indice.selecionar(snap.indice.posicoes("trip_number", afetados))
+
+    buckets = _buckets_alterados(snap, anterior, partes)
+
+    dados = {
+        "versao": snap.id,
+        "anterior": anterior.id,
+        "trip_numbers": afetados,
+        "viagens": colunas_json(viagens),
+        "buckets": colunas_json(buckets),
+    }
+    return formatar_evento("snapshot", dados, snap.id)
+
+
+def _buckets_alterados(snap, anterior, partes: List[pd.DataFrame]) -> pd.DataFrame:
+    chaves = None
+    for parte in partes:
+        indice = contar(parte).index
+        chaves = indice if chaves is None else chaves.union(indice)
+    if chaves is None:
+        return pd.DataFrame(columns=CHAVES + ["Quantidade", "Quantidade_anterior"])
+    buckets = snap.agregados.contagens.reindex(chaves, fill_value=0).rename("Quantidade").reset_index()
+    buckets["Quantidade_anterior"] = anterior.agregados.contagens.reindex(chaves, fill_value=0).to_numpy()
+    return buckets
+
+
+def formatar_evento(tipo: str, dados: dict, evento_id: Optional[str] = None) -> bytes:
+    linhas = [f"event: {tipo}"]
+    if evento_id:
+        linhas.append(f"id: {evento_id}")
+    linhas.append("data: " + orjson.dumps(dados).decode())
+    return ("\n".join(linhas) + "\n\n").encode("utf-8")
+
+# ==================== CANAL ====================
+
+class CanalEventos:
+    """Distribui eventos publicados por qualquer thread para os assinantes asyncio"""
+
+    def __init__(self, tamanho_fila: int = TAMANHO_FILA):
+        self.tamanho_fila = tamanho_fila
+        self._assinantes = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._assinantes)
+
+    def publicar(self, evento: bytes):
+        with self._lock:
+            assinantes = list(self._assinantes)
+        for loop, fila in assinantes:
+            loop.call_soon_threadsafe(self._enfileirar, fila, evento)
+
+    @staticmethod
+    def _enfileirar(fila: asyncio.Queue, evento: bytes):
+        if fila.full():
+            # Cliente lento: descarta o atraso e pede recarga completa
+            while not fila.empty():
+                fila.get_nowait()
+            evento = formatar_evento("reload", {"motivo": "atrasado"})
+        fila.put_nowait(evento)
+
+    async def assinar(self, inicial: Optional[bytes] = None) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        fila: asyncio.Queue = asyncio.Queue(maxsize=self.tamanho_fila)
+        assinante = (loop, fila)
+        with self._lock:
+            self._assinantes.add(assinante)
+        try:
+            if inicial:
+                yield inicial
+            while True:
+                try:
+                    yield await asyncio.wait_for(fila.get(), timeout=HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+        finally:
+            with self._lock:
+                self._assinantes.discard(assinante)
@@ -0,0 +1,117 @@
+"""
+Execução limitada - Dashboard de Monitoramento de Viagens
+Executor de CPU com número fixo de threads, fila limitada e prazo por
+requisição, para que filtros, agregações e serialização pesados não
+segurem o event loop nem o threadpool das rotas leves
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# ==================== CONFIGURAÇÕES ====================
+
+MAX_TRABALHADORES = int(os.environ.get("DASHBOARD_TRABALHADORES", min(4, os.cpu_count() or 1)))
+# Tarefas aguardando além das que estão rodando; acima disso a requisição é recusada
+MAX_FILA = int(os.environ.get("DASHBOARD_FILA", 32))
+PRAZO_PADRAO = float(os.environ.get("DASHBOARD_PRAZO", 15))  # segundos
+
+# ==================== ERROS ====================
+
+class Sobrecarga(Exception):
+    """Executor cheio: a requisição deve ser repetida depois (HTTP 503)"""
+
+
+class PrazoExcedido(Exception):
+    """A tarefa não terminou dentro do prazo (HTTP 504)"""
+
+# ==================== EXECUTOR ====================
+
+class ExecutorLimitado:
+    """
+    Pool de threads com admissão controlada.
+
+    A ocupação é contada pelo Future do pool, não pelo da requisição: uma
+    tarefa que estourou o prazo continua ocupando a vaga até terminar de
+    fato, e a fila não cresce sem limite por trás dela.
+    """
+
+    def __init__(self, trabalhadores: int = MAX_TRABALHADORES, fila: int = MAX_FILA,
+                 prazo: float = PRAZO_PADRAO):
+        self.trabalhadores = trabalhadores
+        self.capacidade = trabalhadores + fila
+        self.prazo = prazo
+        self._pool = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="cpu")
+        self._lock = threading.Lock()
+        self._ocupadas = 0
+        self.recusadas = 0
+        self.expiradas = 0
+
+    def _liberar(self, _futuro: Future):
+        with self._lock:
+            self._ocupadas -= 1
+
+    def admitir(self):
+        """Recusa já na entrada quando não há vaga (antes de começar a responder)"""
+        with self._lock:
+            if self._ocupadas >= self.capacidade:
+                self.recusadas += 1
+                raise Sobrecarga(f"Servidor ocupado ({self._ocupadas} tarefas em andamento)")
+
+    def submeter(self, funcao: Callable[..., T], *args, admissao: bool = True) -> Future:
+        with self._lock:
+            if admissao and self._ocupadas >= self.capacidade:
+                self.recusadas += 1
+                raise Sobrecarga(f"Servidor ocupado ({self._ocupadas} tarefas em andamento)")
+            self._ocupadas += 1
+        try:
+            # Leva o contexto da requisição (perfil de etapas) para a thread do pool
+            futuro = self._pool.submit(contextvars.copy_context().run, funcao, *args)
+        except Exception:
+            self._liberar(None)
+            raise
+        futuro.add_done_callback(self._liberar)
+        return futuro
+
+    async def executar(self, funcao: Callable[..., T], *args, prazo: Optional[float] = None) -> T:
+        """Roda `funcao(*args)` no pool; levanta Sobrecarga ou PrazoExcedido"""
+        futuro = self.submeter(funcao, *args)
+        prazo = self.prazo if prazo is None else prazo
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), prazo)
+        except asyncio.TimeoutError:
+            # Se ainda estava na fila, nem chega a rodar
+            futuro.cancel()
+            with self._lock:
+                self.expiradas += 1
+            raise PrazoExcedido(f"Tempo limite de {prazo:g}s excedido")
+
+    async def iterar(self, iterador: Iterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Consome um gerador síncrono no pool, um lote por vez (exportação).
+        A admissão é feita antes, com `admitir()`: uma resposta já iniciada
+        não é interrompida, os lotes só esperam a vez na fila do pool.
+        """
+        fim = object()
+        while True:
+            lote = await asyncio.wrap_future(self.submeter(next, iterador, fim, admissao=False))
+            if lote is fim:
+                return
+            yield lote
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "trabalhadores": self.trabalhadores,
+                "capacidade": self.capacidade,
+                "ocupadas": self._ocupadas,
+                "recusadas": self.recusadas,
+                "expiradas": self.expiradas,
+            }
+
+    def encerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,123 @@
+"""
+Exportação em streaming - Dashboard de Monitoramento de Viagens
+CSV ou Parquet gerados em lotes, compartilhado pela API e pelo Dash
+"""
+import io
+from typing import Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fontes import COLUNAS_TABELA
+from formatos import datas_como_texto
+from indices import IndiceFiltros, interpretar_data, interpretar_projecao
+
+TAMANHO_LOTE = 50_000  # linhas por lote
+
+FORMATOS_EXPORTACAO = {
+    "csv": ("text/csv; charset=utf-8", "dados_viagens.csv"),
+    "parquet": ("application/vnd.apache.parquet", "dados_viagens.parquet"),
+}
+
+# ==================== PARÂMETROS ====================
+
+def _lista(valor: Optional[str]) -> List[str]:
+    return [x.strip() for x in valor.split(",") if x.strip()] if valor else []
+
+
+def interpretar_exportacao(parametros: Mapping[str, Optional[str]], colunas: Sequence[str]) -> dict:
+    """
+    Parâmetros de /api/export já validados, os mesmos na API e no Dash:
+    formato, filtros (coluna -> valores), inicio/fim e colunas exportadas.
+    Levanta ValueError (400) para formato, data ou coluna inválidos.
+    """
+    formato = parametros.get("format") or "csv"
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato inválido: {formato} (use csv ou parquet)")
+    return {
+        "formato": formato,
+        "filtros": {
+            "trip_number": _lista(parametros.get("trip_numbers")),
+            "destination_station_code": _lista(parametros.get("destinations")),
+            "Status_da_Viagem": _lista(parametros.get("status")),
+        },
+        "inicio": interpretar_data(parametros.get("start_date")),
+        "fim": interpretar_data(parametros.get("end_date")),
+        "colunas": (interpretar_projecao(parametros.get("fields"), colunas)
+                    or [c for c in COLUNAS_TABELA if c in colunas] or None),
+    }
+
+
+def cabecalhos_exportacao(formato: str, total: int) -> dict:
+    _, nome_arquivo = FORMATOS_EXPORTACAO[formato]
+    return {"Content-Disposition": f'attachment; filename="{nome_arquivo}"', "X-Total-Count": str(total)}
+
+# ==================== GERADORES ====================
+
+def _lotes(indice: IndiceFiltros, posicoes: np.ndarray, colunas: Optional[Sequence[str]], tamanho_lote: int):
+    for inicio in range(0, len(posicoes), tamanho_lote):
+        yield indice.selecionar(posicoes[inicio:inicio + tamanho_lote], colunas)
+
+
+def gerar_csv(indice: IndiceFiltros, posicoes: np.ndarray, colunas: Optional[Sequence[str]] = None,
+              tamanho_lote: int = TAMANHO_LOTE) -> Iterator[bytes]:
+    """CSV em utf-8-sig (BOM só no início), igual ao exportado pelo Dash"""
+    primeiro = True
+    for lote in _lotes(indice, posicoes, colunas, tamanho_lote):
+        texto = datas_como_texto(lote).to_csv(index=False, header=primeiro)
+        yield texto.encode("utf-8-sig" if primeiro else "utf-8")
+        primeiro = False
+
+    if primeiro:  # nenhum registro: só o cabeçalho
+        yield indice.selecionar(posicoes[:0], colunas).to_csv(index=False).encode("utf-8-sig")
+
+
+class _Dreno(io.RawIOBase):
+    """Destino de escrita que acumula bytes até serem drenados"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def drenar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+def gerar_parquet(indice: IndiceFiltros, posicoes: np.ndarray, colunas: Optional[Sequence[str]] = None,
+                  tamanho_lote: int = TAMANHO_LOTE) -> Iterator[bytes]:
+    """Parquet com um row group por lote; cada lote é enviado assim que escrito"""
+    esquema = pa.Schema.from_pandas(indice.selecionar(posicoes[:0], colunas), preserve_index=False)
+    # Coluna object vazia é inferida como null; no snapshot essas colunas são texto
+    for i, campo in enumerate(esquema):
+        if pa.types.is_null(campo.type):
+            esquema = esquema.set(i, campo.with_type(pa.string()))
+    dreno = _Dreno()
+    escritor = pq.ParquetWriter(dreno, esquema)
+    try:
+        for lote in _lotes(indice, posicoes, colunas, tamanho_lote):
+            escritor.write_table(pa.Table.from_pandas(lote, schema=esquema, preserve_index=False))
+            yield dreno.drenar()
+    finally:
+        escritor.close()
+    yield dreno.drenar()
+
+
+def gerar_exportacao(formato: str, indice: IndiceFiltros, posicoes: np.ndarray,
+                     colunas: Optional[Sequence[str]] = None) -> Iterator[bytes]:
+    if formato == "parquet":
+        return gerar_parquet(indice, posicoes, colunas)
+    return gerar_csv(indice, posicoes, colunas)
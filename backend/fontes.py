@@ -0,0 +1,497 @@
+"""
+Fontes de dados - Dashboard de Monitoramento de Viagens
+Google Sheets, arquivo local (CSV/Parquet/Feather) e fixture em memória
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, TypeVar, Union
+
+import pandas as pd
+
+from metricas import etapa
+
+# ==================== CONFIGURAÇÕES ====================
+
+PLANILHA_ID = "1BKB3rsrZFcHxRt0LkTABtSBlqv7VWU6TwmkbwX95TLI"
+NOME_ABA = "Base Principal"
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+ACCOUNT_PATH = Path(__file__).parent.parent / "account.json"
+
+# "sheets" (padrão), caminho de um arquivo .csv / .parquet / .feather
+# ou de um .json com várias planilhas/abas (ver FonteMultipla)
+FONTE_DADOS = os.environ.get("DASHBOARD_FONTE", "sheets")
+
+# Várias fontes: buscas simultâneas e espera máxima por ciclo
+MAX_BUSCAS_PARALELAS = int(os.environ.get("DASHBOARD_FONTES_PARALELAS", "4"))
+PRAZO_FONTE = 30  # segundos; fonte mais lenta que isso entra no ciclo seguinte
+# Coluna com o nome da fonte de cada linha
+COLUNA_FONTE = "fonte"
+
+# Horários da planilha (planejado, previsão) e o atraso calculado a partir deles
+COLUNAS_HORARIO = ["ETA Planejado", "Previsão de chegada"]
+COLUNA_ATRASO = "atraso_minutos"
+FORMATO_DATA_HORA = "%d/%m/%Y %H:%M"
+# Texto que começa como data ISO: lido sem dayfirst
+PADRAO_ISO = r"^\d{4}-\d{1,2}-\d{1,2}"
+FUSO_ISO = r"(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)(?:Z|[+-]\d{2}:?\d{2})$"
+
+# Colunas da tabela detalhada e da exportação
+COLUNAS_TABELA = ["trip_number", "Status_da_Viagem", "ETA Planejado", "Ultima localização", "Previsão de chegada", "Ocorrencia"]
+# Colunas baixadas da planilha; DASHBOARD_COLUNAS=todas baixa a aba inteira
+COLUNAS_PLANILHA = ["Data", "destination_station_code", *COLUNAS_TABELA]
+PROJETAR_COLUNAS = os.environ.get("DASHBOARD_COLUNAS", "projetadas") != "todas"
+
+# Retentativas em erros de cota (429) e indisponibilidade (5xx) da API
+MAX_TENTATIVAS = 5
+ESPERA_BASE = 1.0  # segundos, dobra a cada tentativa
+ESPERA_MAXIMA = 60.0
+CODIGOS_RETENTATIVA = {429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+# ==================== PREPARAÇÃO ====================
+
+def normalizar_bruto(df: pd.DataFrame) -> pd.DataFrame:
+    """Remove linhas vazias; os valores continuam como vieram da fonte"""
+    return df.dropna(how='all').reset_index(drop=True)
+
+
+def converter_data_hora(serie: pd.Series) -> pd.Series:
+    """
+    'dd/mm/aaaa hh:mm' vetorizado; outros formatos vão pelo caminho lento:
+    ISO ('aaaa-mm-dd ...') como ISO e o resto (com segundos, só a data)
+    com o dia primeiro. dayfirst em ISO trocaria dia e mês.
+    """
+    datas = pd.to_datetime(serie, format=FORMATO_DATA_HORA, errors="coerce")
+    texto = serie.astype(str).str.strip()
+    falhas = datas.isna() & serie.notna() & (texto != "")
+    if falhas.any():
+        iso = falhas & texto.str.match(PADRAO_ISO)
+        if iso.any():
+            # Fuso ('...-03:00', 'Z') é descartado: vale a hora local, como nos demais formatos
+            sem_fuso = texto[iso].str.replace(FUSO_ISO, r"\1", regex=True)
+            datas[iso] = pd.to_datetime(sem_fuso, format="ISO8601", errors="coerce")
+        outras = falhas & ~iso
+        if outras.any():
+            datas[outras] = pd.to_datetime(texto[outras], dayfirst=True, format="mixed", errors="coerce")
+    return datas
+
+
+@etapa("datas")
+def converter_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte as colunas tipadas: `Data` e os horários (COLUNAS_HORARIO)
+    viram datetime e COLUNA_ATRASO é calculado (previsão - planejado, em
+    minutos). Os horários só voltam a texto na serialização (formatos.py).
+    Colunas já convertidas ficam como estão.
+    """
+    converter_data = "Data" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["Data"])
+    horarios = [c for c in COLUNAS_HORARIO if c in df.columns and not pd.api.types.is_datetime64_any_dtype(df[c])]
+    calcular_atraso = COLUNA_ATRASO not in df.columns and all(c in df.columns for c in COLUNAS_HORARIO)
+    if not (converter_data or horarios or calcular_atraso):
+        return df
+
+    df = df.copy()
+    if converter_data:
+        df["Data"] = pd.to_datetime(df["Data"], format='%d/%m/%Y', errors="coerce")
+    for col in horarios:
+        df[col] = converter_data_hora(df[col])
+    if calcular_atraso:
+        eta, previsao = (df[c] for c in COLUNAS_HORARIO)
+        df[COLUNA_ATRASO] = ((previsao - eta).dt.total_seconds() / 60).astype("float32")
+    return df
+
+
+def preparar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalização comum a todas as fontes"""
+    return converter_tipos(normalizar_bruto(df))
+
+
+@etapa("dataframe")
+def dataframe_de_valores(all_values: List[List[str]]) -> pd.DataFrame:
+    """Converte a matriz da planilha (cabeçalho na primeira linha) em DataFrame bruto"""
+    if not all_values or len(all_values) < 2:
+        return pd.DataFrame()
+    return normalizar_bruto(pd.DataFrame(all_values[1:], columns=all_values[0]))
+
+# ==================== FONTES ====================
+
+class FonteDados:
+    """
+    Interface das fontes.
+
+    `carregar_bruto()` devolve os valores como vieram (sem conversão de tipos),
+    `carregar()` devolve o DataFrame já preparado e `buscar()` permite pular o
+    download quando a fonte informa que nada mudou.
+    """
+
+    nome = "fonte"
+
+    def carregar_bruto(self) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def carregar(self) -> pd.DataFrame:
+        return converter_tipos(self.carregar_bruto())
+
+    def buscar(self, versao_anterior: Optional[str] = None) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        """Retorna (bruto, versão); bruto é None quando a versão não mudou"""
+        return self.carregar_bruto(), None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.nome}>"
+
+
+def _letra_coluna(indice: int) -> str:
+    """1 -> A, 27 -> AA"""
+    letras = ""
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+@etapa("dataframe")
+def dataframe_de_colunas(colunas: List[List[str]]) -> pd.DataFrame:
+    """
+    Converte colunas lidas com majorDimension=COLUMNS (cabeçalho no primeiro
+    valor) em DataFrame bruto; a API corta as células vazias do fim de cada
+    coluna, completadas aqui com "" como no get_all_values()
+    """
+    colunas = [c for c in colunas if c]
+    if not colunas:
+        return pd.DataFrame()
+    linhas = max(len(c) for c in colunas) - 1
+    if linhas < 1:
+        return pd.DataFrame()
+    return normalizar_bruto(pd.DataFrame({
+        c[0]: c[1:] + [""] * (linhas - len(c) + 1) for c in colunas
+    }))
+
+
+class FonteGoogleSheets(FonteDados):
+    """
+    Aba de uma planilha do Google Sheets.
+
+    O cliente autenticado é criado uma vez e reaproveitado: a sessão HTTP
+    mantém a conexão e renova o token sozinha. Com `colunas`, só essas
+    colunas são baixadas, num único batchGet.
+    """
+
+    def __init__(self, planilha_id: str = PLANILHA_ID, aba: str = NOME_ABA, account_path: Path = ACCOUNT_PATH,
+                 colunas: Optional[List[str]] = COLUNAS_PLANILHA if PROJETAR_COLUNAS else None):
+        self.planilha_id = planilha_id
+        self.aba = aba
+        self.account_path = Path(account_path)
+        self.colunas = colunas
+        self.nome = f"sheets:{planilha_id}/{aba}"
+        self._planilha = None
+        self._aba_aberta = None
+        self._cabecalho: Optional[List[str]] = None
+        self._lock = threading.Lock()
+        # Intervalo mínimo entre chamadas, aumentado a cada erro de cota
+        self._intervalo = 0.0
+        self._ultima_chamada = 0.0
+
+    def _abrir(self):
+        if self._planilha is not None:
+            return self._planilha
+
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        if not self.account_path.exists():
+            raise FileNotFoundError("account.json não encontrado na raiz do projeto!")
+
+        creds = Credentials.from_service_account_file(str(self.account_path), scopes=SCOPES)
+        gc = gspread.authorize(creds)
+        self._planilha = self._chamar(gc.open_by_key, self.planilha_id)
+        return self._planilha
+
+    def _chamar(self, funcao: Callable[..., T], *args, **kwargs) -> T:
+        """Chama a API respeitando o intervalo adaptativo, com backoff exponencial em 429/5xx"""
+        from gspread.exceptions import APIError
+
+        for tentativa in range(MAX_TENTATIVAS):
+            espera = self._intervalo - (time.monotonic() - self._ultima_chamada)
+            if espera > 0:
+                time.sleep(espera)
+            try:
+                resultado = funcao(*args, **kwargs)
+                # Sem erro: o intervalo volta a cair aos poucos
+                self._intervalo = self._intervalo / 2 if self._intervalo > 0.1 else 0.0
+                return resultado
+            except APIError as e:
+                codigo = e.response.status_code
+                if codigo not in CODIGOS_RETENTATIVA or tentativa == MAX_TENTATIVAS - 1:
+                    raise
+                retry_after = e.response.headers.get("Retry-After", "")
+                pausa = float(retry_after) if retry_after.isdigit() else ESPERA_BASE * 2 ** tentativa
+                pausa = min(ESPERA_MAXIMA, pausa) * random.uniform(1.0, 1.25)
+                self._intervalo = min(ESPERA_MAXIMA, max(ESPERA_BASE, self._intervalo * 2))
+                print(f"⏳ Google Sheets respondeu {codigo}, nova tentativa em {pausa:.1f}s")
+                time.sleep(pausa)
+            finally:
+                self._ultima_chamada = time.monotonic()
+
+    @etapa("planilha")
+    def _baixar(self, planilha) -> pd.DataFrame:
+        print("🔄 Carregando dados do Google Sheets...")
+        if self._aba_aberta is None:
+            self._aba_aberta = self._chamar(planilha.worksheet, self.aba)
+        aba = self._aba_aberta
+        df = self._baixar_colunas(aba) if self.colunas else None
+        if df is None:
+            df = dataframe_de_valores(self._chamar(aba.get_all_values))
+        print(f"✅ {len(df)} registros carregados ({len(df.columns)} colunas)")
+        return df
+
+    def _baixar_colunas(self, aba) -> Optional[pd.DataFrame]:
+        """Só as colunas configuradas; None se nenhuma existir na aba"""
+        for _ in range(2):
+            if self._cabecalho is None:
+                self._cabecalho = self._chamar(aba.row_values, 1)
+            posicoes = [i + 1 for i, nome in enumerate(self._cabecalho) if nome in self.colunas]
+            if not posicoes:
+                return None
+
+            intervalos = [f"{_letra_coluna(i)}:{_letra_coluna(i)}" for i in posicoes]
+            valores = self._chamar(aba.batch_get, intervalos, major_dimension="COLUMNS")
+            colunas = [v[0] if v else [] for v in valores]
+
+            # Colunas mudaram de lugar desde a leitura do cabeçalho: relê e tenta de novo
+            if [c[0] if c else "" for c in colunas] == [self._cabecalho[i - 1] for i in posicoes]:
+                return dataframe_de_colunas(colunas)
+            self._cabecalho = None
+        return None
+
+    def carregar_bruto(self) -> pd.DataFrame:
+        return self.buscar()[0]
+
+    def buscar(self, versao_anterior: Optional[str] = None) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        with self._lock:
+            try:
+                planilha = self._abrir()
+                try:
+                    # modifiedTime do Drive: uma chamada leve antes do download completo
+                    versao = self._chamar(planilha.get_lastUpdateTime)
+                except Exception:
+                    versao = None
+                if versao is not None and versao == versao_anterior:
+                    print("📦 Planilha sem alterações")
+                    return None, versao
+                return self._baixar(planilha), versao
+            except (OSError, ConnectionError) as e:
+                # Conexão perdida: o próximo ciclo autentica de novo
+                self._planilha = self._aba_aberta = None
+                raise e
+
+
+class FonteArquivo(FonteDados):
+    """Arquivo local exportado da planilha (CSV, Parquet ou Feather)"""
+
+    def __init__(self, caminho: Union[str, Path]):
+        self.caminho = Path(caminho)
+        self.nome = f"arquivo:{self.caminho}"
+
+    def carregar_bruto(self) -> pd.DataFrame:
+        if not self.caminho.exists():
+            raise FileNotFoundError(f"Arquivo de dados não encontrado: {self.caminho}")
+
+        sufixo = self.caminho.suffix.lower()
+        if sufixo == ".csv":
+            # Lê tudo como texto, igual ao get_all_values() da planilha
+            df = pd.read_csv(self.caminho, dtype=str, keep_default_na=False)
+        elif sufixo == ".parquet":
+            df = pd.read_parquet(self.caminho)
+        elif sufixo in (".feather", ".arrow"):
+            df = pd.read_feather(self.caminho)
+        else:
+            raise ValueError(f"Formato não suportado: {sufixo}")
+
+        df = normalizar_bruto(df)
+        print(f"✅ {len(df)} registros carregados de {self.caminho.name}")
+        return df
+
+    def buscar(self, versao_anterior: Optional[str] = None) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        versao = str(self.caminho.stat().st_mtime_ns) if self.caminho.exists() else None
+        if versao is not None and versao == versao_anterior:
+            return None, versao
+        return self.carregar_bruto(), versao
+
+
+class FonteMemoria(FonteDados):
+    """Fixture em memória, para testes de carga e uso offline"""
+
+    nome = "memoria"
+
+    def __init__(self, dados: Union[pd.DataFrame, List[List[str]]]):
+        self.dados = dados
+
+    def carregar_bruto(self) -> pd.DataFrame:
+        if isinstance(self.dados, pd.DataFrame):
+            return normalizar_bruto(self.dados.copy())
+        return dataframe_de_valores(self.dados)
+
+
+class _EstadoFonte:
+    """Último resultado bom de uma fonte e a busca em andamento, se houver"""
+
+    def __init__(self, nome: str, fonte: FonteDados, ttl: float):
+        self.nome = nome
+        self.fonte = fonte
+        self.ttl = ttl
+        self.bruto: Optional[pd.DataFrame] = None
+        self.versao: Optional[str] = None
+        # Quantas vezes chegaram dados novos: compõe a versão da união
+        self.geracao = 0
+        self.buscado_em: Optional[float] = None
+        self.duracao: Optional[float] = None
+        self.erro: Optional[Exception] = None
+        self.futuro: Optional[Future] = None
+
+    def vencida(self, agora: float) -> bool:
+        return self.futuro is None and (self.buscado_em is None or agora - self.buscado_em >= self.ttl)
+
+
+class FonteMultipla(FonteDados):
+    """
+    União de várias fontes (uma planilha por região ou mês, por exemplo).
+
+    Cada fonte tem seu TTL e sua versão e é buscada num pool limitado, em
+    paralelo com as demais. O ciclo espera no máximo PRAZO_FONTE: a fonte
+    que não respondeu continua baixando e entra no ciclo seguinte, e a que
+    falhou mantém os últimos dados bons. As linhas ganham a coluna
+    COLUNA_FONTE com o nome de origem.
+    """
+
+    def __init__(self, fontes: List[Tuple[str, FonteDados, float]], max_paralelo: int = MAX_BUSCAS_PARALELAS,
+                 prazo: float = PRAZO_FONTE):
+        if not fontes:
+            raise ValueError("Nenhuma fonte configurada")
+        nomes = [nome for nome, _, _ in fontes]
+        if len(set(nomes)) != len(nomes):
+            raise ValueError(f"Nomes de fonte repetidos: {nomes}")
+        self.estados = [_EstadoFonte(nome, fonte, ttl) for nome, fonte, ttl in fontes]
+        self.prazo = prazo
+        self.nome = "multipla:" + ",".join(nomes)
+        self._pool = ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix="fonte")
+        self._lock = threading.Lock()
+
+    @property
+    def ttl_minimo(self) -> float:
+        return min(e.ttl for e in self.estados)
+
+    def _buscar_uma(self, estado: _EstadoFonte) -> Tuple[Optional[pd.DataFrame], Optional[str], float]:
+        inicio = time.perf_counter()
+        # Sem dados guardados, pede o download mesmo que a versão seja a mesma
+        bruto, versao = estado.fonte.buscar(estado.versao if estado.bruto is not None else None)
+        return bruto, versao, time.perf_counter() - inicio
+
+    def _coletar(self, estado: _EstadoFonte):
+        futuro, estado.futuro = estado.futuro, None
+        estado.buscado_em = time.time()
+        try:
+            bruto, versao, estado.duracao = futuro.result()
+        except Exception as e:
+            estado.erro = e
+            print(f"❌ Fonte {estado.nome}: {e}" + (" (mantendo os últimos dados)" if estado.bruto is not None else ""))
+            return
+        estado.erro = None
+        estado.versao = versao
+        if bruto is not None:
+            estado.bruto = bruto.assign(**{COLUNA_FONTE: estado.nome})
+            estado.geracao += 1
+
+    def buscar(self, versao_anterior: Optional[str] = None) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        with self._lock:
+            agora = time.time()
+            for estado in self.estados:
+                if estado.vencida(agora):
+                    estado.futuro = self._pool.submit(self._buscar_uma, estado)
+
+            # O ciclo dura o tempo da fonte mais lenta, limitado pelo prazo
+            pendentes = [e.futuro for e in self.estados if e.futuro is not None]
+            if pendentes:
+                with etapa("fontes_paralelas"):
+                    wait(pendentes, timeout=self.prazo)
+            for estado in self.estados:
+                if estado.futuro is not None:
+                    if estado.futuro.done():
+                        self._coletar(estado)
+                    else:
+                        print(f"⏳ Fonte {estado.nome} ainda respondendo, entra no próximo ciclo")
+
+            prontas = [e for e in self.estados if e.bruto is not None]
+            if not prontas:
+                erros = [e.erro for e in self.estados if e.erro is not None]
+                if erros:
+                    raise erros[0]
+                raise TimeoutError(f"Nenhuma fonte respondeu em {self.prazo}s")
+
+            versao = "|".join(f"{e.nome}:{e.geracao}" for e in prontas)
+            if versao == versao_anterior:
+                return None, versao
+            print(f"🧩 {len(prontas)}/{len(self.estados)} fontes unidas")
+            return normalizar_bruto(pd.concat([e.bruto for e in prontas], ignore_index=True)), versao
+
+    def carregar_bruto(self) -> pd.DataFrame:
+        return self.buscar()[0]
+
+    def estado(self) -> List[dict]:
+        return [
+            {
+                "nome": e.nome,
+                "fonte": e.fonte.nome,
+                "ttl": e.ttl,
+                "versao": e.versao,
+                "registros": len(e.bruto) if e.bruto is not None else 0,
+                "buscado_em": e.buscado_em,
+                "duracao_segundos": round(e.duracao, 3) if e.duracao is not None else None,
+                "buscando": e.futuro is not None,
+                "erro": str(e.erro) if e.erro else None,
+            }
+            for e in self.estados
+        ]
+
+
+def fontes_de_arquivo(caminho: Union[str, Path]) -> FonteMultipla:
+    """
+    Lê a lista de fontes de um JSON:
+    [{"nome": "sul", "planilha": "<id>", "aba": "Base Principal", "ttl": 60},
+     {"nome": "norte", "arquivo": "dados/norte.csv", "ttl": 300}]
+    """
+    caminho = Path(caminho)
+    itens = json.loads(caminho.read_text(encoding="utf-8"))
+    if isinstance(itens, dict):
+        itens = itens.get("fontes", [])
+
+    fontes = []
+    for i, item in enumerate(itens):
+        if "planilha" in item:
+            fonte = FonteGoogleSheets(item["planilha"], item.get("aba", NOME_ABA))
+        elif "arquivo" in item:
+            arquivo = Path(item["arquivo"])
+            fonte = FonteArquivo(arquivo if arquivo.is_absolute() else caminho.parent / arquivo)
+        else:
+            raise ValueError(f"Fonte {i} sem 'planilha' nem 'arquivo' em {caminho}")
+        nome = item.get("nome") or f"{item.get('planilha', item.get('arquivo'))}/{item.get('aba', '')}".rstrip("/")
+        fontes.append((nome, fonte, float(item.get("ttl", 60))))
+    return FonteMultipla(fontes)
+
+
+def fonte_configurada(valor: Optional[str] = None) -> FonteDados:
+    """Cria a fonte a partir de DASHBOARD_FONTE"""
+    valor = valor or FONTE_DADOS
+    if valor == "sheets":
+        return FonteGoogleSheets()
+    if valor.lower().endswith(".json"):
+        return fontes_de_arquivo(valor)
+    return FonteArquivo(valor)
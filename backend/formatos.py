@@ -0,0 +1,97 @@
+"""
+Formatos de resposta - Dashboard de Monitoramento de Viagens
+JSON por registros, JSON colunar e Apache Arrow IPC, negociados por
+parâmetro `format` ou cabeçalho Accept
+"""
+from typing import Optional
+
+import orjson
+import pandas as pd
+import pyarrow as pa
+from fastapi import Response
+
+from fontes import COLUNAS_HORARIO, FORMATO_DATA_HORA
+from metricas import etapa
+
+MIME_JSON = "application/json"
+MIME_COLUNAR = "application/vnd.dashboard.columnar+json"
+MIME_ARROW = "application/vnd.apache.arrow.stream"
+
+# json: [{coluna: valor}, ...] | columnar: {coluna: [valores]} | arrow: stream IPC
+FORMATOS = {"json": MIME_JSON, "columnar": MIME_COLUNAR, "arrow": MIME_ARROW}
+
+# ==================== NEGOCIAÇÃO ====================
+
+def negociar_formato(formato: Optional[str], accept: Optional[str]) -> str:
+    """O parâmetro `format` tem prioridade; depois o Accept; por fim JSON"""
+    if formato:
+        formato = formato.lower()
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato inválido: {formato} (use {', '.join(FORMATOS)})")
+        return formato
+
+    if accept:
+        for item in accept.split(","):
+            mime = item.split(";")[0].strip().lower()
+            for nome, tipo in FORMATOS.items():
+                if mime == tipo:
+                    return nome
+    return "json"
+
+# ==================== SERIALIZAÇÃO ====================
+
+def datas_como_texto(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Datas viram 'YYYY-MM-DD', como o JSON da API sempre retornou; os
+    horários (COLUNAS_HORARIO) voltam ao texto da planilha, 'dd/mm/aaaa hh:mm'
+    """
+    colunas = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    if not colunas:
+        return df
+    df = df.copy(deep=False)
+    for col in colunas:
+        df[col] = df[col].dt.strftime(FORMATO_DATA_HORA if col in COLUNAS_HORARIO else '%Y-%m-%d')
+    return df
+
+
+def colunas_json(df: pd.DataFrame) -> dict:
+    """{coluna: [valores]} com tipos nativos do Python"""
+    df = datas_como_texto(df)
+    return {col: df[col].astype(object).where(df[col].notna(), None).tolist() for col in df.columns}
+
+
+def registros_json(df: pd.DataFrame) -> list:
+    """[{coluna: valor}] com tipos nativos do Python"""
+    colunas = colunas_json(df)
+    nomes = list(colunas)
+    return [dict(zip(nomes, valores)) for valores in zip(*colunas.values())]
+
+
+@etapa("serializacao")
+def serializar(df: pd.DataFrame, formato: str, metadados: Optional[dict] = None) -> bytes:
+    """`metadados` (só Arrow) vão no schema, com os valores em JSON"""
+    if formato == "arrow":
+        # Data vira date; os horários seguem como timestamp
+        df = df.copy(deep=False)
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]) and col not in COLUNAS_HORARIO:
+                df[col] = df[col].dt.date
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        if metadados:
+            extras = {chave.encode(): orjson.dumps(valor) for chave, valor in metadados.items()}
+            tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}), **extras})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+        return sink.getvalue().to_pybytes()
+
+    if formato == "columnar":
+        return orjson.dumps(colunas_json(df))
+
+    # orjson, como no colunar: to_json escaparia cada "/" como "\/"
+    return orjson.dumps(registros_json(df))
+
+
+def resposta(df: pd.DataFrame, formato: str, headers: Optional[dict] = None,
+             metadados: Optional[dict] = None) -> Response:
+    return Response(content=serializar(df, formato, metadados), media_type=FORMATOS[formato], headers=headers)
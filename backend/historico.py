@@ -0,0 +1,410 @@
+"""
+Histórico local - Dashboard de Monitoramento de Viagens
+Log de mudanças por linha em SQLite, gravado a cada nova versão do
+snapshot: histórico de status por LT, tempo em cada status e consulta
+do conjunto de dados como estava num instante
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from fontes import converter_tipos
+from formatos import colunas_json
+from metricas import etapa
+from sincronizacao import chaves_linhas
+
+# ==================== CONFIGURAÇÕES ====================
+
+HISTORICO_PATH = Path(os.environ.get(
+    "DASHBOARD_HISTORICO", Path(__file__).parent.parent / "cache" / "historico.sqlite"
+))
+HISTORICO_ATIVO = os.environ.get("DASHBOARD_HISTORICO_ATIVO", "1") != "0"
+# Mudanças só de outras colunas (status igual) são descartadas depois deste prazo
+RETENCAO_DETALHE = 30 * 86400  # segundos
+# LTs que saíram da planilha têm o histórico apagado depois deste prazo
+RETENCAO_TOTAL = 365 * 86400
+INTERVALO_COMPACTACAO = 86400
+# Limite de parâmetros por consulta do SQLite
+LOTE_SQL = 500
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS mudancas (
+    id INTEGER PRIMARY KEY,
+    instante REAL NOT NULL,
+    versao INTEGER,
+    chave TEXT NOT NULL,
+    trip_number TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    status TEXT,
+    destino TEXT,
+    dados TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_mudancas_trip ON mudancas(trip_number, instante);
+CREATE INDEX IF NOT EXISTS idx_mudancas_chave ON mudancas(chave, instante);
+CREATE INDEX IF NOT EXISTS idx_mudancas_instante ON mudancas(instante);
+CREATE TABLE IF NOT EXISTS estado_atual (
+    chave TEXT PRIMARY KEY,
+    trip_number TEXT NOT NULL,
+    impressao INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_estado_trip ON estado_atual(trip_number);
+CREATE TABLE IF NOT EXISTS meta (nome TEXT PRIMARY KEY, valor TEXT);
+"""
+# Contadores mantidos em `meta` na mesma transação das gravações: /api/status não varre o log
+CONTADORES = ("mudancas", "linhas_atuais", "desde")
+
+# ==================== AUXILIARES ====================
+
+def _texto(valor) -> Optional[str]:
+    return None if valor is None or (isinstance(valor, float) and np.isnan(valor)) else str(valor)
+
+
+def _iso(instante: float) -> str:
+    return datetime.fromtimestamp(instante).isoformat(timespec="seconds")
+
+
+def instante_de_texto(valor: str) -> float:
+    """Aceita ISO 8601 ('2024-05-01', '2024-05-01T14:30') ou segundos desde a época"""
+    try:
+        instante = float(valor)
+    except ValueError:
+        # Sem fuso, vale o horário local (como o `instante` gravado)
+        try:
+            return pd.Timestamp(valor).to_pydatetime().timestamp()
+        except (ValueError, TypeError, OverflowError) as e:
+            raise ValueError(f"Instante inválido: {valor}") from e
+    if not math.isfinite(instante):
+        raise ValueError(f"Instante inválido: {valor}")
+    return instante
+
+# ==================== HISTÓRICO ====================
+
+class HistoricoViagens:
+    """
+    Duas tabelas: `mudancas` (log só de inserções: adicionado, atualizado,
+    removido, com a linha inteira em JSON) e `estado_atual` (impressão de
+    cada linha na última versão gravada). A diferença é sempre calculada
+    contra `estado_atual` dentro da transação, então dois processos
+    gravando o mesmo snapshot não duplicam o log.
+    """
+
+    def __init__(self, caminho: Path = HISTORICO_PATH):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+        self._pronto = False
+        # Gravação em thread própria: a troca de snapshot nunca espera o SQLite
+        self._fila = threading.Condition()
+        self._pendente = None
+        self._gravando = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _conectar(self) -> sqlite3.Connection:
+        if not self._pronto:
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            with closing(sqlite3.connect(str(self.caminho), timeout=30)) as con:
+                # auto_vacuum só vale se definido antes de criar as tabelas
+                con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                con.execute("PRAGMA journal_mode=WAL")
+                con.executescript(ESQUEMA)
+                self._iniciar_contadores(con)
+            self._pronto = True
+        con = sqlite3.connect(str(self.caminho), timeout=30, isolation_level=None)
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    # -------- contadores --------
+
+    @staticmethod
+    def _iniciar_contadores(con: sqlite3.Connection):
+        """Bancos criados antes dos contadores: conta uma única vez"""
+        if con.execute("SELECT 1 FROM meta WHERE nome = 'mudancas'").fetchone():
+            return
+        mudancas, desde = con.execute("SELECT COUNT(*), MIN(instante) FROM mudancas").fetchone()
+        linhas = con.execute("SELECT COUNT(*) FROM estado_atual").fetchone()[0]
+        con.executemany("INSERT OR REPLACE INTO meta (nome, valor) VALUES (?, ?)",
+                        [("mudancas", str(mudancas)), ("linhas_atuais", str(linhas)),
+                         ("desde", str(desde) if desde is not None else None)])
+        con.commit()
+
+    @staticmethod
+    def _somar(con: sqlite3.Connection, nome: str, valor: int):
+        if valor:
+            con.execute("UPDATE meta SET valor = CAST(valor AS INTEGER) + ? WHERE nome = ?", (valor, nome))
+
+    @staticmethod
+    def _atualizar_desde(con: sqlite3.Connection):
+        # MIN sobre idx_mudancas_instante: uma descida no índice, não uma varredura
+        desde = con.execute("SELECT MIN(instante) FROM mudancas").fetchone()[0]
+        con.execute("UPDATE meta SET valor = ? WHERE nome = 'desde'", (str(desde) if desde is not None else None,))
+
+    # -------- gravação --------
+
+    def registrar(self, novo, anterior):
+        """
+        Ouvinte do CacheDados: só agenda a gravação. Se outra versão chegar
+        antes de a anterior ser gravada, fica só a mais nova, comparada
+        inteira contra `estado_atual` (o delta dela não cobre as versões puladas).
+        """
+        with self._fila:
+            if self._pendente is not None:
+                anterior = None
+            self._pendente = (novo, anterior)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._trabalhar, name="historico", daemon=True)
+                self._thread.start()
+            self._fila.notify()
+
+    def aguardar(self, timeout: Optional[float] = None) -> bool:
+        """Espera a fila esvaziar (scripts e benchmarks); retorna False se o prazo venceu"""
+        with self._fila:
+            return self._fila.wait_for(lambda: self._pendente is None and not self._gravando, timeout)
+
+    def _trabalhar(self):
+        while True:
+            with self._fila:
+                self._fila.wait_for(lambda: self._pendente is not None)
+                novo, anterior = self._pendente
+                self._pendente = None
+                self._gravando = True
+            try:
+                self._registrar(novo, anterior)
+            except Exception as e:
+                print(f"⚠️ Histórico não gravado: {e}")
+            finally:
+                with self._fila:
+                    self._gravando = False
+                    self._fila.notify_all()
+
+    def _registrar(self, novo, anterior):
+        """Grava o que mudou desde a última versão gravada"""
+        df = novo.df
+        if "trip_number" not in df.columns:
+            return
+
+        with etapa("historico"):
+            afetados = None
+            if anterior is not None and not novo.delta.completo:
+                # Com delta, só os LTs tocados precisam ser comparados
+                partes = [d for d in (novo.delta.adicionados, novo.delta.atualizados, novo.delta.removidos)
+                          if not d.empty]
+                afetados = sorted({str(t) for d in partes for t in d["trip_number"].astype(object)})
+                df = novo.indice.selecionar(novo.indice.posicoes("trip_number", afetados))
+
+            chaves = chaves_linhas(df)
+            impressoes = pd.Series(pd.util.hash_pandas_object(df, index=False).to_numpy().view(np.int64),
+                                   index=chaves)
+
+            with self._lock, closing(self._conectar()) as con:
+                con.execute("BEGIN IMMEDIATE")
+                try:
+                    gravadas = self._gravar(con, novo, df, impressoes, afetados)
+                    con.execute("COMMIT")
+                except Exception:
+                    con.execute("ROLLBACK")
+                    raise
+
+                if gravadas:
+                    print(f"🕘 Histórico: {gravadas} mudanças gravadas")
+                self._compactar_se_preciso(con)
+
+    def _estado(self, con: sqlite3.Connection, afetados: Optional[List[str]]) -> pd.Series:
+        if afetados is None:
+            linhas = con.execute("SELECT chave, impressao FROM estado_atual").fetchall()
+        else:
+            linhas = []
+            for i in range(0, len(afetados), LOTE_SQL):
+                lote = afetados[i:i + LOTE_SQL]
+                linhas += con.execute(
+                    f"SELECT chave, impressao FROM estado_atual WHERE trip_number IN ({','.join('?' * len(lote))})",
+                    lote).fetchall()
+        return pd.Series(dict(linhas), dtype=np.int64)
+
+    def _gravar(self, con, novo, df: pd.DataFrame, impressoes: pd.Series, afetados) -> int:
+        gravadas = self._estado(con, afetados)
+        posicao = gravadas.index.get_indexer(impressoes.index)
+        adicionado = posicao < 0
+        alterado = np.zeros(len(posicao), dtype=bool)
+        existentes = np.flatnonzero(~adicionado)
+        alterado[existentes] = gravadas.to_numpy()[posicao[existentes]] != impressoes.to_numpy()[existentes]
+        removidas = gravadas.index.difference(impressoes.index)
+
+        mudou = np.flatnonzero(adicionado | alterado)
+        if not len(mudou) and not len(removidas):
+            return 0
+
+        instante = novo.modificado_em
+        linhas = df.iloc[mudou]
+        colunas = colunas_json(linhas)
+        nomes = list(colunas)
+        registros = [orjson.dumps(dict(zip(nomes, valores))).decode() for valores in zip(*colunas.values())]
+        status = colunas.get("Status_da_Viagem", [None] * len(mudou))
+        destinos = colunas.get("destination_station_code", [None] * len(mudou))
+        chaves = impressoes.index[mudou]
+        viagens = [c.rsplit("#", 1)[0] for c in chaves]
+
+        con.executemany(
+            "INSERT INTO mudancas (instante, versao, chave, trip_number, tipo, status, destino, dados) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(instante, novo.versao, chave, viagem, "adicionado" if adicionado[i] else "atualizado",
+              _texto(s), _texto(d), dados)
+             for i, chave, viagem, s, d, dados in zip(mudou, chaves, viagens, status, destinos, registros)],
+        )
+        con.executemany(
+            "INSERT OR REPLACE INTO estado_atual (chave, trip_number, impressao) VALUES (?, ?, ?)",
+            [(chave, viagem, int(impressoes.iloc[i])) for i, chave, viagem in zip(mudou, chaves, viagens)],
+        )
+        if len(removidas):
+            con.executemany(
+                "INSERT INTO mudancas (instante, versao, chave, trip_number, tipo) VALUES (?, ?, ?, ?, 'removido')",
+                [(instante, novo.versao, chave, chave.rsplit("#", 1)[0]) for chave in removidas],
+            )
+            con.executemany("DELETE FROM estado_atual WHERE chave = ?", [(chave,) for chave in removidas])
+
+        self._somar(con, "mudancas", len(mudou) + len(removidas))
+        self._somar(con, "linhas_atuais", int(adicionado.sum()) - len(removidas))
+        con.execute("UPDATE meta SET valor = ? WHERE nome = 'desde' AND valor IS NULL", (str(instante),))
+        return len(mudou) + len(removidas)
+
+    # -------- compactação --------
+
+    def _compactar_se_preciso(self, con: sqlite3.Connection):
+        linha = con.execute("SELECT valor FROM meta WHERE nome = 'compactado_em'").fetchone()
+        if linha and time.time() - float(linha[0]) < INTERVALO_COMPACTACAO:
+            return
+        self.compactar(con)
+
+    def compactar(self, con: Optional[sqlite3.Connection] = None):
+        """
+        Mantém o log enxuto:
+        - depois de RETENCAO_DETALHE, apaga atualizações que não mudaram o
+          status (a última linha de cada chave é sempre mantida);
+        - depois de RETENCAO_TOTAL, apaga o histórico de LTs que já saíram.
+        """
+        if con is None:
+            with closing(self._conectar()) as con:
+                return self.compactar(con)
+
+        agora = time.time()
+        with etapa("historico_compactacao"):
+            con.execute("BEGIN IMMEDIATE")
+            detalhe = con.execute("""
+                DELETE FROM mudancas WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, tipo, instante, status,
+                               LAG(status) OVER (PARTITION BY chave ORDER BY id) AS status_anterior,
+                               LEAD(id) OVER (PARTITION BY chave ORDER BY id) AS proximo
+                        FROM mudancas
+                    )
+                    WHERE tipo = 'atualizado' AND instante < ? AND proximo IS NOT NULL
+                      AND status IS status_anterior
+                )""", (agora - RETENCAO_DETALHE,)).rowcount
+            antigos = con.execute("""
+                DELETE FROM mudancas
+                WHERE instante < ? AND chave NOT IN (SELECT chave FROM estado_atual)""",
+                (agora - RETENCAO_TOTAL,)).rowcount
+            self._somar(con, "mudancas", -(detalhe + antigos))
+            self._atualizar_desde(con)
+            con.execute("INSERT OR REPLACE INTO meta (nome, valor) VALUES ('compactado_em', ?)", (str(agora),))
+            con.execute("COMMIT")
+            con.execute("PRAGMA incremental_vacuum")
+            con.execute("PRAGMA optimize")
+        if detalhe or antigos:
+            print(f"🧹 Histórico compactado: {detalhe} detalhes e {antigos} registros antigos removidos")
+
+    # -------- consultas --------
+
+    def historico(self, trip_number: str) -> List[dict]:
+        """Mudanças do LT em ordem cronológica"""
+        with closing(self._conectar()) as con:
+            linhas = con.execute(
+                "SELECT instante, chave, tipo, status, destino, dados FROM mudancas "
+                "WHERE trip_number = ? ORDER BY instante, id", (trip_number,)).fetchall()
+        return [
+            {"instante": _iso(instante), "chave": chave, "tipo": tipo, "status": status, "destino": destino,
+             "dados": orjson.loads(dados) if dados else None}
+            for instante, chave, tipo, status, destino, dados in linhas
+        ]
+
+    def permanencia(self, trip_number: str, ate: Optional[float] = None) -> dict:
+        """Segundos em cada status, por linha do LT (chave) e no total"""
+        ate = ate if ate is not None else time.time()
+        with closing(self._conectar()) as con:
+            linhas = con.execute(
+                "SELECT chave, instante, tipo, status FROM mudancas "
+                "WHERE trip_number = ? AND instante <= ? ORDER BY chave, instante, id", (trip_number, ate)).fetchall()
+
+        ocorrencias: Dict[str, dict] = {}
+        for chave, instante, tipo, status in linhas:
+            item = ocorrencias.setdefault(chave, {"chave": chave, "status_atual": None, "desde": None, "permanencia": {}})
+            if item["status_atual"] is not None:
+                decorrido = instante - item["desde"]
+                item["permanencia"][item["status_atual"]] = item["permanencia"].get(item["status_atual"], 0) + decorrido
+            if tipo == "removido":
+                item["status_atual"], item["desde"] = None, None
+            elif status != item["status_atual"] or item["desde"] is None:
+                item["status_atual"], item["desde"] = status, instante
+
+        total: Dict[str, float] = {}
+        for item in ocorrencias.values():
+            if item["status_atual"] is not None:
+                atual = item["status_atual"]
+                item["permanencia"][atual] = item["permanencia"].get(atual, 0) + ate - item["desde"]
+            item["desde"] = _iso(item["desde"]) if item["desde"] is not None else None
+            item["permanencia"] = {s: round(v) for s, v in item["permanencia"].items()}
+            for s, v in item["permanencia"].items():
+                total[s] = total.get(s, 0) + v
+        return {"trip_number": trip_number, "ate": _iso(ate), "total": total, "ocorrencias": list(ocorrencias.values())}
+
+    def no_instante(self, instante: float, filtros: Optional[Dict[str, List[str]]] = None) -> pd.DataFrame:
+        """Conjunto de dados como estava em `instante` (última versão de cada linha até ali)"""
+        colunas_sql = {"trip_number": "m.trip_number", "Status_da_Viagem": "m.status",
+                       "destination_station_code": "m.destino"}
+        condicoes, parametros = ["m.tipo != 'removido'"], [instante]
+        for coluna, valores in (filtros or {}).items():
+            if valores and coluna in colunas_sql:
+                condicoes.append(f"{colunas_sql[coluna]} IN ({','.join('?' * len(valores))})")
+                parametros += list(valores)
+
+        with closing(self._conectar()) as con:
+            linhas = con.execute(f"""
+                SELECT m.dados FROM mudancas m
+                JOIN (SELECT chave, MAX(id) AS id FROM mudancas WHERE instante <= ? GROUP BY chave) u
+                  ON u.id = m.id
+                WHERE {' AND '.join(condicoes)}
+                ORDER BY m.id""", parametros).fetchall()
+
+        df = pd.DataFrame.from_records([orjson.loads(dados) for (dados,) in linhas])
+        if "Data" in df.columns:
+            df["Data"] = pd.to_datetime(df["Data"], format="%Y-%m-%d", errors="coerce")
+        # Horários gravados como texto voltam a datetime, como no snapshot
+        return converter_tipos(df)
+
+    def status(self) -> dict:
+        """Só lê os contadores de `meta`: barato o bastante para rodar no event loop"""
+        if not self.caminho.exists():
+            return {"caminho": str(self.caminho), "mudancas": 0}
+        with closing(self._conectar()) as con:
+            valores = dict(con.execute(
+                f"SELECT nome, valor FROM meta WHERE nome IN ({','.join('?' * len(CONTADORES))})",
+                CONTADORES).fetchall())
+        desde = valores.get("desde")
+        return {
+            "caminho": str(self.caminho),
+            "mudancas": int(valores.get("mudancas") or 0),
+            "linhas_atuais": int(valores.get("linhas_atuais") or 0),
+            "desde": _iso(float(desde)) if desde else None,
+            "bytes": self.caminho.stat().st_size,
+        }
+
+
+historico = HistoricoViagens()
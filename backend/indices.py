@@ -0,0 +1,247 @@
+"""
+Índices de filtro - Dashboard de Monitoramento de Viagens
+Colunas categóricas compactas, listas invertidas (valor -> posições) e
+intervalo de datas por busca binária, montados uma vez por snapshot
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from metricas import etapa
+
+# `fonte` só existe com várias planilhas/abas (FonteMultipla)
+COLUNAS_CATEGORICAS = ["trip_number", "destination_station_code", "Status_da_Viagem", "fonte"]
+
+# ==================== COMPACTAÇÃO ====================
+
+@etapa("compactacao")
+def compactar(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte as colunas de baixa cardinalidade para category, sem alterar a ordem das linhas"""
+    df = df.copy(deep=False)
+    for col in COLUNAS_CATEGORICAS:
+        if col not in df.columns:
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.remove_unused_categories()
+        else:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def relatorio_memoria(df: pd.DataFrame) -> dict:
+    """Compara o uso de memória do DataFrame compacto com a versão só com object"""
+    objeto = df.astype({c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+    mem_objeto = objeto.memory_usage(deep=True, index=False)
+    mem_compacto = df.memory_usage(deep=True, index=False)
+
+    total_objeto = int(mem_objeto.sum())
+    total_compacto = int(mem_compacto.sum())
+    return {
+        "registros": len(df),
+        "objeto_bytes": total_objeto,
+        "compacto_bytes": total_compacto,
+        "reducao_percentual": round(100 * (1 - total_compacto / total_objeto), 1) if total_objeto else 0.0,
+        "colunas": {
+            col: {"dtype": str(df[col].dtype), "objeto_bytes": int(mem_objeto[col]), "compacto_bytes": int(mem_compacto[col])}
+            for col in df.columns
+        },
+    }
+
+# ==================== ÍNDICE ====================
+
+class IndiceFiltros:
+    """
+    Índice somente leitura sobre um snapshot.
+
+    Cada filtro vira uma lista ordenada de posições; a consulta é a
+    interseção dessas listas, sem copiar o DataFrame inteiro.
+    """
+
+    @etapa("indice")
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {}
+        for col in COLUNAS_CATEGORICAS:
+            if col in df.columns:
+                self.postings[col] = self._listas_invertidas(df[col])
+
+        self._postos: Dict[str, np.ndarray] = {}
+
+        self._ordem_data: Optional[np.ndarray] = None
+        self._datas_ordenadas: Optional[np.ndarray] = None
+        if "Data" in df.columns:
+            datas = df["Data"].to_numpy()
+            validas = np.flatnonzero(~np.isnat(datas))
+            self._ordem_data = validas[np.argsort(datas[validas], kind="stable")]
+            self._datas_ordenadas = datas[self._ordem_data]
+
+    @staticmethod
+    def _listas_invertidas(coluna: pd.Series) -> Dict[str, np.ndarray]:
+        codigos = coluna.cat.codes.to_numpy()
+        ordem = np.argsort(codigos, kind="stable")
+        ordenados = codigos[ordem]
+        inicios = np.concatenate(([0], np.flatnonzero(np.diff(ordenados)) + 1))
+        categorias = coluna.cat.categories
+
+        listas = {}
+        for inicio, grupo in zip(inicios, np.split(ordem, inicios[1:])):
+            codigo = ordenados[inicio]
+            if codigo >= 0:  # -1 = valor ausente
+                listas[str(categorias[codigo])] = grupo
+        return listas
+
+    def __len__(self):
+        return len(self.df)
+
+    # -------- consultas --------
+
+    def valores(self, coluna: str) -> List[str]:
+        """Valores distintos (ordenados) de uma coluna indexada"""
+        return sorted(self.postings.get(coluna, {}))
+
+    def posicoes(self, coluna: str, valores: Iterable[str]) -> np.ndarray:
+        listas = self.postings.get(coluna, {})
+        encontradas = [listas[v] for v in valores if v in listas]
+        if not encontradas:
+            return np.empty(0, dtype=np.intp)
+        if len(encontradas) == 1:
+            return encontradas[0]
+        return np.unique(np.concatenate(encontradas))
+
+    def intervalo(self, inicio=None, fim=None) -> np.ndarray:
+        """Posições com `inicio <= Data <= fim`, em ordem de linha"""
+        if self._datas_ordenadas is None:
+            return np.arange(len(self.df))
+        unidade = self._datas_ordenadas.dtype
+        lo = 0 if inicio is None else np.searchsorted(
+            self._datas_ordenadas, pd.Timestamp(inicio).to_datetime64().astype(unidade), side="left")
+        hi = len(self._datas_ordenadas) if fim is None else np.searchsorted(
+            self._datas_ordenadas, pd.Timestamp(fim).to_datetime64().astype(unidade), side="right")
+        return np.sort(self._ordem_data[lo:hi])
+
+    @etapa("filtro")
+    def filtrar(self, filtros: Optional[Dict[str, List[str]]] = None, inicio=None, fim=None) -> np.ndarray:
+        """
+        Posições das linhas que atendem a todos os filtros.
+
+        `filtros` mapeia coluna -> valores aceitos; listas vazias são ignoradas,
+        assim como colunas que não existem no snapshot.
+        """
+        candidatas = [
+            self.posicoes(col, valores)
+            for col, valores in (filtros or {}).items()
+            if valores and col in self.postings
+        ]
+        if (inicio is not None or fim is not None) and "Data" in self.df.columns:
+            candidatas.append(self.intervalo(inicio, fim))
+
+        if not candidatas:
+            return np.arange(len(self.df))
+
+        # Interseção começando pela menor lista
+        candidatas.sort(key=len)
+        resultado = candidatas[0]
+        for pos in candidatas[1:]:
+            if not len(resultado):
+                break
+            resultado = np.intersect1d(resultado, pos, assume_unique=True)
+        return resultado
+
+    def selecionar(self, posicoes: np.ndarray, colunas: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        df = self.df if colunas is None else self.df[list(colunas)]
+        return df.take(posicoes)
+
+    # -------- ordenação e paginação --------
+
+    def posto(self, coluna: str) -> np.ndarray:
+        """
+        Posto denso de cada linha na ordenação da coluna (calculado uma vez por snapshot).
+        Valores ausentes recebem -1.
+        """
+        if coluna not in self._postos:
+            serie = self.df[coluna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                # Categorias já estão em ordem lexicográfica
+                postos = serie.cat.codes.to_numpy().astype(np.int64)
+            else:
+                postos = serie.rank(method="dense").fillna(0).to_numpy().astype(np.int64) - 1
+            self._postos[coluna] = postos
+        return self._postos[coluna]
+
+    def ordenar(self, posicoes: np.ndarray, ordenacao: Sequence[Tuple[str, bool]]) -> np.ndarray:
+        """
+        Ordena posições por [(coluna, decrescente), ...].
+        Ausentes ficam no fim (como no sort_values) e empates mantêm a ordem da planilha.
+        """
+        if not ordenacao or not len(posicoes):
+            return posicoes
+        chaves = []
+        for coluna, decrescente in ordenacao:
+            postos = self.posto(coluna)[posicoes]
+            ausentes = postos < 0
+            if decrescente:
+                postos = -postos
+            chaves.append(np.where(ausentes, np.iinfo(np.int64).max, postos))
+        # lexsort usa a última chave como principal
+        return posicoes[np.lexsort(chaves[::-1])]
+
+    @etapa("ordenacao")
+    def pagina(self, posicoes: np.ndarray, ordenacao: Sequence[Tuple[str, bool]] = (),
+               offset: int = 0, limit: Optional[int] = None) -> np.ndarray:
+        """Ordena e recorta as posições; só a página é materializada depois"""
+        posicoes = self.ordenar(posicoes, ordenacao)
+        fim = None if limit is None else offset + limit
+        return posicoes[offset:fim]
+
+
+def interpretar_ordenacao(valor: Optional[str], colunas: Iterable[str]) -> List[Tuple[str, bool]]:
+    """
+    Converte "Data,-trip_number" em [("Data", False), ("trip_number", True)].
+    Levanta ValueError para colunas inexistentes.
+    """
+    if not valor:
+        return []
+    colunas = set(colunas)
+    ordenacao = []
+    for item in (x.strip() for x in valor.split(",")):
+        if not item:
+            continue
+        decrescente = item.startswith("-")
+        coluna = item.lstrip("+-")
+        if coluna not in colunas:
+            raise ValueError(f"Coluna de ordenação inválida: {coluna}")
+        ordenacao.append((coluna, decrescente))
+    return ordenacao
+
+
+def interpretar_projecao(valor: Optional[str], colunas: Iterable[str]) -> Optional[List[str]]:
+    """
+    Converte "trip_number,Data" na lista de colunas a retornar (None se vazio).
+    Levanta ValueError para colunas inexistentes, como interpretar_ordenacao.
+    """
+    pedidas = [c.strip() for c in (valor or "").split(",") if c.strip()]
+    if not pedidas:
+        return None
+    colunas = set(colunas)
+    invalidas = [c for c in pedidas if c not in colunas]
+    if invalidas:
+        raise ValueError(f"Coluna inválida em fields: {', '.join(invalidas)}")
+    return pedidas
+
+
+def interpretar_data(valor: Optional[str]) -> Optional[pd.Timestamp]:
+    """
+    Converte "2024-05-01" (ou ISO com horário) no Timestamp usado pelos filtros.
+    Vazio vira None; levanta ValueError para datas inválidas.
+    """
+    if not valor:
+        return None
+    try:
+        data = pd.Timestamp(valor)
+    except (ValueError, TypeError, OverflowError):
+        data = pd.NaT
+    if pd.isna(data):
+        raise ValueError(f"Data inválida: {valor}")
+    # As datas do snapshot não têm fuso
+    return data.tz_localize(None) if data.tzinfo is not None else data
@@ -2,76 +2,53 @@
 Backend API - Dashboard de Monitoramento de Viagens
 API REST para servir dados do Google Sheets ao frontend React
 """
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import asyncio
+import os
 import time
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+import orjson
 from typing import Optional
 import uvicorn
-from pathlib import Path
+
+from agregados import agregados_da_consulta
+from busca import COLUNAS_BUSCA, LIMITE_MAXIMO, LIMITE_PADRAO
+from cache_respostas import CacheRespostas, responder_com_cache
+from dados import MODO_CACHE, cache, carregar_dados
+from eventos import CanalEventos, formatar_evento, montar_patch
+from execucao import ExecutorLimitado, PrazoExcedido, Sobrecarga
+from exportacao import FORMATOS_EXPORTACAO, cabecalhos_exportacao, gerar_exportacao, interpretar_exportacao
+from formatos import FORMATOS, colunas_json, negociar_formato, resposta
+from historico import historico, instante_de_texto
+from indices import (IndiceFiltros, compactar, interpretar_data, interpretar_ordenacao, interpretar_projecao,
+                     relatorio_memoria)
+from metricas import (MIME_PROMETHEUS, REQUISICOES, RESPOSTA_BYTES, iniciar_perfil, registro,
+                      server_timing)
 
 # ==================== CONFIGURAÇÕES ====================
 
-PLANILHA_ID = "1BKB3rsrZFcHxRt0LkTABtSBlqv7VWU6TwmkbwX95TLI"
-NOME_ABA = "Base Principal"
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-CACHE_DURATION = 60  # segundos
 API_PORT = 8000
+# Mais de um worker exige DASHBOARD_CACHE=leitor e o publicador (compartilhado.py) rodando
+API_WORKERS = int(os.environ.get("DASHBOARD_WORKERS", "1"))
+# Espera máxima pela primeira carga da fonte (sem snapshot ainda)
+PRAZO_CARGA = 60  # segundos
+# Com o cabeçalho X-Perfil: 1, a resposta traz o tempo de cada etapa em Server-Timing
+PERFIL_HABILITADO = os.environ.get("DASHBOARD_PERFIL", "1") != "0"
 
-# Cache global
-dados_cache = {"df": None, "timestamp": None}
-
-# ==================== FUNÇÕES ====================
+# Respostas serializadas por (versão do snapshot, consulta)
+respostas = CacheRespostas()
+# Assinantes de /api/events
+canal = CanalEventos()
+# Filtros, agregações e serialização pesados rodam aqui, fora do event loop
+executor = ExecutorLimitado()
 
-def carregar_dados() -> pd.DataFrame:
-    """Carrega dados do Google Sheets com cache"""
-    global dados_cache
-    
-    # Verifica cache
-    if dados_cache["df"] is not None and dados_cache["timestamp"] is not None:
-        tempo_decorrido = time.time() - dados_cache["timestamp"]
-        if tempo_decorrido < CACHE_DURATION:
-            print(f"📦 Cache ({int(CACHE_DURATION - tempo_decorrido)}s restantes)")
-            return dados_cache["df"]
-    
-    try:
-        # Busca account.json na raiz do projeto
-        account_path = Path(__file__).parent.parent / "account.json"
-        if not account_path.exists():
-            raise FileNotFoundError("account.json não encontrado na raiz do projeto!")
-        
-        print("🔄 Carregando dados do Google Sheets...")
-        
-        # Autentica e carrega
-        creds = Credentials.from_service_account_file(str(account_path), scopes=SCOPES)
-        gc = gspread.authorize(creds)
-        sheet = gc.open_by_key(PLANILHA_ID).worksheet(NOME_ABA)
-        
-        all_values = sheet.get_all_values()
-        if not all_values or len(all_values) < 2:
-            return pd.DataFrame()
-        
-        df = pd.DataFrame(all_values[1:], columns=all_values[0]).dropna(how='all')
-        
-        # Processa data
-        if "Data" in df.columns:
-            df["Data"] = pd.to_datetime(df["Data"], format='%d/%m/%Y', errors="coerce")
-        
-        # Atualiza cache
-        dados_cache["df"] = df
-        dados_cache["timestamp"] = time.time()
-        
-        print(f"✅ {len(df)} registros carregados")
-        return df
-        
-    except Exception as e:
-        print(f"❌ Erro: {e}")
-        raise
+registro.medidor("dashboard_executor", "Estado do executor de CPU",
+                 lambda: {(k,): v for k, v in executor.status().items()}, ["campo"])
+registro.medidor("dashboard_cache_respostas", "LRU de respostas serializadas",
+                 lambda: {(k,): v for k, v in respostas.status().items()}, ["campo"])
+registro.medidor("dashboard_sse_assinantes", "Conexões abertas em /api/events", lambda: len(canal))
 
 # ==================== FASTAPI ====================
 
@@ -87,12 +64,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Cache", "ETag", "Last-Modified", "Server-Timing"],
 )
 
+@app.middleware("http")
+async def medir_requisicao(request: Request, call_next):
+    """Latência e tamanho por endpoint (rota, não a URL, para não explodir os rótulos)"""
+    perfil = iniciar_perfil() if PERFIL_HABILITADO and request.headers.get("x-perfil") == "1" else None
+    inicio = time.perf_counter()
+    response = await call_next(request)
+    duracao = time.perf_counter() - inicio
+    
+    rota = request.scope.get("route")
+    endpoint = getattr(rota, "path", "desconhecido")
+    REQUISICOES.observar(duracao, endpoint=endpoint, metodo=request.method, status=response.status_code)
+    tamanho = response.headers.get("content-length")
+    if tamanho:
+        RESPOSTA_BYTES.observar(int(tamanho), endpoint=endpoint)
+    if perfil is not None:
+        response.headers["Server-Timing"] = server_timing(perfil, duracao)
+    return response
+
+def publicar_patch(novo, anterior):
+    """Serializa o patch uma vez e envia para todos os assinantes"""
+    if len(canal):
+        evento = montar_patch(novo, anterior)
+        if evento:
+            canal.publicar(evento)
+
+@app.on_event("startup")
+def iniciar_atualizacao():
+    """Restaura o snapshot salvo (em cada worker) e o mantém atualizado em background"""
+    cache.adicionar_ouvinte(publicar_patch)
+    if cache.restaurar_do_disco():
+        print("✅ Snapshot restaurado, atualizando em background")
+    cache.iniciar_atualizacao_periodica()
+
+@app.on_event("shutdown")
+def parar_atualizacao():
+    cache.parar()
+    executor.encerrar()
+
+@app.exception_handler(Sobrecarga)
+async def tratar_sobrecarga(request: Request, exc: Sobrecarga):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(PrazoExcedido)
+async def tratar_prazo(request: Request, exc: PrazoExcedido):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 # ==================== ENDPOINTS ====================
 
 @app.get("/")
-def root():
+async def root():
     """Status da API"""
     return {
         "status": "online",
@@ -100,86 +124,403 @@ def root():
         "docs": "/docs"
     }
 
+@app.get("/api/status")
+async def get_status():
+    """Idade do snapshot e estado da atualização"""
+    return {**cache.status(), "cache_respostas": respostas.status(), "executor": executor.status(),
+            "historico": historico.status()}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas no formato texto do Prometheus"""
+    return Response(content=registro.expor(), media_type=MIME_PROMETHEUS)
+
+# Repassados sem virar 500
+ERROS_REPASSADOS = (HTTPException, Sobrecarga, PrazoExcedido)
+
+async def _snapshot():
+    """Snapshot sem bloquear o event loop; só a carga inicial espera pela fonte"""
+    if cache.atual() is not None:
+        # Vencido apenas dispara a atualização em background
+        return cache.snapshot()
+    try:
+        return await asyncio.wait_for(run_in_threadpool(cache.snapshot), PRAZO_CARGA)
+    except asyncio.TimeoutError:
+        raise PrazoExcedido(f"A fonte não respondeu em {PRAZO_CARGA}s")
+
+def _lista(valor: Optional[str]) -> list:
+    """Converte parâmetro separado por vírgula em lista"""
+    return [x.strip() for x in valor.split(",") if x.strip()] if valor else []
+
+def _formato(request: Request, format: Optional[str]) -> str:
+    try:
+        return negociar_formato(format, request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _datas(start_date: Optional[str], end_date: Optional[str]) -> tuple:
+    """Valida as datas antes de chegar ao índice: data inválida é 400, não 500"""
+    try:
+        return interpretar_data(start_date), interpretar_data(end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _filtrar(indice, trip_numbers, destinations, status, start_date, end_date):
+    """Interseção das listas invertidas, sem copiar o snapshot"""
+    return indice.filtrar(
+        {
+            "trip_number": _lista(trip_numbers),
+            "destination_station_code": _lista(destinations),
+            "Status_da_Viagem": _lista(status),
+        },
+        inicio=start_date,
+        fim=end_date,
+    )
+
+def _ordenacao_e_projecao(sort: Optional[str], fields: Optional[str], colunas) -> tuple:
+    colunas = list(colunas)
+    try:
+        return interpretar_ordenacao(sort, colunas), interpretar_projecao(fields, colunas)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _pagina_de_dados(indice, formato, trip_numbers, destinations, status, start_date, end_date,
+                     ordenacao, offset, limit, projecao) -> Response:
+    """Filtro, ordenação, paginação e projeção de /api/data sobre qualquer índice"""
+    posicoes = _filtrar(indice, trip_numbers, destinations, status, start_date, end_date)
+    # Só a página pedida é materializada
+    df = indice.selecionar(indice.pagina(posicoes, ordenacao, offset, limit), projecao)
+    return resposta(df, formato, headers={"X-Total-Count": str(len(posicoes))})
+
+async def _com_cache(request: Request, snap, endpoint: str, gerar, formato: Optional[str] = None) -> Response:
+    """
+    ETag/304 e LRU de respostas, chaveados pela versão do snapshot e pelos
+    filtros normalizados; `gerar` só roda no executor quando não há cache
+    """
+    respostas.descartar_versoes_antigas(snap.id)
+    params = dict(request.query_params)
+    if formato is not None:
+        params["format"] = formato
+    return await responder_com_cache(request, respostas, snap.id, snap.modificado_em, endpoint, params,
+                                     lambda: executor.executar(gerar))
+
+FORMAT_QUERY = Query(None, description="Formato da resposta: json, columnar ou arrow (ou via cabeçalho Accept)")
+
 @app.get("/api/data")
-def get_data(
+async def get_data(
+    request: Request,
     trip_numbers: Optional[str] = Query(None, description="IDs (separados por vírgula)"),
     destinations: Optional[str] = Query(None, description="Destinos (separados por vírgula)"),
     status: Optional[str] = Query(None, description="Status (separados por vírgula)"),
     start_date: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="Data final (YYYY-MM-DD)")
+    end_date: Optional[str] = Query(None, description="Data final (YYYY-MM-DD)"),
+    limit: Optional[int] = Query(None, ge=1, description="Máximo de registros (sem limite se omitido)"),
+    offset: int = Query(0, ge=0, description="Registros a pular"),
+    sort: Optional[str] = Query(None, description="Colunas de ordenação, '-' para decrescente (ex: -Data,trip_number)"),
+    fields: Optional[str] = Query(None, description="Colunas a retornar (separadas por vírgula)"),
+    format: Optional[str] = FORMAT_QUERY
 ):
-    """Retorna dados filtrados"""
+    """Retorna dados filtrados, com paginação, ordenação e projeção de colunas"""
+    formato = _formato(request, format)
+    start_date, end_date = _datas(start_date, end_date)
     try:
-        df = carregar_dados().copy()
+        snap = await _snapshot()
+        indice = snap.indice
+        ordenacao, projecao = _ordenacao_e_projecao(sort, fields, indice.df.columns)
         
-        # Aplica filtros
-        if trip_numbers and "trip_number" in df.columns:
-            ids = [x.strip() for x in trip_numbers.split(",") if x.strip()]
-            if ids:
-                df = df[df["trip_number"].isin(ids)]
+        def gerar():
+            return _pagina_de_dados(indice, formato, trip_numbers, destinations, status, start_date, end_date,
+                                    ordenacao, offset, limit, projecao)
         
-        if destinations and "destination_station_code" in df.columns:
-            dests = [x.strip() for x in destinations.split(",") if x.strip()]
-            if dests:
-                df = df[df["destination_station_code"].isin(dests)]
+        return await _com_cache(request, snap, "data", gerar, formato)
         
-        if status and "Status_da_Viagem" in df.columns:
-            statuses = [x.strip() for x in status.split(",") if x.strip()]
-            if statuses:
-                df = df[df["Status_da_Viagem"].isin(statuses)]
-        
-        # Filtros de data
-        if "Data" in df.columns:
-            if start_date:
-                df = df[df["Data"] >= pd.to_datetime(start_date)]
-            if end_date:
-                df = df[df["Data"] <= pd.to_datetime(end_date)]
-            df["Data"] = df["Data"].dt.strftime('%Y-%m-%d')
+    except ERROS_REPASSADOS:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/events")
+async def get_events(request: Request):
+    """
+    Server-Sent Events: `versao` ao conectar, `snapshot` com o patch de cada
+    nova versão e `reload` quando o cliente deve recarregar tudo.
+    """
+    snap = cache.atual()
+    versao = snap.id if snap else None
+    ultimo = request.headers.get("last-event-id")
+    if ultimo and versao and ultimo != versao:
+        # Reconexão depois de perder versões: o patch não cobre o intervalo
+        inicial = formatar_evento("reload", {"versao": versao, "anterior": ultimo}, versao)
+    else:
+        inicial = formatar_evento("versao", {"versao": versao}, versao)
+    
+    return StreamingResponse(
+        canal.assinar(inicial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/export")
+async def export_data(
+    trip_numbers: Optional[str] = Query(None, description="IDs (separados por vírgula)"),
+    destinations: Optional[str] = Query(None, description="Destinos (separados por vírgula)"),
+    status: Optional[str] = Query(None, description="Status (separados por vírgula)"),
+    start_date: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Data final (YYYY-MM-DD)"),
+    format: str = Query("csv", description="csv ou parquet"),
+    fields: Optional[str] = Query(None, description="Colunas a exportar (padrão: colunas da tabela)")
+):
+    """Exporta os dados filtrados em lotes, com memória limitada"""
+    parametros = {"trip_numbers": trip_numbers, "destinations": destinations, "status": status,
+                  "start_date": start_date, "end_date": end_date, "format": format, "fields": fields}
+    try:
+        indice = (await _snapshot()).indice
+        try:
+            pedido = interpretar_exportacao(parametros, list(indice.df.columns))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        posicoes = await executor.executar(indice.filtrar, pedido["filtros"], pedido["inicio"], pedido["fim"])
+    except ERROS_REPASSADOS:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    # Recusa antes de começar o stream; depois cada lote só espera a vez no executor
+    executor.admitir()
+    formato = pedido["formato"]
+    return StreamingResponse(
+        executor.iterar(gerar_exportacao(formato, indice, posicoes, pedido["colunas"])),
+        media_type=FORMATOS_EXPORTACAO[formato][0],
+        headers=cabecalhos_exportacao(formato, len(posicoes))
+    )
+
+LISTAS_FILTROS = {"trip_numbers": "trip_number", "destinations": "destination_station_code", "status": "Status_da_Viagem"}
+
+@app.get("/api/filters")
+async def get_filters(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Listas a retornar: trip_numbers, destinations, status (padrão: todas)")
+):
+    """Retorna opções de filtros; para LTs e destinos prefira /api/search, que não envia a lista inteira"""
+    nomes = [n for n in _lista(fields) if n in LISTAS_FILTROS] or list(LISTAS_FILTROS)
+    try:
+        snap = await _snapshot()
+        indice = snap.indice
         
-        return df.to_dict(orient="records")
+        def gerar():
+            return Response(content=orjson.dumps({nome: indice.valores(LISTAS_FILTROS[nome]) for nome in nomes}),
+                            media_type="application/json")
         
+        return await _com_cache(request, snap, "filters", gerar)
+    except ERROS_REPASSADOS:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/filters")
-def get_filters():
-    """Retorna opções de filtros"""
+@app.get("/api/search")
+async def search(
+    request: Request,
+    q: str = Query("", description="Texto digitado (sem texto, retorna os valores mais frequentes)"),
+    fields: Optional[str] = Query(None, description=f"Campos pesquisados (padrão: {','.join(COLUNAS_BUSCA)})"),
+    limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO, description="Máximo de resultados")
+):
+    """Autocompletar dos filtros: valores que começam com ou contêm `q`, por relevância"""
+    campos = _lista(fields) or None
+    invalidos = [c for c in campos or [] if c not in COLUNAS_BUSCA]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos não pesquisáveis: {', '.join(invalidos)}")
     try:
-        df = carregar_dados()
+        snap = await _snapshot()
+        
+        def gerar():
+            return Response(content=orjson.dumps({"q": q, "resultados": snap.busca.buscar(q, campos, limit)}),
+                            media_type="application/json")
         
-        return {
-            "trip_numbers": sorted([str(x) for x in df["trip_number"].dropna().unique()]) if "trip_number" in df.columns else [],
-            "destinations": sorted([str(x) for x in df["destination_station_code"].dropna().unique()]) if "destination_station_code" in df.columns else [],
-            "status": sorted([str(x) for x in df["Status_da_Viagem"].dropna().unique()]) if "Status_da_Viagem" in df.columns else []
-        }
+        return await _com_cache(request, snap, "search", gerar)
+    except ERROS_REPASSADOS:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/memoria")
+async def get_memoria():
+    """Uso de memória do snapshot: colunas object vs. compactas"""
+    try:
+        return await executor.executar(relatorio_memoria, (await _snapshot()).df)
+    except ERROS_REPASSADOS:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/stats")
-def get_stats():
-    """Retorna estatísticas"""
+async def get_stats(
+    request: Request,
+    trip_numbers: Optional[str] = Query(None, description="IDs (separados por vírgula)"),
+    destinations: Optional[str] = Query(None, description="Destinos (separados por vírgula)"),
+    status: Optional[str] = Query(None, description="Status (separados por vírgula)"),
+    start_date: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Data final (YYYY-MM-DD)"),
+    bucket: str = Query("day", description="Agrupamento da timeline: day, week ou month"),
+    format: Optional[str] = FORMAT_QUERY
+):
+    """Retorna estatísticas a partir dos agregados materializados"""
+    formato = _formato(request, format)
+    start_date, end_date = _datas(start_date, end_date)
     try:
-        df = carregar_dados()
+        snap = await _snapshot()
         
-        if "Status_da_Viagem" not in df.columns or "Data" not in df.columns:
-            return {"status_counts": {}, "timeline": []}
+        def gerar():
+            agregados = agregados_da_consulta(snap.agregados, snap.indice, _lista(trip_numbers))
+            try:
+                status_counts, df_grouped = agregados.consultar(
+                    _lista(destinations), _lista(status), start_date, end_date, bucket
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            if formato == "arrow":
+                # Timeline como tabela; contagens por status vão nos metadados do schema
+                return resposta(df_grouped, formato, metadados={"status_counts": status_counts})
+            
+            timeline = colunas_json(df_grouped)
+            if formato == "json":
+                timeline = [dict(zip(timeline, valores)) for valores in zip(*timeline.values())]
+            
+            return Response(
+                content=orjson.dumps({"status_counts": status_counts, "timeline": timeline}),
+                media_type=FORMATOS[formato]
+            )
         
-        # Contagem por status
-        status_counts = df["Status_da_Viagem"].value_counts().to_dict()
+        return await _com_cache(request, snap, "stats", gerar, formato)
+    except ERROS_REPASSADOS:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ==================== ATRASOS ====================
+
+@app.get("/api/late-trips")
+async def get_late_trips(
+    request: Request,
+    limit: int = Query(50, ge=1, le=1000, description="Máximo de viagens (por destino, com group_by)"),
+    min_delay: float = Query(0, description="Atraso mínimo em minutos (estritamente maior)"),
+    destinations: Optional[str] = Query(None, description="Destinos (separados por vírgula)"),
+    group_by: Optional[str] = Query(None, description="'destination' agrupa as viagens por destino"),
+    format: Optional[str] = FORMAT_QUERY
+):
+    """Viagens ativas mais atrasadas (previsão de chegada - ETA planejado), da maior para a menor"""
+    if group_by not in (None, "destination"):
+        raise HTTPException(status_code=400, detail=f"group_by inválido: {group_by} (use destination)")
+    formato = _formato(request, format)
+    try:
+        snap = await _snapshot()
+        atrasos = snap.atrasos
         
-        # Timeline
-        df_timeline = df.copy()
-        df_timeline["Data"] = pd.to_datetime(df_timeline["Data"], errors="coerce")
-        df_timeline = df_timeline.dropna(subset=["Data"])
-        df_timeline["Data"] = df_timeline["Data"].dt.strftime('%Y-%m-%d')
+        def gerar():
+            if group_by:
+                grupos = atrasos.por_destino(min_delay, _lista(destinations), limit)
+                return Response(content=orjson.dumps({"destinos": grupos}), media_type="application/json")
+            posicoes = atrasos.acima_de(min_delay, _lista(destinations))
+            df = snap.indice.selecionar(posicoes[:limit])
+            return resposta(df, formato, headers={"X-Total-Count": str(len(posicoes))})
         
-        df_grouped = df_timeline.groupby(["Data", "Status_da_Viagem"]).size().reset_index()
-        df_grouped.columns = ["Data", "Status", "Quantidade"]
+        return await _com_cache(request, snap, "late-trips", gerar, formato)
+    except ERROS_REPASSADOS:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/late-trips/percentiles")
+async def get_delay_percentiles(request: Request):
+    """Percentis (p50, p90, p95) do atraso das viagens ativas, por destino"""
+    try:
+        snap = await _snapshot()
         
-        return {
-            "status_counts": status_counts,
-            "timeline": df_grouped.to_dict(orient="records")
-        }
+        def gerar():
+            return Response(content=orjson.dumps({"destinos": snap.atrasos.percentis}),
+                            media_type="application/json")
+        
+        return await _com_cache(request, snap, "late-trips-percentiles", gerar)
+    except ERROS_REPASSADOS:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ==================== HISTÓRICO ====================
+
+@app.get("/api/trips/{trip_number}/history")
+async def get_trip_history(trip_number: str):
+    """Mudanças registradas do LT, em ordem cronológica"""
+    try:
+        mudancas = await executor.executar(historico.historico, trip_number)
+    except ERROS_REPASSADOS:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not mudancas:
+        raise HTTPException(status_code=404, detail=f"Sem histórico para o LT {trip_number}")
+    return Response(content=orjson.dumps({"trip_number": trip_number, "mudancas": mudancas}),
+                    media_type="application/json")
+
+@app.get("/api/trips/{trip_number}/dwell")
+async def get_trip_dwell(
+    trip_number: str,
+    at: Optional[str] = Query(None, description="Calcula até este instante (ISO 8601); padrão: agora")
+):
+    """Tempo (segundos) em cada status, por ocorrência do LT e no total"""
+    try:
+        ate = instante_de_texto(at) if at else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        permanencia = await executor.executar(historico.permanencia, trip_number, ate)
+    except ERROS_REPASSADOS:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not permanencia["ocorrencias"]:
+        raise HTTPException(status_code=404, detail=f"Sem histórico para o LT {trip_number}")
+    return Response(content=orjson.dumps(permanencia), media_type="application/json")
+
+@app.get("/api/data/as-of")
+async def get_data_as_of(
+    request: Request,
+    at: str = Query(..., description="Instante (ISO 8601, ex: 2024-05-01T14:30)"),
+    trip_numbers: Optional[str] = Query(None, description="IDs (separados por vírgula)"),
+    destinations: Optional[str] = Query(None, description="Destinos (separados por vírgula)"),
+    status: Optional[str] = Query(None, description="Status (separados por vírgula)"),
+    start_date: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Data final (YYYY-MM-DD)"),
+    limit: Optional[int] = Query(None, ge=1, description="Máximo de registros (sem limite se omitido)"),
+    offset: int = Query(0, ge=0, description="Registros a pular"),
+    sort: Optional[str] = Query(None, description="Colunas de ordenação, '-' para decrescente (ex: -Data,trip_number)"),
+    fields: Optional[str] = Query(None, description="Colunas a retornar (separadas por vírgula)"),
+    format: Optional[str] = FORMAT_QUERY
+):
+    """Dados como estavam no instante pedido, reconstruídos do histórico local; mesmos parâmetros de /api/data"""
+    formato = _formato(request, format)
+    start_date, end_date = _datas(start_date, end_date)
+    try:
+        instante = instante_de_texto(at)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def gerar():
+        # LT, destino e status já filtram no SQLite; o resto segue o caminho de /api/data
+        df = historico.no_instante(instante, {
+            "trip_number": _lista(trip_numbers),
+            "destination_station_code": _lista(destinations),
+            "Status_da_Viagem": _lista(status),
+        })
+        indice = IndiceFiltros(compactar(df))
+        ordenacao, projecao = _ordenacao_e_projecao(sort, fields, df.columns)
+        return _pagina_de_dados(indice, formato, None, None, None, start_date, end_date,
+                                ordenacao, offset, limit, projecao)
+    
+    try:
+        return await executor.executar(gerar)
+    except ERROS_REPASSADOS:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -193,11 +534,16 @@ if __name__ == "__main__":
     print(f"📚 Docs: http://localhost:{API_PORT}/docs")
     print("="*70 + "\n")
     
-    # Testa conexão
+    if API_WORKERS > 1 and MODO_CACHE != "leitor":
+        print(f"⚠️ {API_WORKERS} workers no modo '{MODO_CACHE}': cada um vai buscar a planilha separadamente")
+        print("💡 Rode python compartilhado.py e defina DASHBOARD_CACHE=leitor\n")
+    
+    # Testa conexão (dispensável quando há snapshot salvo: o startup de cada worker o restaura)
     try:
-        print("🔍 Testando conexão...")
-        carregar_dados()
-        print("✅ Conexão OK!\n")
+        if cache.persistencia is None or not cache.persistencia.exists():
+            print("🔍 Testando conexão...")
+            carregar_dados()
+            print("✅ Conexão OK!\n")
     except FileNotFoundError as e:
         print(f"❌ {e}")
         print("💡 Coloque account.json na raiz do projeto\n")
@@ -207,4 +553,7 @@ if __name__ == "__main__":
         exit(1)
     
     # Inicia servidor
-    uvicorn.run(app, host="0.0.0.0", port=API_PORT, log_level="info")
+    if API_WORKERS > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=API_PORT, log_level="info", workers=API_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=API_PORT, log_level="info")
@@ -0,0 +1,226 @@
+"""
+Métricas - Dashboard de Monitoramento de Viagens
+Contadores, medidores e histogramas no formato texto do Prometheus, tempo
+por etapa (planilha, DataFrame, datas, filtro, agrupamento, serialização)
+e perfil opcional por requisição via Server-Timing
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_BYTES = tuple(4 ** i * 256 for i in range(1, 12))  # 1 KiB .. 1 GiB
+
+# ==================== TIPOS ====================
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes: Sequence[str], valores: Tuple[str, ...]) -> str:
+    if not nomes:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)) + "}"
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(rotulos.get(n, "")) for n in self.rotulos)
+
+    def linhas(self) -> List[str]:
+        raise NotImplementedError
+
+    def expor(self) -> str:
+        return "\n".join([f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}", *self.linhas()])
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, valor: float = 1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            return [f"{self.nome}{_rotulos(self.rotulos, k)} {v:g}" for k, v in self._valores.items()]
+
+
+class Medidor(_Metrica):
+    """Valor lido na hora da coleta: `ler()` devolve {rótulos: valor} ou um número"""
+
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, ler: Callable[[], object], rotulos: Sequence[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self.ler = ler
+
+    def linhas(self) -> List[str]:
+        try:
+            valores = self.ler()
+        except Exception:
+            return []
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        return [f"{self.nome}{_rotulos(self.rotulos, k)} {float(v):g}" for k, v in valores.items() if v is not None]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(buckets)
+        # rótulos -> [contagem por bucket (+Inf no fim), soma]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observar(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        posicao = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][posicao] += 1
+            serie[1] += valor
+
+    def linhas(self) -> List[str]:
+        saida = []
+        with self._lock:
+            series = [(k, list(c), s) for k, (c, s) in self._series.items()]
+        for chave, contagens, soma in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float("inf"),), contagens):
+                acumulado += contagem
+                le = "+Inf" if limite == float("inf") else f"{limite:g}"
+                saida.append(f"{self.nome}_bucket{_rotulos(self.rotulos + ('le',), chave + (le,))} {acumulado}")
+            saida.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {soma:g}")
+            saida.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}")
+        return saida
+
+# ==================== REGISTRO ====================
+
+class Registro:
+    """Métricas deste processo (cada worker da API tem o seu)"""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                   buckets: Sequence[float] = BUCKETS_SEGUNDOS) -> Histograma:
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def medidor(self, nome: str, ajuda: str, ler: Callable[[], object], rotulos: Sequence[str] = ()) -> Medidor:
+        """Registrar de novo com o mesmo nome troca a função de leitura"""
+        medidor = Medidor(nome, ajuda, ler, rotulos)
+        with self._lock:
+            self._metricas[nome] = medidor
+        return medidor
+
+    def expor(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return "\n".join(m.expor() for m in metricas) + "\n"
+
+
+registro = Registro()
+
+ETAPAS = registro.histograma("dashboard_etapa_segundos", "Tempo por etapa do processamento", ["etapa"])
+REQUISICOES = registro.histograma("dashboard_requisicao_segundos", "Latência por endpoint",
+                                  ["endpoint", "metodo", "status"])
+RESPOSTA_BYTES = registro.histograma("dashboard_resposta_bytes", "Tamanho das respostas", ["endpoint"], BUCKETS_BYTES)
+CALLBACKS = registro.histograma("dashboard_callback_segundos", "Tempo dos callbacks do Dash", ["callback"])
+CACHE_SNAPSHOT = registro.contador("dashboard_cache_snapshot_total",
+                                   "Leituras do snapshot: hit (válido), stale (vencido) ou miss (sem dados)",
+                                   ["resultado"])
+BUSCAS = registro.contador("dashboard_buscas_total", "Buscas na fonte por resultado", ["resultado"])
+
+MIME_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+# ==================== ETAPAS E PERFIL ====================
+
+# Lista de (etapa, segundos) da requisição atual, quando o perfil foi pedido
+_perfil: ContextVar[Optional[list]] = ContextVar("perfil", default=None)
+
+
+@contextmanager
+def etapa(nome: str):
+    """Mede um trecho: vai para o histograma e, com perfil ativo, para o Server-Timing"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        ETAPAS.observar(duracao, etapa=nome)
+        perfil = _perfil.get()
+        if perfil is not None:
+            perfil.append((nome, duracao))
+
+
+def iniciar_perfil() -> list:
+    perfil = []
+    _perfil.set(perfil)
+    return perfil
+
+
+def server_timing(perfil: List[Tuple[str, float]], total: float) -> str:
+    """Cabeçalho Server-Timing (aparece na aba Network do navegador)"""
+    itens = [f"{nome};dur={duracao * 1000:.2f}" for nome, duracao in perfil]
+    itens.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(itens)
+
+
+def medir_callback(nome: str):
+    """Decorador para callbacks do Dash"""
+    def decorador(funcao):
+        @wraps(funcao)
+        def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                CALLBACKS.observar(time.perf_counter() - inicio, callback=nome)
+        return medido
+    return decorador
+
+
+def medir_stream(partes: Iterable[bytes], endpoint: str, inicio: Optional[float] = None,
+                 metodo: str = "GET", status: int = 200) -> Iterator[bytes]:
+    """
+    Resposta em streaming (sem Content-Length): latência de `inicio` (início da
+    requisição, por padrão o primeiro pedaço) até o último pedaço e bytes enviados
+    """
+    inicio = time.perf_counter() if inicio is None else inicio
+    total = 0
+    try:
+        for parte in partes:
+            total += len(parte)
+            yield parte
+    finally:
+        REQUISICOES.observar(time.perf_counter() - inicio, endpoint=endpoint, metodo=metodo, status=status)
+        RESPOSTA_BYTES.observar(total, endpoint=endpoint)
@@ -0,0 +1,149 @@
+"""
+Sincronização incremental - Dashboard de Monitoramento de Viagens
+Compara uma impressão digital por linha com o snapshot anterior e
+reaproveita as linhas que não mudaram, em vez de reconstruir o DataFrame
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from fontes import converter_tipos
+from metricas import etapa
+
+COLUNA_CHAVE = "trip_number"
+
+# ==================== DELTA ====================
+
+class Delta:
+    """
+    Diferença entre dois snapshots.
+
+    `adicionados` e `atualizados` trazem as linhas novas, `removidos` e
+    `anteriores` as linhas antigas (estado antes da atualização).
+    `completo=True` indica reconstrução total: não há diferença a aplicar.
+    """
+
+    __slots__ = ("adicionados", "atualizados", "anteriores", "removidos", "completo")
+
+    def __init__(self, adicionados: Optional[pd.DataFrame] = None, atualizados: Optional[pd.DataFrame] = None,
+                 anteriores: Optional[pd.DataFrame] = None, removidos: Optional[pd.DataFrame] = None,
+                 completo: bool = False):
+        vazio = pd.DataFrame()
+        self.adicionados = adicionados if adicionados is not None else vazio
+        self.atualizados = atualizados if atualizados is not None else vazio
+        self.anteriores = anteriores if anteriores is not None else vazio
+        self.removidos = removidos if removidos is not None else vazio
+        self.completo = completo
+
+    @property
+    def vazio(self) -> bool:
+        return not self.completo and self.adicionados.empty and self.atualizados.empty and self.removidos.empty
+
+    def __repr__(self):
+        if self.completo:
+            return "<Delta completo>"
+        return (f"<Delta +{len(self.adicionados)} ~{len(self.atualizados)} "
+                f"-{len(self.removidos)}>")
+
+# ==================== IMPRESSÕES ====================
+
+def chaves_linhas(df: pd.DataFrame, coluna: str = COLUNA_CHAVE) -> pd.Index:
+    """`trip_number` + ordem de ocorrência, para LTs que aparecem mais de uma vez"""
+    ocorrencia = df.groupby(coluna, sort=False).cumcount()
+    return pd.Index(df[coluna].astype(str) + "#" + ocorrencia.astype(str))
+
+
+def impressoes(bruto: pd.DataFrame, chaves: pd.Index) -> pd.Series:
+    """Hash de cada linha bruta, indexado pela chave"""
+    return pd.Series(pd.util.hash_pandas_object(bruto, index=False).to_numpy(), index=chaves)
+
+# ==================== SINCRONIZADOR ====================
+
+class Sincronizador:
+    """Mantém as impressões do último snapshot e aplica inserções, alterações e remoções"""
+
+    def __init__(self, coluna_chave: str = COLUNA_CHAVE):
+        self.coluna_chave = coluna_chave
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._impressoes: Optional[pd.Series] = None
+        self._colunas: Optional[list] = None
+        self._df: Optional[pd.DataFrame] = None
+
+    def definir_base(self, df: pd.DataFrame):
+        """Troca o DataFrame de onde as linhas inalteradas são reaproveitadas (mesma ordem de linhas)"""
+        if self._df is not None and len(df) == len(self._df):
+            self._df = df
+
+    def estado(self) -> Optional[Tuple[np.ndarray, list]]:
+        """(impressões na ordem das linhas, colunas brutas), para persistir junto com o snapshot"""
+        if self._impressoes is None:
+            return None
+        return self._impressoes.to_numpy(), list(self._colunas)
+
+    def restaurar(self, df: pd.DataFrame, impressoes_linhas: np.ndarray, colunas: list):
+        """Base a partir de um snapshot salvo com `estado()`: a primeira busca já sai incremental"""
+        if self.coluna_chave not in df.columns or len(impressoes_linhas) != len(df):
+            return
+        self._impressoes = pd.Series(impressoes_linhas, index=chaves_linhas(df, self.coluna_chave))
+        self._colunas = list(colunas)
+        self._df = df
+
+    def _reconstruir(self, bruto: pd.DataFrame, novas: Optional[pd.Series]) -> Tuple[pd.DataFrame, Delta]:
+        df = converter_tipos(bruto).reset_index(drop=True)
+        self._impressoes = novas
+        self._colunas = list(bruto.columns)
+        self._df = df
+        return df, Delta(completo=True)
+
+    @etapa("sincronizacao")
+    def aplicar(self, bruto: pd.DataFrame) -> Tuple[pd.DataFrame, Delta]:
+        """Recebe o DataFrame bruto da fonte e devolve (DataFrame preparado, delta)"""
+        bruto = bruto.reset_index(drop=True)
+        if self.coluna_chave not in bruto.columns:
+            self.reiniciar()
+            return converter_tipos(bruto), Delta(completo=True)
+
+        novas = impressoes(bruto, chaves_linhas(bruto, self.coluna_chave))
+
+        # Sem base anterior ou com mudança de colunas: reconstrução completa
+        if self._impressoes is None or list(bruto.columns) != self._colunas:
+            return self._reconstruir(bruto, novas)
+
+        antigas = self._impressoes
+        pos = antigas.index.get_indexer(novas.index)
+        novo = pos < 0
+        alterado = ~novo & (antigas.to_numpy()[np.where(novo, 0, pos)] != novas.to_numpy())
+        presentes = np.zeros(len(antigas), dtype=bool)
+        presentes[pos[~novo]] = True
+
+        if not novo.any() and not alterado.any() and presentes.all():
+            if len(pos) == len(antigas) and bool((pos == np.arange(len(pos))).all()):
+                return self._df, Delta()
+            # Mesmas linhas em outra ordem: não há delta por linha que descreva isso
+            df = self._df.take(pos).reset_index(drop=True)
+            self._impressoes = novas
+            self._df = df
+            return df, Delta(completo=True)
+
+        # Só as linhas novas ou alteradas passam pela conversão de tipos
+        recalcular = novo | alterado
+        manter = np.flatnonzero(~recalcular)
+        reaproveitadas = self._df.take(pos[manter])
+        reaproveitadas.index = manter
+        recalculadas = converter_tipos(bruto.loc[recalcular])
+
+        df = pd.concat([reaproveitadas, recalculadas]).sort_index().reset_index(drop=True)
+
+        delta = Delta(
+            adicionados=df.loc[novo],
+            atualizados=df.loc[alterado],
+            anteriores=self._df.take(pos[alterado]),
+            removidos=self._df.loc[~presentes],
+        )
+
+        self._impressoes = novas
+        self._df = df
+        return df, delta
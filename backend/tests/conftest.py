@@ -0,0 +1,57 @@
+"""
+Fixtures comuns - Dashboard de Monitoramento de Viagens
+Dados pequenos no formato de texto da "Base Principal", com LTs repetidos,
+e um CacheDados em memória (sem disco e sem histórico global)
+"""
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(BACKEND), str(BACKEND / "benchmarks")]
+# O cache global de `dados` não deve gravar no histórico da máquina
+os.environ.setdefault("DASHBOARD_HISTORICO_ATIVO", "0")
+
+from dados import CacheDados  # noqa: E402
+from fontes import FonteMemoria  # noqa: E402
+
+COLUNAS = ["trip_number", "Data", "Status_da_Viagem", "destination_station_code",
+           "ETA Planejado", "Previsão de chegada", "Ocorrencia"]
+
+LINHAS = [
+    ["LT001", "01/02/2024", "Em trânsito", "ST001", "01/02/2024 08:00", "01/02/2024 08:30", ""],
+    ["LT002", "01/02/2024", "Finalizado", "ST002", "01/02/2024 09:00", "01/02/2024 09:00", ""],
+    ["LT001", "02/02/2024", "Parado", "ST003", "02/02/2024 10:00", "02/02/2024 12:00", "Avaria"],
+    ["LT003", "02/02/2024", "Em trânsito", "ST001", "02/02/2024 11:00", "02/02/2024 11:15", ""],
+    ["LT004", "", "Cancelado", "ST002", "", "", ""],
+    ["LT003", "03/02/2024", "Em trânsito", "ST002", "03/02/2024 07:00", "03/02/2024 09:30", "Atraso"],
+]
+
+
+@pytest.fixture
+def bruto() -> pd.DataFrame:
+    """Valores como texto, como vêm da planilha; LT001 e LT003 aparecem duas vezes"""
+    return pd.DataFrame(LINHAS, columns=COLUNAS).astype(object)
+
+
+@pytest.fixture
+def cache_memoria():
+    """Fábrica de CacheDados sobre FonteMemoria; `publicar(df)` faz uma busca síncrona"""
+
+    class CacheMemoria(CacheDados):
+        def publicar(self, df: pd.DataFrame):
+            self.fonte.dados = df
+            self._executar_busca()
+            if self._ultimo_erro is not None:
+                raise self._ultimo_erro
+            return self.atual()
+
+    def criar(df: pd.DataFrame) -> CacheMemoria:
+        cache = CacheMemoria(FonteMemoria(df), persistencia=None)
+        cache.publicar(df)
+        return cache
+
+    return criar
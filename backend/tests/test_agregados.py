@@ -0,0 +1,63 @@
+"""
+Agregados materializados: aplicar o delta da sincronização tem que dar as
+mesmas contagens de recalcular a partir das linhas
+"""
+import pandas as pd
+import pytest
+
+from agregados import Agregados
+from sincronizacao import Sincronizador
+from sintetico import alterar, gerar_bruto
+
+
+def contagens(agregados: Agregados) -> pd.Series:
+    return agregados.contagens.sort_index()
+
+
+def test_delta_com_lts_repetidos_iguala_de_linhas(bruto):
+    sync = Sincronizador()
+    df, _ = sync.aplicar(bruto)
+    agregados = Agregados.de_linhas(df)
+
+    novo = bruto.drop(index=0).reset_index(drop=True)
+    novo.loc[4, "Status_da_Viagem"] = "Finalizado"
+    novo.loc[len(novo)] = ["LT006", "05/02/2024", "Parado", "ST004", "", "", ""]
+    df, delta = sync.aplicar(novo)
+    assert not delta.completo
+
+    pd.testing.assert_series_equal(contagens(agregados.aplicar(delta)), contagens(Agregados.de_linhas(df)))
+
+
+def test_bucket_que_zera_sai_das_contagens(bruto):
+    sync = Sincronizador()
+    df, _ = sync.aplicar(bruto)
+    agregados = Agregados.de_linhas(df)
+
+    novo = bruto[bruto["trip_number"] != "LT004"].reset_index(drop=True)
+    _, delta = sync.aplicar(novo)
+    atualizados = agregados.aplicar(delta)
+
+    assert ("", "Cancelado", "ST002") in agregados.contagens.index
+    assert ("", "Cancelado", "ST002") not in atualizados.contagens.index
+    assert (atualizados.contagens > 0).all()
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_deltas_seguidos_igualam_de_linhas(seed):
+    bruto = gerar_bruto(3000, seed=seed)
+    sync = Sincronizador()
+    df, _ = sync.aplicar(bruto)
+    agregados = Agregados.de_linhas(df)
+
+    for passo in range(3):
+        bruto = alterar(bruto, fracao=0.05, seed=seed * 10 + passo)
+        bruto = pd.concat([bruto.drop(index=bruto.index[passo::250]), bruto.iloc[passo::500]], ignore_index=True)
+        df, delta = sync.aplicar(bruto)
+        agregados = agregados.aplicar(delta)
+
+    esperado = Agregados.de_linhas(df)
+    pd.testing.assert_series_equal(contagens(agregados), contagens(esperado))
+    status, timeline = agregados.consultar()
+    status_esperado, timeline_esperada = esperado.consultar()
+    assert status == status_esperado
+    pd.testing.assert_frame_equal(timeline, timeline_esperada)
@@ -0,0 +1,85 @@
+"""
+Patch SSE: as linhas e os buckets enviados têm que levar o cliente do
+snapshot anterior exatamente ao novo
+"""
+import orjson
+
+from agregados import CHAVES
+from eventos import montar_patch
+from formatos import registros_json
+
+
+def ler_evento(evento: bytes) -> dict:
+    campos = dict(linha.split(": ", 1) for linha in evento.decode("utf-8").strip().split("\n"))
+    return {"tipo": campos["event"], "id": campos.get("id"), "dados": orjson.loads(campos["data"])}
+
+
+def linhas(colunas: dict) -> list:
+    nomes = list(colunas)
+    return [dict(zip(nomes, valores)) for valores in zip(*colunas.values())]
+
+
+def test_sem_anterior_ou_mesma_versao_nao_gera_evento(bruto, cache_memoria):
+    snap = cache_memoria(bruto).atual()
+    assert montar_patch(snap, None) is None
+    assert montar_patch(snap, snap) is None
+
+
+def test_patch_leva_o_cliente_ao_novo_snapshot(bruto, cache_memoria):
+    cache = cache_memoria(bruto)
+    anterior = cache.atual()
+    novo = bruto[bruto["trip_number"] != "LT004"].reset_index(drop=True)
+    novo.loc[2, "Status_da_Viagem"] = "Finalizado"  # segunda ocorrência do LT001
+    novo.loc[len(novo)] = ["LT006", "05/02/2024", "Parado", "ST004", "", "", ""]
+    snap = cache.publicar(novo)
+
+    evento = ler_evento(montar_patch(snap, anterior))
+    dados = evento["dados"]
+
+    assert evento["tipo"] == "snapshot"
+    assert evento["id"] == dados["versao"] == snap.id
+    assert dados["anterior"] == anterior.id
+    assert dados["trip_numbers"] == ["LT001", "LT004", "LT006"]
+
+    # O cliente remove as linhas dos LTs afetados e insere `viagens`
+    afetados = set(dados["trip_numbers"])
+    cliente = [r for r in registros_json(anterior.df) if r["trip_number"] not in afetados]
+    cliente += linhas(dados["viagens"])
+    chave = lambda r: tuple(str(v) for v in r.values())  # noqa: E731
+    assert sorted(cliente, key=chave) == sorted(registros_json(snap.df), key=chave)
+
+    # Somar a diferença de cada bucket às contagens anteriores dá as novas
+    contagens = anterior.agregados.contagens.to_dict()
+    for bucket in linhas(dados["buckets"]):
+        chave_bucket = tuple(bucket[c] for c in CHAVES)
+        assert bucket["Quantidade_anterior"] == contagens.get(chave_bucket, 0)
+        contagens[chave_bucket] = contagens.get(chave_bucket, 0) + bucket["Quantidade"] - bucket["Quantidade_anterior"]
+    contagens = {k: v for k, v in contagens.items() if v}
+    assert contagens == snap.agregados.contagens.to_dict()
+
+
+def test_reconstrucao_completa_envia_reload(bruto, cache_memoria):
+    cache = cache_memoria(bruto)
+    anterior = cache.atual()
+    snap = cache.publicar(bruto.drop(columns="Ocorrencia"))
+
+    evento = ler_evento(montar_patch(snap, anterior))
+
+    assert snap.delta.completo
+    assert evento["tipo"] == "reload"
+    assert evento["dados"] == {"versao": snap.id, "anterior": anterior.id}
+
+
+def test_buckets_vazios_quando_so_muda_coluna_fora_das_chaves(bruto, cache_memoria):
+    cache = cache_memoria(bruto)
+    anterior = cache.atual()
+    novo = bruto.copy()
+    novo.loc[3, "Ocorrencia"] = "Sem sinal"
+    snap = cache.publicar(novo)
+
+    dados = ler_evento(montar_patch(snap, anterior))["dados"]
+
+    assert dados["trip_numbers"] == ["LT003"]
+    assert len(dados["viagens"]["trip_number"]) == 2
+    assert all(q == qa for q, qa in zip(dados["buckets"]["Quantidade"], dados["buckets"]["Quantidade_anterior"]))
+    assert dados["viagens"]["Ocorrencia"] == ["Sem sinal", "Atraso"]
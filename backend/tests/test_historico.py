@@ -0,0 +1,138 @@
+"""
+Histórico local: log por linha gravado a cada versão, consultado por LT
+(mudanças e permanência) e por instante (dados como estavam)
+"""
+import time
+from datetime import datetime
+
+import pytest
+
+from dados import Snapshot
+from formatos import registros_json
+from historico import HistoricoViagens
+
+# Recente, para a compactação da primeira gravação não apagar nada
+INICIO = float(int(time.time()) - 3600)
+
+
+def no_instante(snap: Snapshot, instante: float) -> Snapshot:
+    """Mesma versão com `modificado_em` fixo: é o instante gravado no log"""
+    return Snapshot(snap.df, instante, snap.versao, snap.delta, snap.indice, snap.agregados, instante,
+                    snap.busca, snap.atrasos)
+
+
+def iso(instante: float) -> str:
+    return datetime.fromtimestamp(instante).isoformat(timespec="seconds")
+
+
+def ordenados(registros: list) -> list:
+    return sorted(registros, key=lambda r: tuple(str(v) for v in r.values()))
+
+
+@pytest.fixture
+def versoes(bruto, cache_memoria, tmp_path):
+    """
+    Três versões gravadas com 10 min de intervalo: a segunda ocorrência do
+    LT001 muda de Parado para Em trânsito e depois o LT004 sai da planilha
+    """
+    historico = HistoricoViagens(tmp_path / "historico.sqlite")
+    cache = cache_memoria(bruto)
+    v1 = no_instante(cache.atual(), INICIO)
+
+    alterado = bruto.copy()
+    alterado.loc[2, "Status_da_Viagem"] = "Em trânsito"
+    v2 = no_instante(cache.publicar(alterado), INICIO + 600)
+
+    sem_lt004 = alterado[alterado["trip_number"] != "LT004"].reset_index(drop=True)
+    v3 = no_instante(cache.publicar(sem_lt004), INICIO + 1200)
+
+    anterior = None
+    for snap in (v1, v2, v3):
+        historico.registrar(snap, anterior)
+        assert historico.aguardar(timeout=10)
+        anterior = snap
+    return historico, (v1, v2, v3)
+
+
+def test_historico_do_lt_em_ordem_cronologica(versoes):
+    historico, (_, v2, _) = versoes
+
+    mudancas = historico.historico("LT001")
+
+    assert [(m["instante"], m["chave"], m["tipo"], m["status"]) for m in mudancas] == [
+        (iso(INICIO), "LT001#0", "adicionado", "Em trânsito"),
+        (iso(INICIO), "LT001#1", "adicionado", "Parado"),
+        (iso(INICIO + 600), "LT001#1", "atualizado", "Em trânsito"),
+    ]
+    assert mudancas[2]["dados"] == registros_json(v2.df.iloc[[2]])[0]
+    assert historico.historico("LT999") == []
+
+
+def test_lt_removido_termina_com_remocao(versoes):
+    historico, _ = versoes
+
+    mudancas = historico.historico("LT004")
+
+    assert [(m["instante"], m["tipo"]) for m in mudancas] == [(iso(INICIO), "adicionado"),
+                                                               (iso(INICIO + 1200), "removido")]
+    assert mudancas[-1]["dados"] is None
+
+
+def test_permanencia_por_status(versoes):
+    historico, _ = versoes
+
+    permanencia = historico.permanencia("LT001", ate=INICIO + 1800)
+    ocorrencias = {o["chave"]: o for o in permanencia["ocorrencias"]}
+
+    assert ocorrencias["LT001#1"]["permanencia"] == {"Parado": 600, "Em trânsito": 1200}
+    assert ocorrencias["LT001#1"]["desde"] == iso(INICIO + 600)
+    assert permanencia["total"] == {"Em trânsito": 1800 + 1200, "Parado": 600}
+    assert historico.permanencia("LT004", ate=INICIO + 1800)["total"] == {"Cancelado": 1200}
+
+
+@pytest.mark.parametrize("deslocamento, versao", [(0, 0), (300, 0), (600, 1), (900, 1), (5000, 2)])
+def test_dados_no_instante_iguais_a_versao_da_epoca(versoes, deslocamento, versao):
+    historico, snaps = versoes
+
+    df = historico.no_instante(INICIO + deslocamento)
+
+    assert ordenados(registros_json(df)) == ordenados(registros_json(snaps[versao].df))
+
+
+def test_dados_antes_do_primeiro_registro_vazios(versoes):
+    historico, _ = versoes
+    assert historico.no_instante(INICIO - 1).empty
+
+
+def test_dados_no_instante_com_filtros(versoes):
+    historico, (_, v2, _) = versoes
+
+    df = historico.no_instante(INICIO + 900, {"Status_da_Viagem": ["Em trânsito"],
+                                              "destination_station_code": ["ST001", "ST003"]})
+
+    esperado = v2.df[v2.df["Status_da_Viagem"].isin(["Em trânsito"])
+                     & v2.df["destination_station_code"].isin(["ST001", "ST003"])]
+    assert ordenados(registros_json(df)) == ordenados(registros_json(esperado))
+    assert sorted(df["trip_number"]) == ["LT001", "LT001", "LT003"]
+
+
+def test_regravar_a_mesma_versao_nao_duplica_o_log(versoes):
+    historico, (_, _, v3) = versoes
+    antes = historico.status()
+
+    # Outro processo gravando a mesma versão, sem delta: compara com estado_atual
+    historico.registrar(v3, None)
+    assert historico.aguardar(timeout=10)
+
+    assert historico.status()["mudancas"] == antes["mudancas"]
+
+
+def test_contadores_de_status(versoes):
+    historico, (_, _, v3) = versoes
+
+    status = historico.status()
+
+    # 6 adicionadas, 1 atualização e 1 remoção
+    assert status["mudancas"] == 8
+    assert status["linhas_atuais"] == len(v3.df)
+    assert status["desde"] == iso(INICIO)
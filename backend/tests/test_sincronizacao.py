@@ -0,0 +1,123 @@
+"""
+Sincronização incremental: o DataFrame montado a partir do delta tem que
+ser igual ao de uma reconstrução completa, inclusive com LTs repetidos
+"""
+import pandas as pd
+import pytest
+
+from fontes import converter_tipos
+from indices import COLUNAS_CATEGORICAS
+from sincronizacao import Sincronizador, chaves_linhas
+from sintetico import alterar, gerar_bruto
+
+
+def sincronizar(inicial: pd.DataFrame, novo: pd.DataFrame):
+    sync = Sincronizador()
+    sync.aplicar(inicial)
+    return sync.aplicar(novo)
+
+
+def reconstruido(bruto: pd.DataFrame) -> pd.DataFrame:
+    return converter_tipos(bruto.reset_index(drop=True))
+
+
+def test_chaves_numeram_ocorrencias_repetidas(bruto):
+    assert list(chaves_linhas(bruto)) == ["LT001#0", "LT002#0", "LT001#1", "LT003#0", "LT004#0", "LT003#1"]
+
+
+def test_sem_mudanca_devolve_o_mesmo_dataframe(bruto):
+    sync = Sincronizador()
+    df, _ = sync.aplicar(bruto)
+    mesmo, delta = sync.aplicar(bruto.copy())
+    assert mesmo is df
+    assert delta.vazio
+
+
+def test_alteracao_na_segunda_ocorrencia_de_um_lt(bruto):
+    novo = bruto.copy()
+    novo.loc[2, "Status_da_Viagem"] = "Em trânsito"
+
+    df, delta = sincronizar(bruto, novo)
+
+    pd.testing.assert_frame_equal(df, reconstruido(novo))
+    assert list(delta.atualizados["Status_da_Viagem"]) == ["Em trânsito"]
+    assert list(delta.anteriores["Status_da_Viagem"]) == ["Parado"]
+    assert list(delta.atualizados["Data"]) == [pd.Timestamp("2024-02-02")]
+    assert delta.adicionados.empty and delta.removidos.empty
+
+
+def test_nova_ocorrencia_de_lt_existente_e_lt_novo(bruto):
+    extras = pd.DataFrame([
+        ["LT002", "04/02/2024", "Parado", "ST003", "04/02/2024 10:00", "04/02/2024 10:40", ""],
+        ["LT005", "04/02/2024", "Em trânsito", "ST001", "04/02/2024 12:00", "04/02/2024 12:00", ""],
+    ], columns=bruto.columns).astype(object)
+    novo = pd.concat([bruto, extras], ignore_index=True)
+
+    df, delta = sincronizar(bruto, novo)
+
+    pd.testing.assert_frame_equal(df, reconstruido(novo))
+    assert sorted(delta.adicionados["trip_number"]) == ["LT002", "LT005"]
+    assert delta.atualizados.empty and delta.removidos.empty
+
+
+def test_remocao_da_primeira_ocorrencia_desloca_as_seguintes(bruto):
+    # Sem a primeira linha do LT001, a segunda passa a ser a ocorrência #0
+    novo = bruto.drop(index=0).reset_index(drop=True)
+
+    df, delta = sincronizar(bruto, novo)
+
+    pd.testing.assert_frame_equal(df, reconstruido(novo))
+    assert list(delta.atualizados["Status_da_Viagem"]) == ["Parado"]
+    assert list(delta.anteriores["Status_da_Viagem"]) == ["Em trânsito"]
+    assert list(delta.removidos["trip_number"]) == ["LT001"]
+    assert list(delta.removidos["Status_da_Viagem"]) == ["Parado"]
+
+
+def test_mesmas_linhas_em_outra_ordem_reconstroi(bruto):
+    # Ocorrências do mesmo LT na mesma ordem relativa: nenhuma chave muda de linha
+    novo = bruto.iloc[[0, 3, 2, 1, 4, 5]].reset_index(drop=True)
+
+    df, delta = sincronizar(bruto, novo)
+
+    assert delta.completo
+    pd.testing.assert_frame_equal(df, reconstruido(novo))
+
+
+def test_mudanca_de_colunas_reconstroi(bruto):
+    novo = bruto.drop(columns="Ocorrencia")
+
+    df, delta = sincronizar(bruto, novo)
+
+    assert delta.completo
+    pd.testing.assert_frame_equal(df, reconstruido(novo))
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_varias_atualizacoes_seguidas_igualam_reconstrucao(seed):
+    bruto = gerar_bruto(2000, seed=seed)
+    sync = Sincronizador()
+    sync.aplicar(bruto)
+
+    for passo in range(3):
+        bruto = alterar(bruto, fracao=0.02, seed=seed * 10 + passo)
+        # Remove algumas linhas e repete outras no fim (novas ocorrências do mesmo LT)
+        bruto = pd.concat([bruto.drop(index=bruto.index[5 + passo::400]), bruto.iloc[passo::300]],
+                          ignore_index=True)
+        df, delta = sync.aplicar(bruto)
+
+        assert not delta.completo
+        pd.testing.assert_frame_equal(df, reconstruido(bruto))
+
+
+def test_cache_com_base_compactada_iguala_reconstrucao(bruto, cache_memoria):
+    cache = cache_memoria(bruto)
+    novo = bruto.copy()
+    novo.loc[5, "Status_da_Viagem"] = "Finalizado"
+    novo = novo.drop(index=1).reset_index(drop=True)
+
+    snap = cache.publicar(novo)
+
+    assert not snap.delta.completo
+    esperado = reconstruido(novo)
+    pd.testing.assert_frame_equal(snap.df.astype({c: object for c in COLUNAS_CATEGORICAS if c in snap.df}),
+                                  esperado.astype({c: object for c in COLUNAS_CATEGORICAS if c in esperado}))
@@ -1,13 +1,14 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Card, Title, BarChart, DonutChart, Grid, Metric, Text, Badge } from '@tremor/react';
-import { api, TripData, Filters as FilterData, Stats } from '../services/api';
+import { api, applyPatch, applyStatsPatch, columnarToRows, TripData, Filters as FilterData, Stats } from '../services/api';
 import Filters from './Filters';
 import DataTable from './DataTable';
 import { format } from 'date-fns';
 
 export default function Dashboard() {
   const [data, setData] = useState<TripData[]>([]);
-  const [filters, setFilters] = useState<FilterData>({ trip_numbers: [], destinations: [], status: [] });
+  // LTs e destinos são buscados sob demanda pelo próprio Filters
+  const [filters, setFilters] = useState<Pick<FilterData, 'status'>>({ status: [] });
   const [stats, setStats] = useState<Stats | null>(null);
   const [selectedFilters, setSelectedFilters] = useState({
     trip_numbers: [] as string[],
@@ -18,27 +19,47 @@ export default function Dashboard() {
   });
   const [loading, setLoading] = useState(true);
 
+  const filtersRef = useRef(selectedFilters);
+
   useEffect(() => {
     loadFilters();
     loadData();
     loadStats();
     
-    const interval = setInterval(() => {
-      loadData();
-      loadStats();
-    }, 60000);
-    
-    return () => clearInterval(interval);
+    // Atualizações chegam por SSE: só as viagens alteradas, sem polling
+    return api.subscribe({
+      onPatch: (patch) => {
+        setData((rows) => applyPatch(rows, patch, matchesFilters));
+        setStats((current) => (current ? applyStatsPatch(current, patch) : current));
+      },
+      onReload: () => {
+        loadFilters();
+        loadData();
+        loadStats();
+      },
+    });
   }, []);
 
   useEffect(() => {
+    filtersRef.current = selectedFilters;
     loadData();
   }, [selectedFilters]);
 
+  // Mesmo critério do /api/data, aplicado às linhas recebidas no patch
+  const matchesFilters = (row: TripData) => {
+    const f = filtersRef.current;
+    if (f.trip_numbers.length && !f.trip_numbers.includes(row.trip_number)) return false;
+    if (f.destinations.length && !f.destinations.includes(row.destination_station_code)) return false;
+    if (f.status.length && !f.status.includes(row.Status_da_Viagem)) return false;
+    if (f.start_date && (!row.Data || row.Data < format(f.start_date, 'yyyy-MM-dd'))) return false;
+    if (f.end_date && (!row.Data || row.Data > format(f.end_date, 'yyyy-MM-dd'))) return false;
+    return true;
+  };
+
   const loadFilters = async () => {
     try {
-      const filterData = await api.getFilters();
-      setFilters(filterData);
+      const filterData = await api.getFilters(['status']);
+      setFilters({ status: filterData.status ?? [] });
     } catch (error) {
       console.error('Erro ao carregar filtros:', error);
     }
@@ -47,14 +68,16 @@ export default function Dashboard() {
   const loadData = async () => {
     try {
       setLoading(true);
+      // Lido do ref para que o reload vindo do SSE use os filtros atuais
+      const f = filtersRef.current;
       const params = {
-        trip_numbers: selectedFilters.trip_numbers,
-        destinations: selectedFilters.destinations,
-        status: selectedFilters.status,
-        start_date: selectedFilters.start_date ? format(selectedFilters.start_date, 'yyyy-MM-dd') : undefined,
-        end_date: selectedFilters.end_date ? format(selectedFilters.end_date, 'yyyy-MM-dd') : undefined,
+        trip_numbers: f.trip_numbers,
+        destinations: f.destinations,
+        status: f.status,
+        start_date: f.start_date ? format(f.start_date, 'yyyy-MM-dd') : undefined,
+        end_date: f.end_date ? format(f.end_date, 'yyyy-MM-dd') : undefined,
       };
-      const tripData = await api.getData(params);
+      const tripData = columnarToRows(await api.getDataColumnar(params));
       setData(tripData);
     } catch (error) {
       console.error('Erro ao carregar dados:', error);
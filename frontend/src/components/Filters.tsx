@@ -1,9 +1,34 @@
-import { Card, MultiSelect, MultiSelectItem, DatePicker, Button } from '@tremor/react';
+import { useEffect, useState } from 'react';
+import { Card, MultiSelect, MultiSelectItem, DatePicker, Button, TextInput } from '@tremor/react';
+import { api, SearchField } from '../services/api';
+
+// Opções vindas de /api/search conforme o usuário digita; as selecionadas sempre aparecem
+function useSearchOptions(field: SearchField, selected: string[]) {
+  const [query, setQuery] = useState('');
+  const [results, setResults] = useState<string[]>([]);
+
+  useEffect(() => {
+    let active = true;
+    const timer = setTimeout(async () => {
+      try {
+        const found = await api.search(query, [field], 50);
+        if (active) setResults(found.map((r) => r.valor));
+      } catch (error) {
+        console.error('Erro na busca:', error);
+      }
+    }, 200);
+    return () => {
+      active = false;
+      clearTimeout(timer);
+    };
+  }, [field, query]);
+
+  const options = [...selected, ...results.filter((v) => !selected.includes(v))];
+  return { query, setQuery, options };
+}
 
 interface FiltersProps {
   filters: {
-    trip_numbers: string[];
-    destinations: string[];
     status: string[];
   };
   selectedFilters: {
@@ -24,6 +49,9 @@ interface FiltersProps {
 }
 
 export default function Filters({ filters, selectedFilters, onFilterChange, onClear }: FiltersProps) {
+  const tripSearch = useSearchOptions('trip_number', selectedFilters.trip_numbers);
+  const destinationSearch = useSearchOptions('destination_station_code', selectedFilters.destinations);
+
   return (
     <Card className="glass-effect rounded-2xl border-0 p-6 shadow-xl">
       <div className="space-y-6">
@@ -47,13 +75,19 @@ export default function Filters({ filters, selectedFilters, onFilterChange, onCl
             <label className="block text-sm font-semibold text-slate-700">
               ID (LT)
             </label>
+            <TextInput
+              value={tripSearch.query}
+              onValueChange={tripSearch.setQuery}
+              placeholder="Buscar LT..."
+              className="rounded-xl"
+            />
             <MultiSelect
               value={selectedFilters.trip_numbers}
               onValueChange={(value: string[]) => onFilterChange({ ...selectedFilters, trip_numbers: value })}
               placeholder="Selecione..."
               className="rounded-xl"
             >
-              {filters.trip_numbers.map((id) => (
+              {tripSearch.options.map((id) => (
                 <MultiSelectItem key={id} value={id}>
                   {id}
                 </MultiSelectItem>
@@ -65,13 +99,19 @@ export default function Filters({ filters, selectedFilters, onFilterChange, onCl
             <label className="block text-sm font-semibold text-slate-700">
               Destino
             </label>
+            <TextInput
+              value={destinationSearch.query}
+              onValueChange={destinationSearch.setQuery}
+              placeholder="Buscar destino..."
+              className="rounded-xl"
+            />
             <MultiSelect
               value={selectedFilters.destinations}
               onValueChange={(value: string[]) => onFilterChange({ ...selectedFilters, destinations: value })}
               placeholder="Selecione..."
               className="rounded-xl"
             >
-              {filters.destinations.map((dest) => (
+              {destinationSearch.options.map((dest) => (
                 <MultiSelectItem key={dest} value={dest}>
                   {dest}
                 </MultiSelectItem>
@@ -11,6 +11,8 @@ export interface TripData {
   Ocorrencia: string;
   Data: string;
   destination_station_code: string;
+  // Previsão de chegada - ETA Planejado, calculado no backend
+  atraso_minutos?: number | null;
 }
 
 export interface Filters {
@@ -19,6 +21,15 @@ export interface Filters {
   status: string[];
 }
 
+// Resultado de /api/search (autocompletar dos filtros)
+export type SearchField = 'trip_number' | 'destination_station_code' | 'Ultima localização' | 'Ocorrencia';
+
+export interface SearchResult {
+  campo: SearchField;
+  valor: string;
+  contagem: number;
+}
+
 export interface Stats {
   status_counts: Record<string, number>;
   timeline: Array<{
@@ -28,32 +39,137 @@ export interface Stats {
   }>;
 }
 
+// Formato colunar: uma lista de valores por coluna
+export type ColumnarData = { [K in keyof TripData]?: Array<TripData[K] | null> };
+
+export interface DataParams {
+  trip_numbers?: string[];
+  destinations?: string[];
+  status?: string[];
+  start_date?: string;
+  end_date?: string;
+  limit?: number;
+  offset?: number;
+  sort?: string;
+  fields?: string[];
+}
+
+const buildDataParams = (params?: DataParams): URLSearchParams => {
+  const queryParams = new URLSearchParams();
+  if (params?.trip_numbers?.length) queryParams.append('trip_numbers', params.trip_numbers.join(','));
+  if (params?.destinations?.length) queryParams.append('destinations', params.destinations.join(','));
+  if (params?.status?.length) queryParams.append('status', params.status.join(','));
+  if (params?.start_date) queryParams.append('start_date', params.start_date);
+  if (params?.end_date) queryParams.append('end_date', params.end_date);
+  if (params?.limit) queryParams.append('limit', String(params.limit));
+  if (params?.offset) queryParams.append('offset', String(params.offset));
+  if (params?.sort) queryParams.append('sort', params.sort);
+  if (params?.fields?.length) queryParams.append('fields', params.fields.join(','));
+  return queryParams;
+};
+
+// Converte o formato colunar em registros
+export const columnarToRows = (data: ColumnarData): TripData[] => {
+  const columns = Object.keys(data) as Array<keyof TripData>;
+  const length = columns.length ? data[columns[0]]!.length : 0;
+  return Array.from({ length }, (_, i) => {
+    const row = {} as Record<string, unknown>;
+    for (const column of columns) row[column] = data[column]![i];
+    return row as unknown as TripData;
+  });
+};
+
+// Patch enviado por /api/events a cada nova versão do snapshot
+export interface SnapshotPatch {
+  versao: string;
+  anterior: string;
+  trip_numbers: string[];
+  viagens: ColumnarData;
+  buckets: Record<string, Array<string | number>>;
+}
+
+// Remove as linhas dos LTs afetados e insere as linhas atuais deles que passam no filtro
+export const applyPatch = (
+  rows: TripData[],
+  patch: SnapshotPatch,
+  keep: (row: TripData) => boolean = () => true
+): TripData[] => {
+  const affected = new Set(patch.trip_numbers);
+  return rows
+    .filter((row) => !affected.has(row.trip_number))
+    .concat(columnarToRows(patch.viagens).filter(keep));
+};
+
+// Soma a diferença de cada bucket alterado às contagens por status e à timeline de /api/stats
+export const applyStatsPatch = (stats: Stats, patch: SnapshotPatch): Stats => {
+  const { Data = [], Status_da_Viagem = [], Quantidade = [], Quantidade_anterior = [] } = patch.buckets;
+  const statusCounts = { ...stats.status_counts };
+  const timeline = new Map(stats.timeline.map((item) => [`${item.Data}|${item.Status}`, { ...item }]));
+
+  Quantidade.forEach((quantidade, i) => {
+    const diff = Number(quantidade) - Number(Quantidade_anterior[i] ?? 0);
+    if (!diff) return;
+    const status = String(Status_da_Viagem[i]);
+    const data = String(Data[i]);
+    statusCounts[status] = (statusCounts[status] ?? 0) + diff;
+    if (statusCounts[status] <= 0) delete statusCounts[status];
+    // Linhas sem Data contam no status, mas não entram na timeline
+    if (!data) return;
+    const key = `${data}|${status}`;
+    const item = timeline.get(key) ?? { Data: data, Status: status, Quantidade: 0 };
+    item.Quantidade += diff;
+    if (item.Quantidade > 0) timeline.set(key, item);
+    else timeline.delete(key);
+  });
+
+  // Mesma ordem do backend: status por quantidade, timeline por Data e Status
+  return {
+    status_counts: Object.fromEntries(Object.entries(statusCounts).sort(([, a], [, b]) => b - a)),
+    timeline: Array.from(timeline.values()).sort((a, b) => {
+      const ka = `${a.Data}|${a.Status}`;
+      const kb = `${b.Data}|${b.Status}`;
+      return ka < kb ? -1 : ka > kb ? 1 : 0;
+    }),
+  };
+};
+
 export const api = {
-  getData: async (params?: {
-    trip_numbers?: string[];
-    destinations?: string[];
-    status?: string[];
-    start_date?: string;
-    end_date?: string;
-  }): Promise<TripData[]> => {
-    const queryParams = new URLSearchParams();
-    if (params?.trip_numbers?.length) queryParams.append('trip_numbers', params.trip_numbers.join(','));
-    if (params?.destinations?.length) queryParams.append('destinations', params.destinations.join(','));
-    if (params?.status?.length) queryParams.append('status', params.status.join(','));
-    if (params?.start_date) queryParams.append('start_date', params.start_date);
-    if (params?.end_date) queryParams.append('end_date', params.end_date);
-    
+  getData: async (params?: DataParams): Promise<TripData[]> => {
+    const queryParams = buildDataParams(params);
     const response = await axios.get(`${API_URL}/data?${queryParams}`);
     return response.data;
   },
 
-  getFilters: async (): Promise<Filters> => {
-    const response = await axios.get(`${API_URL}/filters`);
+  getDataColumnar: async (params?: DataParams): Promise<ColumnarData> => {
+    const queryParams = buildDataParams(params);
+    queryParams.append('format', 'columnar');
+    const response = await axios.get(`${API_URL}/data?${queryParams}`);
     return response.data;
   },
 
+  getFilters: async (fields?: Array<keyof Filters>): Promise<Partial<Filters>> => {
+    const query = fields?.length ? `?fields=${fields.join(',')}` : '';
+    const response = await axios.get(`${API_URL}/filters${query}`);
+    return response.data;
+  },
+
+  search: async (q: string, fields?: SearchField[], limit = 20): Promise<SearchResult[]> => {
+    const queryParams = new URLSearchParams({ q, limit: String(limit) });
+    if (fields?.length) queryParams.append('fields', fields.join(','));
+    const response = await axios.get(`${API_URL}/search?${queryParams}`);
+    return response.data.resultados;
+  },
+
   getStats: async (): Promise<Stats> => {
     const response = await axios.get(`${API_URL}/stats`);
     return response.data;
+  },
+
+  // Atualizações por Server-Sent Events; retorna a função que encerra a conexão
+  subscribe: (handlers: { onPatch: (patch: SnapshotPatch) => void; onReload: () => void }): (() => void) => {
+    const source = new EventSource(`${API_URL}/events`);
+    source.addEventListener('snapshot', (event) => handlers.onPatch(JSON.parse((event as MessageEvent).data)));
+    source.addEventListener('reload', () => handlers.onReload());
+    return () => source.close();
   }
 };